@@ -5,75 +5,125 @@
 
 #!/usr/bin/env python3
 import argparse
-import pandas as pd
-from anytree import Node, RenderTree
 
+from hierarchy import (
+    ROOT_ID, filter_edges, children_index, select_subtree, walk, notna, more_label, add_selection_args,
+)
+from instrument import span, add_profile_args, profiling
+
+
+def build_anytree(df, roots=None, max_depth=None, max_children=None):
+    from anytree import Node
+
+    # Build parent -> children mapping and cut it down to the visible subtree
+    with span('index', rows=len(df)):
+        children = children_index(df)
+        roots = roots or [ROOT_ID]
+        visible, more = select_subtree(children, roots, max_depth, max_children)
+        visible_ids = list(walk(visible, roots))
+
+    # Collect metadata rows for the visible ids only, deduplicated by id
+    with span('metadata'):
+        meta_df = (
+            df[df['id'].isin(visible_ids)]
+            .drop_duplicates(subset=['id'], keep='first')
+            .set_index('id')
+        )
+        meta = meta_df.to_dict('index')
+
+    # Create Node objects and attach parent-child relationships
+    with span('build_nodes', rows=len(visible_ids)):
+        nodes = {}
+        for node_id in visible_ids:
+            name = meta.get(node_id, {}).get('name', node_id)
+            nodes[node_id] = Node(name, id=node_id)
+        for parent_id, kids in visible.items():
+            for child_id in kids:
+                nodes[child_id].parent = nodes[parent_id]
+        for parent_id, count in more.items():
+            Node(more_label(count), id=None, parent=nodes[parent_id])
 
-def build_anytree(df):
-    # Build parent -> children mapping
-    children = {}
-    for row in df.itertuples():
-        children.setdefault(row.parent, []).append(row.id)
+    # Return root nodes
+    return nodes, meta, [nodes[r] for r in roots if r in nodes]
+
+
+def entity_type(get):
+    if notna(get('instance_id')):
+        return 'Service_Instance'
+    if notna(get('app_id')):
+        return 'App'
+    if get('parent') == ROOT_ID:
+        return 'Business_Service'
+    return 'Node'
+
+
+def node_label(node_id, name, get):
+    """Entity-typed label with metadata; ``get(col)`` returns the node's value for a column."""
+    if node_id == ROOT_ID:
+        return name
+    ent_label = f"{entity_type(get)}: {name}({node_id})"
+
+    # Append metadata
+    parts = []
+    for col, tag in [
+        ('lean_control_service_id', 'LCP'),
+        ('jira_backlog_id', 'Backlog'),
+        ('it_business_service', 'Service'),
+        ('it_service_instance', 'Instance'),
+        ('environment', 'Env'),
+        ('install_type', 'Type'),
+    ]:
+        val = get(col)
+        if notna(val):
+            parts.append(f"{tag}: {val}")
+    if parts:
+        ent_label += ' [' + '; '.join(parts) + ']'
+    return ent_label
+
+
+def write_md(lines, out_file):
+    # Wrap the tree in a fenced code block for Markdown
+    with span('write') as s, open(out_file, 'w') as f:
+        f.write("```text\n")
+        f.write("\n".join(lines))
+        f.write("\n```\n")
+        s.add(bytes=f.tell())
+    print(f"[anytree_render] Markdown tree written to {out_file}")
 
-    # Collect metadata rows, deduplicated by id
-    meta_df = df.drop_duplicates(subset=['id'], keep='first').set_index('id')
-    meta = meta_df.to_dict('index')
 
-    # Create Node objects with placeholder names
-    nodes = {node_id: Node(meta[node_id]['name'], id=node_id) for node_id in meta}
+def render_to_md(nodes, meta, roots, out_file):
+    from anytree import RenderTree
+
+    with span('render') as s:
+        lines = []
+        for root in roots:
+            for prefix, _, node in RenderTree(root):
+                if node.id is None:
+                    ent_label = node.name
+                else:
+                    m = meta.get(node.id, {})
+                    ent_label = node_label(node.id, node.name, m.get)
+                lines.append(f"{prefix}{ent_label}")
+        s.add(rows=len(lines))
+    write_md(lines, out_file)
 
-    # Attach parent-child relationships
-    for node_id, node in nodes.items():
-        parent_id = df.loc[df['id'] == node_id, 'parent'].iloc[0]
-        if pd.notna(parent_id) and parent_id in nodes:
-            node.parent = nodes[parent_id]
 
-    # Return root nodes
-    return nodes, meta, [node for node in nodes.values() if node.is_root]
+def render_compact_to_md(df, roots, out_file, max_depth=None, max_children=None):
+    """Same output as build_anytree + render_to_md, straight from a CompactTree."""
+    from compact_tree import CompactTree
 
+    with span('build_compact', rows=len(df)):
+        tree = CompactTree.from_edges(df, columns=['name', 'parent', 'lean_control_service_id', 'jira_backlog_id',
+                                                   'app_id', 'instance_id', 'environment', 'install_type'])
+        root_idx = [i for i in (tree.find(r) for r in (roots or [ROOT_ID])) if i >= 0]
 
-def render_to_md(nodes, meta, roots, out_file):
-    lines = []
-    for root in roots:
-        for prefix, _, node in RenderTree(root):
-            # Determine entity type label prefix
-            if node.is_root:
-                ent_label = node.name
-            else:
-                parent = node.parent
-                if parent.is_root:
-                    ent_type = 'Business_Service'
-                elif node.children:
-                    ent_type = 'App'
-                else:
-                    ent_type = 'Service_Instance'
-                ent_label = f"{ent_type}: {node.name}({node.id})"
-
-                # Append metadata
-                m = meta.get(node.id, {})
-                parts = []
-                for col, tag in [
-                    ('lean_control_service_id', 'LCP'),
-                    ('jira_backlog_id', 'Backlog'),
-                    ('it_business_service', 'Service'),
-                    ('it_service_instance', 'Instance'),
-                    ('environment', 'Env'),
-                    ('install_type', 'Type'),
-                ]:
-                    val = m.get(col)
-                    if pd.notna(val):
-                        parts.append(f"{tag}: {val}")
-                if parts:
-                    ent_label += ' [' + '; '.join(parts) + ']'
-
-            lines.append(f"{prefix}{ent_label}")
+    def label(view):
+        return node_label(view.id, view.name, view.get)
 
-    # Wrap the tree in a fenced code block for Markdown
-    with open(out_file, 'w') as f:
-        f.write("```text\n")
-        f.write("\n".join(lines))
-        f.write("\n```\n")
-    print(f"[anytree_render] Markdown tree written to {out_file}")
+    with span('render') as s:
+        lines = list(tree.render_lines(root_idx, label, max_depth, max_children))
+        s.add(rows=len(lines))
+    write_md(lines, out_file)
 
 
 def main():
@@ -82,11 +132,26 @@ def main():
                         help="Input CSV file path from generate_dataset.py")
     parser.add_argument("--output", default="tree.md",
                         help="Output Markdown file path")
+    parser.add_argument("--engine", choices=["anytree", "compact"], default="anytree",
+                        help="Tree representation: anytree nodes or the array-backed CompactTree (default: anytree)")
+    add_selection_args(parser)
+    add_profile_args(parser)
     args = parser.parse_args()
 
-    df = pd.read_csv(args.input)
-    nodes, meta, roots = build_anytree(df)
-    render_to_md(nodes, meta, roots, args.output)
+    import pandas as pd
+
+    with profiling(args):
+        with span('read_csv') as s:
+            df = pd.read_csv(args.input)
+            s.add(rows=len(df))
+        with span('filter'):
+            df = filter_edges(df, args.env, args.install_type)
+        if args.engine == "compact":
+            render_compact_to_md(df, args.root, args.output, args.max_depth, args.max_children)
+            return
+        with span('build'):
+            nodes, meta, roots = build_anytree(df, args.root, args.max_depth, args.max_children)
+        render_to_md(nodes, meta, roots, args.output)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+Closure table of the business application parent chains.
+
+vwsfbusinessapplication links an app to its parent component through
+application_parent_correlation_id, and those chains can be any depth. The
+closure table holds one row per (ancestor, descendant) pair with the number
+of links between them, every app being its own ancestor at depth 0:
+
+    public.app_closure(ancestor_id, descendant_id, depth)
+
+so the whole chain above an app, or everything below a component, is one
+indexed join instead of one self-join per level.
+
+The table is built with a single recursive CTE that walks each app up its
+parent links. A chain that comes back to an app already on it is cut there,
+and the links closing such cycles are reported. The links used are kept in
+``public.app_closure_links``; a refresh diffs them against the view and
+recomputes only the chains that run through an app whose parent changed.
+"""
+import argparse
+
+import yaml
+
+from instrument import span, add_profile_args, profiling
+
+CLOSURE = 'app_closure'
+LINKS = 'app_closure_links'
+# Above this share of changed apps a refresh rebuilds everything
+FULL_REBUILD_SHARE = 0.25
+
+# A parent outside the view is no link at all: such apps are top-level, as the
+# finders' outer join to the parent app made them before the closure table.
+SOURCE_LINKS = """
+    SELECT DISTINCT a.correlation_id,
+           CASE WHEN EXISTS (SELECT 1 FROM {source} AS p WHERE p.correlation_id = a.application_parent_correlation_id)
+                THEN NULLIF(a.application_parent_correlation_id, '') END AS parent_id
+    FROM {source} AS a
+    WHERE a.correlation_id IS NOT NULL
+"""
+
+# {contains}: strpos (Postgres) / instr (SQLite); {links}: link table; {seed}: filter on the starting apps.
+# The path is '|'-delimited so "is this app already on the chain" is a substring test on both databases.
+CHAIN_INSERT = """
+    INSERT INTO {closure} (ancestor_id, descendant_id, depth)
+    WITH RECURSIVE chain (descendant_id, ancestor_id, depth, path, is_cycle) AS (
+        SELECT DISTINCT correlation_id, correlation_id, 0, '|' || correlation_id || '|', 0
+        FROM {links}
+        WHERE {seed}
+      UNION ALL
+        SELECT chain.descendant_id, l.parent_id, chain.depth + 1,
+               chain.path || l.parent_id || '|',
+               CASE WHEN {contains}(chain.path, '|' || l.parent_id || '|') > 0 THEN 1 ELSE 0 END
+        FROM chain
+        JOIN {links} AS l
+          ON l.correlation_id = chain.ancestor_id
+        WHERE chain.is_cycle = 0
+          AND l.parent_id IS NOT NULL
+    )
+    SELECT ancestor_id, descendant_id, MIN(depth)
+    FROM chain
+    WHERE is_cycle = 0
+    GROUP BY ancestor_id, descendant_id
+"""
+
+
+# ——— Helpers ———
+
+def load_config(path):
+    with open(path, 'r') as f:
+        return yaml.safe_load(f)
+
+
+def build_engine(cfg):
+    from sqlalchemy import create_engine
+    db = cfg['database']
+    url = (
+        f"postgresql+psycopg2://{db['user']}:{db['password']}"
+        f"@{db['host']}:{db['port']}/{db['name']}"
+    )
+    return create_engine(url, echo=False)
+
+
+def _names(conn):
+    """Qualified table names and the substring function for this connection's database."""
+    postgres = conn.dialect.name == 'postgresql'
+    # On SQLite the file is also attached as ``public`` (synthetic_cmdb.sqlite_engine); writing through
+    # main while reading the same file through public locks it, so everything here goes through main.
+    qualify = (lambda name: f"public.{name}") if postgres else (lambda name: name)
+    return {'closure': qualify(CLOSURE), 'links': qualify(LINKS), 'source': qualify('vwsfbusinessapplication'),
+            'contains': 'strpos' if postgres else 'instr'}
+
+
+def ensure_tables(conn):
+    n = _names(conn)
+    conn.exec_driver_sql(
+        f"CREATE TABLE IF NOT EXISTS {n['closure']} ("
+        f"ancestor_id VARCHAR NOT NULL, descendant_id VARCHAR NOT NULL, depth INTEGER NOT NULL, "
+        f"PRIMARY KEY (ancestor_id, descendant_id))"
+    )
+    conn.exec_driver_sql(f"CREATE INDEX IF NOT EXISTS ix_{CLOSURE}_descendant ON {n['closure']} (descendant_id, depth)")
+    conn.exec_driver_sql(f"CREATE TABLE IF NOT EXISTS {n['links']} (correlation_id VARCHAR NOT NULL, parent_id VARCHAR)")
+    conn.exec_driver_sql(f"CREATE INDEX IF NOT EXISTS ix_{LINKS}_correlation_id ON {n['links']} (correlation_id)")
+
+
+def _scalar(conn, sql):
+    return conn.exec_driver_sql(sql).scalar()
+
+
+def find_cycles(conn):
+    """(app, parent) links that close a cycle: the parent is already below the app."""
+    n = _names(conn)
+    return conn.exec_driver_sql(
+        f"SELECT l.correlation_id, l.parent_id FROM {n['links']} AS l "
+        f"JOIN {n['closure']} AS c ON c.ancestor_id = l.correlation_id AND c.descendant_id = l.parent_id "
+        f"ORDER BY l.correlation_id"
+    ).fetchall()
+
+
+# ——— Build / refresh ———
+
+def build(engine):
+    """Rebuild the closure table from scratch. Returns {'apps', 'rows', 'cycles'}."""
+    with engine.begin() as conn:
+        ensure_tables(conn)
+        n = _names(conn)
+        with span('closure_links'):
+            conn.exec_driver_sql(f"DELETE FROM {n['links']}")
+            conn.exec_driver_sql(f"INSERT INTO {n['links']} (correlation_id, parent_id) {SOURCE_LINKS.format(**n)}")
+        with span('closure_build') as s:
+            conn.exec_driver_sql(f"DELETE FROM {n['closure']}")
+            conn.exec_driver_sql(CHAIN_INSERT.format(seed='1 = 1', **n))
+            rows = _scalar(conn, f"SELECT COUNT(*) FROM {n['closure']}")
+            s.add(rows=rows)
+        return {
+            'apps': _scalar(conn, f"SELECT COUNT(DISTINCT correlation_id) FROM {n['links']}"),
+            'rows': rows,
+            'cycles': find_cycles(conn),
+        }
+
+
+def refresh(engine, full_share=FULL_REBUILD_SHARE):
+    """
+    Bring the closure table up to date with vwsfbusinessapplication. Apps
+    whose parent link was added, changed or removed since the last build,
+    and everything below them, get their chains recomputed; the rest are left
+    alone. Builds from scratch when there is no table yet or more than
+    ``full_share`` of the apps changed. Returns build()'s dict plus 'changed'
+    and 'recomputed' (None after a full rebuild).
+    """
+    with engine.begin() as conn:
+        ensure_tables(conn)
+        n = _names(conn)
+        total = _scalar(conn, f"SELECT COUNT(DISTINCT correlation_id) FROM {n['links']}")
+        if total:
+            with span('closure_diff') as s:
+                conn.exec_driver_sql(f"CREATE TEMPORARY TABLE app_closure_current AS {SOURCE_LINKS.format(**n)}")
+                conn.exec_driver_sql(
+                    f"CREATE TEMPORARY TABLE app_closure_changed AS "
+                    f"SELECT correlation_id FROM ("
+                    f"SELECT correlation_id, parent_id FROM app_closure_current "
+                    f"EXCEPT SELECT correlation_id, parent_id FROM {n['links']}) AS added "
+                    f"UNION "
+                    f"SELECT correlation_id FROM ("
+                    f"SELECT correlation_id, parent_id FROM {n['links']} "
+                    f"EXCEPT SELECT correlation_id, parent_id FROM app_closure_current) AS removed"
+                )
+                changed = _scalar(conn, "SELECT COUNT(*) FROM app_closure_changed")
+                s.add(changed=changed)
+
+            if changed <= total * full_share:
+                with span('closure_refresh') as s:
+                    # Every chain that changed runs through a changed app, so recomputing the changed
+                    # apps and their current descendants covers it.
+                    conn.exec_driver_sql(
+                        f"CREATE TEMPORARY TABLE app_closure_affected AS "
+                        f"SELECT correlation_id FROM app_closure_changed "
+                        f"UNION "
+                        f"SELECT c.descendant_id FROM {n['closure']} AS c "
+                        f"JOIN app_closure_changed AS ch ON c.ancestor_id = ch.correlation_id"
+                    )
+                    affected = "correlation_id IN (SELECT correlation_id FROM app_closure_affected)"
+                    conn.exec_driver_sql(f"DELETE FROM {n['links']} WHERE correlation_id IN "
+                                         f"(SELECT correlation_id FROM app_closure_changed)")
+                    conn.exec_driver_sql(f"INSERT INTO {n['links']} (correlation_id, parent_id) "
+                                         f"SELECT correlation_id, parent_id FROM app_closure_current "
+                                         f"WHERE correlation_id IN (SELECT correlation_id FROM app_closure_changed)")
+                    conn.exec_driver_sql(f"DELETE FROM {n['closure']} WHERE descendant_id IN "
+                                         f"(SELECT correlation_id FROM app_closure_affected)")
+                    conn.exec_driver_sql(CHAIN_INSERT.format(seed=affected, **n))
+                    recomputed = _scalar(conn, "SELECT COUNT(*) FROM app_closure_affected")
+                    s.add(rows=recomputed)
+                    for temp in ('app_closure_affected', 'app_closure_changed', 'app_closure_current'):
+                        conn.exec_driver_sql(f"DROP TABLE {temp}")
+                return {
+                    'apps': _scalar(conn, f"SELECT COUNT(DISTINCT correlation_id) FROM {n['links']}"),
+                    'rows': _scalar(conn, f"SELECT COUNT(*) FROM {n['closure']}"),
+                    'cycles': find_cycles(conn),
+                    'changed': changed,
+                    'recomputed': recomputed,
+                }
+            for temp in ('app_closure_changed', 'app_closure_current'):
+                conn.exec_driver_sql(f"DROP TABLE {temp}")
+        else:
+            changed = None
+    result = build(engine)
+    result.update(changed=changed, recomputed=None)
+    return result
+
+
+# ——— Reading chains ———
+
+def component_chains(rows, key):
+    """
+    Collapse query rows joined to the closure table on the row's own app (one
+    row per ancestor, with app_id/app_name and ancestor_id/ancestor_name/depth
+    columns) into [(key, first row, chain)], where ``chain`` lists
+    (app_id, app_name) from the root component down to the row's own app.
+    Rows are grouped by ``key(row)``, in first-seen order.
+    """
+    found = {}
+    for row in rows:
+        entry = found.setdefault(key(row), (row, {}))
+        if row.ancestor_id is not None and row.depth:
+            entry[1].setdefault(row.depth, (row.ancestor_id, row.ancestor_name))
+
+    result = []
+    for k, (row, ancestors) in found.items():
+        chain = [ancestors[d] for d in sorted(ancestors, reverse=True)]
+        chain.append((row.app_id, row.app_name))
+        result.append((k, row, chain))
+    return result
+
+
+def app_node(app_id, app_name):
+    return {'app_id': app_id, 'app_name': app_name, 'service_instances': [], 'children': {}}
+
+
+def nest(children, chain):
+    """Find or create the nodes for ``chain`` below ``children`` (app id -> node); return the last one."""
+    node = None
+    for app_id, app_name in chain:
+        node = children.setdefault(app_id, app_node(app_id, app_name))
+        children = node['children']
+    return node
+
+
+def children_to_lists(node):
+    """Turn the nested ``children`` dicts built by nest() into lists, in place."""
+    node['children'] = [children_to_lists(child) for child in node['children'].values()]
+    return node
+
+
+# ——— Main ———
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Build or refresh the application closure table (ancestor, descendant, depth)"
+    )
+    parser.add_argument('-c', '--config', default='config.yaml',
+                        help='Path to YAML config with the database (default: config.yaml)')
+    parser.add_argument('--sqlite', help='Use this SQLite file (synthetic_cmdb.py --sqlite) instead of the database')
+    parser.add_argument('--full', action='store_true', help='Rebuild from scratch instead of refreshing')
+    add_profile_args(parser)
+    args = parser.parse_args()
+
+    if args.sqlite:
+        from synthetic_cmdb import sqlite_engine
+        engine = sqlite_engine(args.sqlite)
+    else:
+        engine = build_engine(load_config(args.config))
+
+    with profiling(args):
+        result = build(engine) if args.full else refresh(engine)
+
+    if result.get('recomputed') is not None:
+        print(f"🔄 {result['changed']:,} app(s) changed, {result['recomputed']:,} chain(s) recomputed")
+    print(f"✅ {CLOSURE}: {result['rows']:,} rows for {result['apps']:,} apps")
+    if result['cycles']:
+        print(f"⚠️  {len(result['cycles'])} parent link(s) close a cycle (chains are cut there):")
+        for app_id, parent_id in result['cycles']:
+            print(f"   {app_id} -> {parent_id}")
+
+
+if __name__ == '__main__':
+    main()
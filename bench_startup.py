@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark for the lct commands.
+
+Runs ``python -X importtime lct.py <command> --help`` for every command (and
+``lct.py --help`` itself) in a fresh interpreter, keeps the fastest of
+--repeat runs, and reports wall time, total import time and the number of
+modules loaded. A command fails the check when its help path imports any of
+the heavy libraries (pandas, SQLAlchemy, ...) or, with --budget-ms, when its
+import time exceeds the budget; the exit status is 1 if anything failed.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+from lct import COMMANDS
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+LCT = os.path.join(HERE, 'lct.py')
+
+HEAVY = {
+    'pandas', 'numpy', 'pyarrow', 'sqlalchemy', 'sqlparse', 'rich', 'requests', 'urllib3',
+    'anytree', 'treelib', 'streamlit', 'psycopg2', 'pymongo', 'xxhash',
+}
+
+
+def parse_importtime(stderr):
+    """{module: (self_us, cumulative_us)} from ``-X importtime`` output."""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        modules[name.strip()] = (int(self_us), int(cumulative_us))
+    return modules
+
+
+def measure(argv, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        proc = subprocess.run([sys.executable, '-X', 'importtime', *argv], capture_output=True, text=True,
+                              cwd=HERE)
+        wall = time.perf_counter() - started
+        if best is None or wall < best['wall_ms'] / 1000:
+            modules = parse_importtime(proc.stderr)
+            best = {
+                'wall_ms': round(wall * 1000, 1),
+                'import_ms': round(sum(s for s, _ in modules.values()) / 1000, 1),
+                'modules': len(modules),
+                'heavy': sorted({name.split('.')[0] for name in modules} & HEAVY),
+                'returncode': proc.returncode,
+                'top': sorted(((c, n) for n, (_, c) in modules.items() if '.' not in n), reverse=True)[:3],
+            }
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Startup time and heavy imports of every lct command (-X importtime)")
+    parser.add_argument('--commands', nargs='+', choices=list(COMMANDS), help='Commands to check (default: all)')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per command; the fastest is kept (default: 3)')
+    parser.add_argument('--budget-ms', type=float, help='Fail commands whose import time exceeds this')
+    parser.add_argument('--json', help='Also write results to this JSON file')
+    args = parser.parse_args()
+
+    cases = [('python -c pass', ['-c', 'pass']), ('lct', [LCT, '--help'])]
+    cases += [(f"lct {name}", [LCT, name, '--help']) for name in (args.commands or COMMANDS)]
+
+    results, failed = [], []
+    print(f"{'command':<26} {'wall ms':>8} {'import ms':>10} {'modules':>8}  slowest top-level imports")
+    for label, argv in cases:
+        r = measure(argv, args.repeat)
+        r['command'] = label
+        results.append(r)
+        slowest = ', '.join(f"{name} {us / 1000:.0f}ms" for us, name in r['top'])
+        print(f"{label:<26} {r['wall_ms']:>8.1f} {r['import_ms']:>10.1f} {r['modules']:>8}  {slowest}")
+        if label == 'python -c pass':
+            continue
+        problems = []
+        if r['returncode'] != 0:
+            problems.append(f"exit status {r['returncode']}")
+        if r['heavy']:
+            problems.append(f"imports {', '.join(r['heavy'])}")
+        if args.budget_ms is not None and r['import_ms'] > args.budget_ms:
+            problems.append(f"import time {r['import_ms']:.0f}ms > {args.budget_ms:.0f}ms")
+        if problems:
+            failed.append(f"{label}: {'; '.join(problems)}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'python': sys.version.split()[0], 'results': results}, f, indent=2)
+        print(f"\nWrote {args.json}")
+
+    if failed:
+        print("\n❌ Slow start:", file=sys.stderr)
+        for line in failed:
+            print(f"   {line}", file=sys.stderr)
+        sys.exit(1)
+    print(f"\n✅ {len(results) - 1} command(s) start without heavy imports")
+
+
+if __name__ == '__main__':
+    main()
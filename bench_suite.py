@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+Benchmark the hot paths against a synthetic CMDB (synthetic_cmdb.py).
+
+For each scale (service instances) the five source tables are generated and
+loaded into a SQLite file shaped like the Postgres ``public`` schema (or the
+--config database with --postgres), the app_closure table is built, then
+each case is timed in-process:
+
+  generate_dataset      by_si and by_ts pipelines -> edge table
+  find_by_product_id    ORM query + service grouping
+  find_by_technical_service   ORM query + app grouping
+  anytree_render / treelib_render / visualize   full tree to Markdown
+  relationship_analysis cardinalities over the edge CSV
+  cardinality_check     FK cardinality over relationships.yaml
+
+Results (seconds, rows, peak RSS) go to a JSON file; --compare prints the
+ratio against an earlier run.
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import logging
+import os
+import platform
+import resource
+import subprocess
+import time
+
+import yaml
+
+import synthetic_cmdb
+import app_closure
+import generate_dataset
+import find_by_product_id
+import find_by_technical_service
+import relationship_analysis
+import cardinality_check
+
+CASES = [
+    'generate_dataset[by_si]', 'generate_dataset[by_ts]', 'find_by_product_id', 'find_by_technical_service',
+    'anytree_render', 'treelib_render', 'visualize', 'relationship_analysis', 'cardinality_check',
+]
+
+
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# ——— Cases ———
+# Each takes the shared context and returns the number of output rows/nodes.
+
+def run_generate_dataset(ctx, base):
+    df = generate_dataset.generate(ctx['engine'], ctx['config'], base)
+    if base == 'by_si':
+        df.to_csv(ctx['edges_csv'], index=False)
+    return len(df)
+
+
+def run_find_by_product_id(ctx):
+    from sqlalchemy.orm import Session
+    with Session(ctx['engine']) as session:
+        rows = find_by_product_id.build_query(session).all()
+    services = find_by_product_id.group_services(rows)
+    with open(ctx['services_json'], 'w') as f:
+        json.dump(services, f)
+    return len(rows)
+
+
+def run_find_by_technical_service(ctx):
+    from sqlalchemy.orm import Session
+    with Session(ctx['engine']) as session:
+        rows = find_by_technical_service.build_query(session).all()
+    find_by_technical_service.group_apps(rows)
+    return len(rows)
+
+
+def run_anytree_render(ctx):
+    import pandas as pd
+    import anytree_render
+    df = pd.read_csv(ctx['edges_csv'], low_memory=False)
+    nodes, meta, roots = anytree_render.build_anytree(df)
+    with contextlib.redirect_stdout(io.StringIO()):
+        anytree_render.render_to_md(nodes, meta, roots, os.path.join(ctx['workdir'], 'anytree.md'))
+    return len(nodes)
+
+
+def run_treelib_render(ctx):
+    import treelib_render
+    with contextlib.redirect_stdout(io.StringIO()):
+        treelib_render.render_tree(ctx['edges_csv'], os.path.join(ctx['workdir'], 'treelib.md'))
+    return None
+
+
+def run_visualize(ctx):
+    from rich.console import Console
+    from rich.tree import Tree
+    import visualize
+    with open(ctx['services_json']) as f:
+        services = json.load(f)
+    tree = Tree("Business Services Hierarchy")
+    visualize.add_service_nodes(tree, services)
+    console = Console(file=io.StringIO(), width=200, color_system=None)
+    console.print(tree)
+    return len(services)
+
+
+def run_relationship_analysis(ctx):
+    return len(relationship_analysis.analyze_all_relationships(ctx['edges_csv']))
+
+
+def run_cardinality_check(ctx):
+    results, _ = cardinality_check.check_cardinality(ctx['engine'], ctx['relations'])
+    return len(results)
+
+
+RUNNERS = {
+    'generate_dataset[by_si]': lambda ctx: run_generate_dataset(ctx, 'by_si'),
+    'generate_dataset[by_ts]': lambda ctx: run_generate_dataset(ctx, 'by_ts'),
+    'find_by_product_id': run_find_by_product_id,
+    'find_by_technical_service': run_find_by_technical_service,
+    'anytree_render': run_anytree_render,
+    'treelib_render': run_treelib_render,
+    'visualize': run_visualize,
+    'relationship_analysis': run_relationship_analysis,
+    'cardinality_check': run_cardinality_check,
+}
+# Cases that read what another case wrote
+NEEDS = {'anytree_render': 'generate_dataset[by_si]', 'treelib_render': 'generate_dataset[by_si]',
+         'relationship_analysis': 'generate_dataset[by_si]', 'visualize': 'find_by_product_id'}
+# Largest scale a case runs at without --no-limits (treelib_render is superlinear: 332s at 100k)
+SCALE_LIMITS = {'treelib_render': 100_000}
+
+
+# ——— Harness ———
+
+def run_scale(scale, cases, args, config):
+    workdir = os.path.join(args.workdir, str(scale))
+    os.makedirs(workdir, exist_ok=True)
+    results = []
+
+    started = time.perf_counter()
+    tables = synthetic_cmdb.generate(scale, args.seed)
+    synthetic_cmdb.write_tables(tables, workdir, args.format)
+    results.append({'case': 'synthetic_cmdb', 'seconds': time.perf_counter() - started,
+                    'rows': sum(len(t) for t in tables.values()), 'peak_rss_mb': peak_rss_mb()})
+
+    if args.postgres:
+        from sqlalchemy import create_engine
+        db = config['database']
+        engine = create_engine(f"postgresql+psycopg2://{db['user']}:{db['password']}"
+                               f"@{db['host']}:{db['port']}/{db['name']}")
+    else:
+        db_path = os.path.join(workdir, 'cmdb.sqlite')
+        if os.path.exists(db_path):
+            os.remove(db_path)
+        engine = synthetic_cmdb.sqlite_engine(db_path)
+    started = time.perf_counter()
+    synthetic_cmdb.load_tables(tables, engine)
+    results.append({'case': 'load', 'seconds': time.perf_counter() - started, 'rows': None,
+                    'peak_rss_mb': peak_rss_mb()})
+    started = time.perf_counter()
+    closure = app_closure.build(engine)
+    results.append({'case': 'app_closure', 'seconds': time.perf_counter() - started, 'rows': closure['rows'],
+                    'peak_rss_mb': peak_rss_mb()})
+    del tables
+
+    ctx = {
+        'engine': engine, 'config': config, 'workdir': workdir,
+        'relations': cardinality_check.load_relationships(args.relationships),
+        'edges_csv': os.path.join(workdir, 'si_hierarchy.csv'),
+        'services_json': os.path.join(workdir, 'services.json'),
+    }
+    if not args.no_limits:
+        skipped = [c for c in cases if scale > SCALE_LIMITS.get(c, scale)]
+        for case in skipped:
+            print(f"⏭️  {case} skipped at {scale:,} (limit {SCALE_LIMITS[case]:,}; --no-limits to run)")
+        cases = [c for c in cases if c not in skipped]
+    for case in [c for c in CASES if c in cases or any(NEEDS.get(x) == c for x in cases)]:
+        started = time.perf_counter()
+        rows = RUNNERS[case](ctx)
+        elapsed = time.perf_counter() - started
+        if case in cases:
+            results.append({'case': case, 'seconds': elapsed, 'rows': rows, 'peak_rss_mb': peak_rss_mb()})
+
+    for r in results:
+        r['scale'] = scale
+        rows = f"{r['rows']:,}" if r['rows'] is not None else '-'
+        print(f"{scale:>9,} {r['case']:<28} {r['seconds']:9.3f}s  {rows:>12} rows  {r['peak_rss_mb']:8.1f} MB peak")
+    engine.dispose()
+    return results
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = {(r['scale'], r['case']): r['seconds'] for r in json.load(f)['results']}
+    print(f"\nvs {baseline_path}:")
+    for r in results:
+        before = baseline.get((r['scale'], r['case']))
+        if before:
+            ratio = r['seconds'] / before
+            flag = '🔺' if ratio > 1.1 else ('🔻' if ratio < 0.9 else '  ')
+            print(f"{flag} {r['scale']:>9,} {r['case']:<28} {before:9.3f}s → {r['seconds']:9.3f}s  ({ratio:.2f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the hot paths on a synthetic CMDB at several scales")
+    parser.add_argument('--scales', type=int, nargs='+', default=[10_000, 100_000, 1_000_000],
+                        help='Service instance counts (default: 10000 100000 1000000)')
+    parser.add_argument('--cases', nargs='+', choices=CASES, default=CASES, help='Cases to run (default: all)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--format', choices=['csv', 'parquet'], default='parquet',
+                        help='Format for the generated table files (default: parquet)')
+    parser.add_argument('--workdir', default='bench_data', help='Scratch directory (default: bench_data)')
+    parser.add_argument('--config', '-c', default='config.yaml', help='Pipeline SQL and, with --postgres, the DB')
+    parser.add_argument('--relationships', default='relationships.yaml')
+    parser.add_argument('--postgres', action='store_true',
+                        help='Load into and query the --config database instead of SQLite (replaces the tables)')
+    parser.add_argument('--no-limits', action='store_true',
+                        help='Run every case at every scale, even ones known to take hours')
+    parser.add_argument('--output', '-o', default='bench_results.json')
+    parser.add_argument('--compare', help='Earlier results JSON to compare against')
+    args = parser.parse_args()
+
+    # find_by_* log every query at DEBUG; keep the timings clean
+    logging.getLogger().setLevel(logging.WARNING)
+    with open(args.config) as f:
+        config = yaml.safe_load(f)
+
+    results = []
+    for scale in args.scales:
+        results.extend(run_scale(scale, args.cases, args, config))
+
+    report = {
+        'meta': {
+            'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'backend': 'postgres' if args.postgres else 'sqlite',
+            'seed': args.seed,
+        },
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\n✅ Results written to {args.output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Memory and build-time comparison: anytree / treelib objects vs CompactTree.
+
+Builds each representation from the same edge table and reports the Python
+heap it retains (tracemalloc) and how long it took. Use --input for a real
+generate_dataset.py CSV or --nodes for a synthetic one.
+"""
+import argparse
+import gc
+import json
+import random
+import time
+import tracemalloc
+
+from hierarchy import ROOT_ID, children_index
+
+
+def synthetic_edges(target_nodes, seed=7):
+    """Service -> app -> instance edge table with roughly ``target_nodes`` nodes."""
+    import pandas as pd
+    rng = random.Random(seed)
+    rows = [{'id': ROOT_ID, 'parent': None, 'name': ROOT_ID}]
+    envs = ['Production', 'UAT', 'Development']
+    types = ['Cloud', 'On-Prem']
+    s = 0
+    while len(rows) < target_nodes:
+        sid = f"BS{s:07d}"
+        lcp, backlog = f"LCP{s % 9000:05d}", f"PRJ{s % 8000}"
+        rows.append({'id': sid, 'parent': ROOT_ID, 'name': f"Service {s}",
+                     'lean_control_service_id': lcp, 'jira_backlog_id': backlog})
+        for a in range(rng.choice([1, 1, 1, 2, 3])):
+            aid = f"APP{s:07d}{a}"
+            rows.append({'id': aid, 'parent': sid, 'name': f"App {s}.{a}",
+                         'lean_control_service_id': lcp, 'jira_backlog_id': backlog,
+                         'app_id': aid, 'app_name': f"App {s}.{a}"})
+            for i in range(rng.choice([1, 2, 3])):
+                iid = f"SI{s:07d}{a}{i}"
+                rows.append({'id': iid, 'parent': aid, 'name': f"Inst {s}.{a}.{i}",
+                             'lean_control_service_id': lcp, 'jira_backlog_id': backlog,
+                             'app_id': aid, 'app_name': f"App {s}.{a}",
+                             'instance_id': iid, 'instance_name': f"Inst {s}.{a}.{i}",
+                             'environment': rng.choice(envs), 'install_type': rng.choice(types)})
+        s += 1
+    return pd.DataFrame(rows)
+
+
+def build_anytree(df):
+    from anytree import Node
+    meta = df.drop_duplicates(subset=['id'], keep='first').set_index('id').to_dict('index')
+    nodes = {node_id: Node(m['name'], id=node_id) for node_id, m in meta.items()}
+    for parent, kids in children_index(df).items():
+        for kid in kids:
+            nodes[kid].parent = nodes[parent]
+    return nodes, meta
+
+
+def build_treelib(df):
+    from treelib import Tree
+    tree = Tree()
+    tree.create_node(tag=ROOT_ID, identifier=ROOT_ID)
+    children = children_index(df)
+    names = df.drop_duplicates(subset=['id']).set_index('id')['name'].to_dict()
+    stack = [ROOT_ID]
+    while stack:
+        parent = stack.pop()
+        for kid in children.get(parent, []):
+            if not tree.contains(kid):
+                tree.create_node(tag=names.get(kid, kid), identifier=kid, parent=parent)
+                stack.append(kid)
+    return tree
+
+
+def build_compact(df):
+    from compact_tree import CompactTree
+    return CompactTree.from_edges(df)
+
+
+def measure(build, df):
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    obj = build(df)
+    elapsed = time.perf_counter() - started
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del obj
+    gc.collect()
+    return {'retained_mb': current / 2 ** 20, 'peak_mb': peak / 2 ** 20, 'build_s': elapsed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare memory of anytree/treelib vs CompactTree")
+    parser.add_argument('--input', help='Hierarchy CSV from generate_dataset.py (default: synthetic)')
+    parser.add_argument('--nodes', type=int, nargs='+', default=[10_000, 100_000],
+                        help='Synthetic sizes to test (default: 10000 100000)')
+    parser.add_argument('--engines', nargs='+', default=['anytree', 'treelib', 'compact'],
+                        choices=['anytree', 'treelib', 'compact'])
+    parser.add_argument('--json', help='Also write results to this JSON file')
+    args = parser.parse_args()
+
+    import pandas as pd
+    builders = {'anytree': build_anytree, 'treelib': build_treelib, 'compact': build_compact}
+    datasets = [(args.input, pd.read_csv(args.input, dtype=str))] if args.input else [
+        (f"synthetic-{n}", synthetic_edges(n)) for n in args.nodes
+    ]
+
+    results = []
+    for label, df in datasets:
+        for engine in args.engines:
+            r = measure(builders[engine], df)
+            r.update(dataset=label, rows=len(df), engine=engine)
+            results.append(r)
+            print(f"{label:>18} {engine:>8}: retained {r['retained_mb']:8.1f} MB  "
+                  f"peak {r['peak_mb']:8.1f} MB  build {r['build_s']:6.2f}s")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,14 @@
 #!/usr/bin/env python3
 import argparse
 import yaml
-import pandas as pd
-from sqlalchemy import create_engine
 from collections import defaultdict
 from itertools import combinations
+from typing import TYPE_CHECKING
 
-def infer_cardinality(child_df: pd.DataFrame, fk_col: str) -> str:
+if TYPE_CHECKING:
+    import pandas as pd
+
+def infer_cardinality(child_df: "pd.DataFrame", fk_col: str) -> str:
     """
     Returns '1:N' if any fk value repeats in child_df[fk_col],
     else '1:1'.
@@ -22,28 +24,18 @@ def load_db_url(config_path: str) -> str:
     db = cfg.get('database', {})
     return f"postgresql://{db['user']}:{db['password']}@{db['host']}:{db['port']}/{db['name']}"
 
-def main():
-    parser = argparse.ArgumentParser(
-        description="Infer FK cardinality driven by YAML configs."
-    )
-    parser.add_argument(
-        "-c", "--config", default="config.yaml",
-        help="Path to YAML file with database connection info (default: config.yaml)"
-    )
-    args = parser.parse_args()
-
-    # 1) Build DB URL
-    db_url = load_db_url(args.config)
-
-    # 2) Load relationships
-    with open("relationships.yaml", 'r') as f:
+def load_relationships(path: str) -> list:
+    with open(path, 'r') as f:
         rel_cfg = yaml.safe_load(f)
-    relations = rel_cfg.get('relationships', [])
-    if not relations:
-        raise SystemExit("No relationships found in relationships.yaml.")
+    return rel_cfg.get('relationships', [])
 
-    # 3) Connect
-    engine = create_engine(db_url)
+def check_cardinality(engine, relations: list):
+    """
+    Returns (results, many_to_many): one dict per relationship with its
+    inferred cardinality, and (parent, parent, join table) triples for
+    child tables with two or more one-to-many legs.
+    """
+    import pandas as pd
 
     # 4) Infer cardinalities
     results = []
@@ -68,6 +60,7 @@ def main():
         })
 
     # 5) Generic M:N detection via join tables with ≥2 one-to-many legs
+    many_to_many = []
     child_to_parents = defaultdict(list)
     for r in results:
         if r["cardinality"] == "1:N":
@@ -76,7 +69,37 @@ def main():
     for child_tbl, parents in child_to_parents.items():
         if len(parents) >= 2:
             for p1, p2 in combinations(parents, 2):
-                print(f"Detected M:N between {p1} and {p2} via {child_tbl}")
+                many_to_many.append((p1, p2, child_tbl))
+
+    return results, many_to_many
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Infer FK cardinality driven by YAML configs."
+    )
+    parser.add_argument(
+        "-c", "--config", default="config.yaml",
+        help="Path to YAML file with database connection info (default: config.yaml)"
+    )
+    args = parser.parse_args()
+
+    # 1) Build DB URL
+    db_url = load_db_url(args.config)
+
+    # 2) Load relationships
+    relations = load_relationships("relationships.yaml")
+    if not relations:
+        raise SystemExit("No relationships found in relationships.yaml.")
+
+    # 3) Connect
+    import pandas as pd
+    from sqlalchemy import create_engine
+    engine = create_engine(db_url)
+
+    # 4-5) Infer cardinalities and report M:N pairs
+    results, many_to_many = check_cardinality(engine, relations)
+    for p1, p2, child_tbl in many_to_many:
+        print(f"Detected M:N between {p1} and {p2} via {child_tbl}")
 
     # 6) Print results with parent first
     df_res = pd.DataFrame(results)[[
@@ -0,0 +1,604 @@
+#!/usr/bin/env python3
+"""
+Invalidate the derived caches from PostgreSQL LISTEN/NOTIFY on the CMDB source tables.
+
+``install`` puts statement-level triggers (with transition tables, so a bulk
+load logs each key once) on every source that is a table. They write the
+key values a statement touched to ``cmdb_change_log`` and ``pg_notify`` the
+``cmdb_changes`` channel. Sources that are views (the vwsf* sources usually
+are) cannot carry such triggers: they are polled instead. Each poll
+fingerprints the rows per key and diffs the fingerprints against
+``cmdb_change_snapshot``, then logs the keys that changed and notifies like
+a trigger would.
+
+``listen`` treats a notification only as a wake-up. It reads the log after
+its cursor in ``cmdb_change_consumers``, so it catches up on changes made
+while it was down. It resolves the logged values (instance ids, sys_ids,
+servicenow_app_id references) to the LCPs, services, apps and instances
+they affect, and invalidates only those:
+
+  query-cache  drop the result-cache entries tagged with a changed LCP or
+               service, plus every untagged one (query_cache.invalidate)
+  closure      app_closure.refresh when an app changed
+  rollup       lcp_rollup.refresh_lcps for the changed LCPs
+  mongo        mongo_store.resync for the changed LCPs / services
+
+A TRUNCATE, or a table reloaded with ``if_exists='replace'`` (which drops
+its triggers: re-run ``install``), invalidates everything. ``listen --once``
+catches up, polls and exits, e.g. from cron. ``selftest`` checks both
+capture paths against a scratch schema on a local Postgres, e.g.
+``docker run -e POSTGRES_PASSWORD=postgres -p 5432:5432 postgres``.
+"""
+import argparse
+import json
+import select
+import time
+
+import yaml
+
+from instrument import span, add_profile_args, profiling
+
+CHANNEL = 'cmdb_changes'
+CONSUMER = 'lct'
+BATCH = 10_000
+
+# source -> [(key kind, column)]; every kind is resolved by affected_keys(). A
+# changed app row logs its sys_id too: once deleted, only the instances that
+# still point at that sys_id lead to its LCPs and services.
+WATCHED = {
+    'lean_control_application': [('lcp', 'lean_control_service_id'), ('ref', 'servicenow_app_id')],
+    'lean_control_product_backlog_details': [('lcp', 'lct_product_id')],
+    'vwsfitserviceinstance': [('instance', 'correlation_id'), ('instance_app_sysid', 'business_application_sysid'),
+                              ('instance_service_sysid', 'it_business_service_sysid')],
+    'vwsfbusinessapplication': [('app', 'correlation_id'), ('app', 'application_parent_correlation_id'),
+                                ('app_sysid', 'business_application_sys_id')],
+    'vwsfitbusinessservice': [('service', 'service_correlation_id')],
+}
+TARGETS = ['query-cache', 'closure', 'rollup', 'mongo']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS {schema}.cmdb_change_log (
+    id BIGSERIAL PRIMARY KEY,
+    table_name TEXT NOT NULL,
+    op TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    value TEXT NOT NULL,
+    changed_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+CREATE INDEX IF NOT EXISTS ix_cmdb_change_log_changed_at ON {schema}.cmdb_change_log (changed_at);
+CREATE TABLE IF NOT EXISTS {schema}.cmdb_change_consumers (
+    consumer TEXT PRIMARY KEY,
+    last_id BIGINT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS {schema}.cmdb_change_snapshot (
+    table_name TEXT NOT NULL,
+    pk TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    PRIMARY KEY (table_name, pk)
+);
+"""
+
+# TG_ARGV holds 'kind=column' specs. UPDATE logs the old and the new values,
+# so a row moved from one LCP to another invalidates both.
+TRIGGER_FUNCTION = """
+CREATE OR REPLACE FUNCTION {schema}.cmdb_log_change() RETURNS trigger
+LANGUAGE plpgsql AS $fn$
+DECLARE
+    spec TEXT;
+    changed_rows TEXT;
+BEGIN
+    IF TG_OP = 'TRUNCATE' THEN
+        INSERT INTO {schema}.cmdb_change_log (table_name, op, kind, value)
+        VALUES (TG_TABLE_NAME, TG_OP, 'all', TG_TABLE_NAME);
+    ELSE
+        changed_rows := CASE TG_OP
+            WHEN 'INSERT' THEN 'SELECT * FROM new_rows'
+            WHEN 'DELETE' THEN 'SELECT * FROM old_rows'
+            ELSE 'SELECT * FROM old_rows UNION ALL SELECT * FROM new_rows' END;
+        FOREACH spec IN ARRAY TG_ARGV LOOP
+            EXECUTE format(
+                'INSERT INTO {schema}.cmdb_change_log (table_name, op, kind, value) '
+                || 'SELECT DISTINCT %L, %L, %L, r.%I::text FROM (%s) AS r WHERE r.%I IS NOT NULL',
+                TG_TABLE_NAME, TG_OP, split_part(spec, '=', 1), split_part(spec, '=', 2),
+                changed_rows, split_part(spec, '=', 2));
+        END LOOP;
+    END IF;
+    PERFORM pg_notify('{channel}', TG_TABLE_NAME);
+    RETURN NULL;
+END
+$fn$
+"""
+
+# trigger suffix -> (event, transition tables)
+TRIGGERS = {
+    'insert': ('INSERT', 'REFERENCING NEW TABLE AS new_rows'),
+    'update': ('UPDATE', 'REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows'),
+    'delete': ('DELETE', 'REFERENCING OLD TABLE AS old_rows'),
+    'truncate': ('TRUNCATE', ''),
+}
+
+# Resolution of logged values to affected keys; each query takes one array parameter
+INSTANCE_BY_REF = "SELECT correlation_id FROM {s}.vwsfitserviceinstance WHERE correlation_id = ANY(%s)"
+INSTANCE_BY_APP_SYSID = "SELECT correlation_id FROM {s}.vwsfitserviceinstance WHERE business_application_sysid = ANY(%s)"
+INSTANCE_BY_APP = """
+    SELECT si.correlation_id
+    FROM {s}.vwsfbusinessapplication AS ba
+    JOIN {s}.vwsfitserviceinstance AS si ON si.business_application_sysid = ba.business_application_sys_id
+    WHERE ba.correlation_id = ANY(%s)
+"""
+APP_DESCENDANTS = """
+    WITH RECURSIVE below (correlation_id) AS (
+        SELECT correlation_id FROM {s}.vwsfbusinessapplication WHERE application_parent_correlation_id = ANY(%s)
+        UNION
+        SELECT ba.correlation_id
+        FROM {s}.vwsfbusinessapplication AS ba
+        JOIN below ON ba.application_parent_correlation_id = below.correlation_id
+    )
+    SELECT correlation_id FROM below
+"""
+APP_BY_SYSID = "SELECT correlation_id FROM {s}.vwsfbusinessapplication WHERE business_application_sys_id = ANY(%s)"
+APP_BY_INSTANCE = """
+    SELECT ba.correlation_id
+    FROM {s}.vwsfitserviceinstance AS si
+    JOIN {s}.vwsfbusinessapplication AS ba ON ba.business_application_sys_id = si.business_application_sysid
+    WHERE si.correlation_id = ANY(%s)
+"""
+SERVICE_BY_SYSID = "SELECT service_correlation_id FROM {s}.vwsfitbusinessservice WHERE it_business_service_sysid = ANY(%s)"
+SERVICE_BY_REF = "SELECT service_correlation_id FROM {s}.vwsfitbusinessservice WHERE service_correlation_id = ANY(%s)"
+SERVICE_BY_INSTANCE = """
+    SELECT bs.service_correlation_id
+    FROM {s}.vwsfitserviceinstance AS si
+    JOIN {s}.vwsfitbusinessservice AS bs ON bs.it_business_service_sysid = si.it_business_service_sysid
+    WHERE si.correlation_id = ANY(%s)
+"""
+SERVICE_BY_LCP = """
+    SELECT bs.service_correlation_id
+    FROM {s}.lean_control_application AS la
+    JOIN {s}.vwsfitbusinessservice AS bs ON bs.service_correlation_id = la.servicenow_app_id
+    WHERE la.lean_control_service_id = ANY(%s)
+    UNION
+    SELECT bs.service_correlation_id
+    FROM {s}.lean_control_application AS la
+    JOIN {s}.vwsfitserviceinstance AS si ON si.correlation_id = la.servicenow_app_id
+    JOIN {s}.vwsfitbusinessservice AS bs ON bs.it_business_service_sysid = si.it_business_service_sysid
+    WHERE la.lean_control_service_id = ANY(%s)
+"""
+LCP_BY_REF = "SELECT lean_control_service_id FROM {s}.lean_control_application WHERE servicenow_app_id = ANY(%s)"
+
+
+# ——— Helpers ———
+
+def load_config(path):
+    with open(path, 'r') as f:
+        return yaml.safe_load(f)
+
+
+def connect(cfg, autocommit=False):
+    """Plain psycopg2 connection: LISTEN and the plpgsql DDL go through the driver directly."""
+    import psycopg2
+    db = cfg['database']
+    conn = psycopg2.connect(host=db['host'], port=db['port'], dbname=db['name'],
+                            user=db['user'], password=db['password'])
+    conn.autocommit = autocommit
+    return conn
+
+
+def build_engine(cfg):
+    from sqlalchemy import create_engine
+    db = cfg['database']
+    url = (
+        f"postgresql+psycopg2://{db['user']}:{db['password']}"
+        f"@{db['host']}:{db['port']}/{db['name']}"
+    )
+    return create_engine(url, echo=False)
+
+
+def source_kinds(cur, schema, watched=WATCHED):
+    """source -> 'trigger' (a table), 'poll' (a view) or None (missing)."""
+    cur.execute("SELECT table_name, table_type FROM information_schema.tables WHERE table_schema = %s", (schema,))
+    types = dict(cur.fetchall())
+    return {table: {'BASE TABLE': 'trigger', 'VIEW': 'poll'}.get(types.get(table)) for table in watched}
+
+
+def _columns(specs):
+    return list(dict.fromkeys(column for _, column in specs))
+
+
+# ——— Install ———
+
+def install(conn, schema='public', watched=WATCHED):
+    """Create the log tables, triggers on the tables and poll baselines for the views. Returns source_kinds()."""
+    with conn, conn.cursor() as cur:
+        cur.execute(SCHEMA.format(schema=schema))
+        cur.execute(TRIGGER_FUNCTION.format(schema=schema, channel=CHANNEL))
+        kinds = source_kinds(cur, schema, watched)
+        for table, kind in kinds.items():
+            if kind == 'trigger':
+                args = ', '.join(f"'{k}={column}'" for k, column in watched[table])
+                for suffix, (event, referencing) in TRIGGERS.items():
+                    cur.execute(f"DROP TRIGGER IF EXISTS cmdb_change_{suffix} ON {schema}.{table}")
+                    cur.execute(f"CREATE TRIGGER cmdb_change_{suffix} AFTER {event} ON {schema}.{table} "
+                                f"{referencing} FOR EACH STATEMENT EXECUTE PROCEDURE {schema}.cmdb_log_change({args})")
+            elif kind == 'poll':
+                cur.execute(f"DELETE FROM {schema}.cmdb_change_snapshot WHERE table_name = %s", (table,))
+        cur.execute(f"INSERT INTO {schema}.cmdb_change_consumers (consumer, last_id) "
+                    f"SELECT %s, COALESCE(MAX(id), 0) FROM {schema}.cmdb_change_log "
+                    f"ON CONFLICT (consumer) DO NOTHING", (CONSUMER,))
+    polled = [table for table, kind in kinds.items() if kind == 'poll']
+    if polled:
+        poll(conn, polled, schema, watched)
+    return kinds
+
+
+def uninstall(conn, schema='public', watched=WATCHED):
+    with conn, conn.cursor() as cur:
+        for table, kind in source_kinds(cur, schema, watched).items():
+            if kind == 'trigger':
+                for suffix in TRIGGERS:
+                    cur.execute(f"DROP TRIGGER IF EXISTS cmdb_change_{suffix} ON {schema}.{table}")
+        cur.execute(f"DROP FUNCTION IF EXISTS {schema}.cmdb_log_change()")
+        for table in ('cmdb_change_log', 'cmdb_change_consumers', 'cmdb_change_snapshot'):
+            cur.execute(f"DROP TABLE IF EXISTS {schema}.{table}")
+
+
+# ——— Poll (views) ———
+
+def poll(conn, tables, schema='public', watched=WATCHED):
+    """
+    Fingerprint the rows of each polled source per key-column tuple and log
+    the keys whose fingerprint changed, appeared or disappeared since the last
+    poll. The first poll of a source only records its baseline. Returns {table: changed keys}.
+    """
+    changed = {}
+    for table in tables:
+        specs = watched[table]
+        columns = _columns(specs)
+        key_list = ', '.join(f"t.{c}" for c in columns)
+        with conn, conn.cursor() as cur, span('poll', table=table) as s:
+            cur.execute(
+                f"CREATE TEMPORARY TABLE cmdb_poll_current ON COMMIT DROP AS "
+                f"SELECT json_build_array({key_list})::text AS pk, "
+                f"md5(string_agg(md5(t::text), ',' ORDER BY md5(t::text))) AS fingerprint "
+                f"FROM {schema}.{table} AS t GROUP BY {key_list}"
+            )
+            cur.execute(f"SELECT EXISTS (SELECT 1 FROM {schema}.cmdb_change_snapshot WHERE table_name = %s)", (table,))
+            (baseline,) = cur.fetchone()
+            cur.execute(
+                f"CREATE TEMPORARY TABLE cmdb_poll_changed ON COMMIT DROP AS "
+                f"SELECT COALESCE(c.pk, p.pk) AS pk FROM cmdb_poll_current AS c "
+                f"FULL JOIN (SELECT pk, fingerprint FROM {schema}.cmdb_change_snapshot WHERE table_name = %s) AS p "
+                f"ON p.pk = c.pk WHERE c.fingerprint IS DISTINCT FROM p.fingerprint",
+                (table,),
+            )
+            count = 0
+            if baseline:
+                values = ' UNION ALL '.join(
+                    f"SELECT '{kind}' AS kind, pk::json ->> {columns.index(column)} AS value FROM cmdb_poll_changed"
+                    for kind, column in specs)
+                cur.execute(
+                    f"INSERT INTO {schema}.cmdb_change_log (table_name, op, kind, value) "
+                    f"SELECT DISTINCT %s, 'POLL', x.kind, x.value FROM ({values}) AS x WHERE x.value IS NOT NULL",
+                    (table,),
+                )
+                count = cur.rowcount
+                if count:
+                    cur.execute("SELECT pg_notify(%s, %s)", (CHANNEL, table))
+            cur.execute(f"DELETE FROM {schema}.cmdb_change_snapshot WHERE table_name = %s "
+                        f"AND pk IN (SELECT pk FROM cmdb_poll_changed)", (table,))
+            cur.execute(f"INSERT INTO {schema}.cmdb_change_snapshot (table_name, pk, fingerprint) "
+                        f"SELECT %s, c.pk, c.fingerprint FROM cmdb_poll_current AS c JOIN cmdb_poll_changed USING (pk)",
+                        (table,))
+            s.add(rows=count)
+        changed[table] = count
+    return changed
+
+
+# ——— Resolve ———
+
+def affected_keys(cur, events, schema='public'):
+    """
+    {'lcp', 'service', 'app', 'instance': set(ids), 'all': bool} for logged
+    (kind, value) events. A deleted row can no longer be joined, so it
+    resolves through the values it carried itself and the rows still
+    pointing at it (a deleted app through its instances and child apps).
+    """
+    raw = {}
+    for kind, value in events:
+        raw.setdefault(kind, set()).add(value)
+
+    def lookup(sql, *values):
+        values = [sorted(v) for v in values]
+        if not any(values):
+            return set()
+        cur.execute(sql.format(s=schema), values)
+        return {r[0] for r in cur.fetchall() if r[0] is not None}
+
+    refs = raw.get('ref', set())
+    # A changed app row moves its whole subtree: every app below it and their instances
+    changed_apps = raw.get('app', set())
+    below = lookup(APP_DESCENDANTS, changed_apps)
+    instances = (raw.get('instance', set()) | lookup(INSTANCE_BY_REF, refs)
+                 | lookup(INSTANCE_BY_APP_SYSID, raw.get('app_sysid', set()))
+                 | lookup(INSTANCE_BY_APP, changed_apps | below))
+    apps = (changed_apps | below | lookup(APP_BY_SYSID, raw.get('instance_app_sysid', set()))
+            | lookup(APP_BY_INSTANCE, instances))
+    services = (raw.get('service', set()) | lookup(SERVICE_BY_SYSID, raw.get('instance_service_sysid', set()))
+                | lookup(SERVICE_BY_REF, refs) | lookup(SERVICE_BY_INSTANCE, instances))
+    lcps = raw.get('lcp', set()) | lookup(LCP_BY_REF, refs | instances | services)
+    services |= lookup(SERVICE_BY_LCP, lcps, lcps)
+    return {'lcp': lcps, 'service': services, 'app': apps, 'instance': instances, 'all': 'all' in raw}
+
+
+# ——— Invalidate ———
+
+class Invalidator:
+    """Applies affected keys to the chosen targets; engines, caches and clients are opened on first use."""
+
+    def __init__(self, cfg, targets, cache_dir='.query_cache'):
+        self.cfg = cfg
+        self.targets = targets
+        self.cache_dir = cache_dir
+        self._engine = None
+        self._mongo = None
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            self._engine = build_engine(self.cfg)
+        return self._engine
+
+    def apply(self, keys):
+        """Invalidate ``keys`` (affected_keys()) in every target. Returns {target: summary}."""
+        done = {}
+        everything = keys['all']
+        if 'query-cache' in self.targets:
+            from query_cache import QueryCache
+            cache = QueryCache(self.cache_dir)
+            try:
+                with span('query_cache'):
+                    if everything:
+                        cache.clear()
+                        done['query-cache'] = 'cleared'
+                    else:
+                        done['query-cache'] = f"{cache.invalidate({'lcp': keys['lcp'], 'service': keys['service']})} dropped"
+            finally:
+                cache.close()
+        if 'closure' in self.targets and (everything or keys['app']):
+            import app_closure
+            with span('closure'):
+                result = app_closure.refresh(self.engine)
+            done['closure'] = f"{result['recomputed'] if result.get('recomputed') is not None else 'all'} recomputed"
+        if 'rollup' in self.targets and (everything or keys['lcp']):
+            import lcp_rollup
+            with span('rollup'):
+                result = lcp_rollup.refresh(self.engine) if everything else lcp_rollup.refresh_lcps(self.engine, keys['lcp'])
+            done['rollup'] = f"{result['refreshed'] if result.get('refreshed') is not None else 'all'} refreshed"
+        if 'mongo' in self.targets and (everything or keys['lcp'] or keys['service']):
+            import mongo_store
+            from sqlalchemy.orm import Session
+            if self._mongo is None:
+                self._mongo = mongo_store.open_db(self.cfg)
+            counts = []
+            with span('mongo'):
+                for collection, ids in (('services_by_lcp', keys['lcp']), ('apps_by_service', keys['service'])):
+                    with Session(self.engine) as session:
+                        if everything:
+                            result = mongo_store.sync(self._mongo, collection, mongo_store.BUILDERS[collection](session))
+                            counts.append(f"{collection} resynced")
+                        elif ids:
+                            result = mongo_store.resync(self._mongo, collection, session, ids)
+                            counts.append(f"{collection} {result['upserted']} upserted/{result['deleted']} deleted")
+            done['mongo'] = ', '.join(counts)
+        return done
+
+
+# ——— Listen ———
+
+def consume(conn, invalidator, schema='public', consumer=CONSUMER, batch=BATCH):
+    """Process the log after the consumer's cursor, one batch at a time. Returns the number of log rows."""
+    total = 0
+    while True:
+        with conn, conn.cursor() as cur:
+            cur.execute(f"SELECT last_id FROM {schema}.cmdb_change_consumers WHERE consumer = %s FOR UPDATE",
+                        (consumer,))
+            row = cur.fetchone()
+            if row is None:
+                cur.execute(f"INSERT INTO {schema}.cmdb_change_consumers (consumer, last_id) "
+                            f"SELECT %s, COALESCE(MAX(id), 0) FROM {schema}.cmdb_change_log", (consumer,))
+                return total
+            cur.execute(f"SELECT id, kind, value FROM {schema}.cmdb_change_log WHERE id > %s ORDER BY id LIMIT %s",
+                        (row[0], batch))
+            events = cur.fetchall()
+            if not events:
+                return total
+            with span('resolve', rows=len(events)):
+                keys = affected_keys(cur, [(kind, value) for _, kind, value in events], schema)
+            done = invalidator.apply(keys)
+            cur.execute(f"UPDATE {schema}.cmdb_change_consumers SET last_id = %s WHERE consumer = %s",
+                        (events[-1][0], consumer))
+        total += len(events)
+        scope = 'everything' if keys['all'] else ', '.join(
+            f"{len(keys[k])} {k}(s)" for k in ('lcp', 'service', 'app', 'instance') if keys[k]) or 'no keys'
+        print(f"🔄 {len(events):,} change(s) -> {scope}"
+              + ''.join(f"; {target}: {summary}" for target, summary in done.items()))
+
+
+def listen(cfg, invalidator, schema='public', consumer=CONSUMER, poll_interval=60.0, debounce=1.0, once=False):
+    """Consume on every notification (after ``debounce`` seconds of quiet) and poll the views every ``poll_interval``."""
+    work = connect(cfg)
+    with work.cursor() as cur:
+        polled = [table for table, kind in source_kinds(cur, schema).items() if kind == 'poll']
+    work.commit()
+    if once:
+        if polled:
+            poll(work, polled, schema)
+        consume(work, invalidator, schema, consumer)
+        return
+
+    wake = connect(cfg, autocommit=True)
+    with wake.cursor() as cur:
+        cur.execute(f"LISTEN {CHANNEL}")
+    print(f"👂 Listening on {CHANNEL}; polling {', '.join(polled) or 'nothing'} every {poll_interval:g}s")
+    consume(work, invalidator, schema, consumer)
+    next_poll = time.monotonic()
+    while True:
+        timeout = max(0.0, next_poll - time.monotonic()) if polled else None
+        if select.select([wake], [], [], timeout)[0]:
+            # Let a burst of statements settle into one batch
+            while True:
+                wake.poll()
+                wake.notifies.clear()
+                if not select.select([wake], [], [], debounce)[0]:
+                    break
+        if polled and time.monotonic() >= next_poll:
+            poll(work, polled, schema)
+            next_poll = time.monotonic() + poll_interval
+        consume(work, invalidator, schema, consumer)
+
+
+# ——— Self-test ———
+
+SELFTEST_SCHEMA = 'cmdb_change_selftest'
+SELFTEST_TABLES = """
+CREATE TABLE {s}.lean_control_application (lean_control_service_id TEXT, servicenow_app_id TEXT);
+CREATE TABLE {s}.lean_control_product_backlog_details (lct_product_id TEXT, jira_backlog_id TEXT, is_parent BOOLEAN);
+CREATE TABLE {s}.si_source (correlation_id TEXT, business_application_sysid TEXT,
+                            it_business_service_sysid TEXT, environment TEXT, install_type TEXT);
+CREATE VIEW {s}.vwsfitserviceinstance AS SELECT * FROM {s}.si_source;
+CREATE TABLE {s}.vwsfbusinessapplication (business_application_sys_id TEXT, correlation_id TEXT,
+                                          application_parent_correlation_id TEXT, business_application_name TEXT);
+CREATE TABLE {s}.vwsfitbusinessservice (it_business_service_sysid TEXT, service_correlation_id TEXT, service TEXT);
+INSERT INTO {s}.lean_control_application VALUES ('LCP1', 'SI1'), ('LCP2', 'SVC2');
+INSERT INTO {s}.lean_control_product_backlog_details VALUES ('LCP1', 'JIRA-1', TRUE), ('LCP2', 'JIRA-2', TRUE);
+INSERT INTO {s}.si_source VALUES ('SI1', 'ba1', 'bs1', 'PROD', 'cloud'), ('SI2', 'ba2', 'bs2', 'DEV', 'onprem');
+INSERT INTO {s}.vwsfbusinessapplication VALUES ('ba1', 'APP1', NULL, 'App 1'), ('ba2', 'APP2', 'APP1', 'App 2');
+INSERT INTO {s}.vwsfitbusinessservice VALUES ('bs1', 'SVC1', 'Service 1'), ('bs2', 'SVC2', 'Service 2');
+"""
+# (description, statement, expected affected keys ⊆ resolved keys)
+SELFTEST_CASES = [
+    ('trigger: backlog update', "UPDATE {s}.lean_control_product_backlog_details SET jira_backlog_id = 'JIRA-9' "
+                                "WHERE lct_product_id = 'LCP2'",
+     {'lcp': {'LCP2'}, 'service': {'SVC2'}}),
+    ('trigger: app reparented', "UPDATE {s}.vwsfbusinessapplication SET application_parent_correlation_id = NULL "
+                                "WHERE correlation_id = 'APP2'",
+     {'app': {'APP1', 'APP2'}}),
+    ('poll: instance moved to DEV behind a view', "UPDATE {s}.si_source SET environment = 'DEV' "
+                                                   "WHERE correlation_id = 'SI1'",
+     {'instance': {'SI1'}, 'app': {'APP1'}, 'service': {'SVC1'}, 'lcp': {'LCP1'}}),
+    ('trigger: app deleted', "DELETE FROM {s}.vwsfbusinessapplication WHERE correlation_id = 'APP1'",
+     {'app': {'APP1'}, 'instance': {'SI1'}, 'service': {'SVC1'}, 'lcp': {'LCP1'}}),
+    ('trigger: truncate', "TRUNCATE {s}.vwsfitbusinessservice", {'all': True}),
+]
+
+
+class _Recorder:
+    """Invalidator stand-in that keeps the keys instead of touching the targets."""
+
+    def __init__(self):
+        self.keys = []
+
+    def apply(self, keys):
+        self.keys.append(keys)
+        return {}
+
+
+def selftest(cfg):
+    """Install into a scratch schema, make changes and check the resolved keys. Returns True when all pass."""
+    s = SELFTEST_SCHEMA
+    work = connect(cfg)
+    with work, work.cursor() as cur:
+        cur.execute(f"DROP SCHEMA IF EXISTS {s} CASCADE")
+        cur.execute(f"CREATE SCHEMA {s}")
+        cur.execute(SELFTEST_TABLES.format(s=s))
+    wake = connect(cfg, autocommit=True)
+    ok = True
+    try:
+        kinds = install(work, s)
+        print(f"ℹ️  capture: {', '.join(f'{t}={k}' for t, k in kinds.items())}")
+        with wake.cursor() as cur:
+            cur.execute(f"LISTEN {CHANNEL}")
+        for description, statement, expected in SELFTEST_CASES:
+            with work, work.cursor() as cur:
+                cur.execute(statement.format(s=s))
+            if description.startswith('poll'):
+                poll(work, [t for t, k in kinds.items() if k == 'poll'], s)
+            notified = bool(select.select([wake], [], [], 5)[0])
+            wake.poll()
+            wake.notifies.clear()
+            recorder = _Recorder()
+            consume(work, recorder, s)
+            got = recorder.keys[-1] if recorder.keys else {}
+            passed = notified and all(
+                got.get(kind) == want if isinstance(want, bool) else want <= got.get(kind, set())
+                for kind, want in expected.items())
+            ok &= passed
+            print(f"{'✅' if passed else '❌'} {description}: notified={notified}, "
+                  f"keys={json.dumps({k: sorted(v) if isinstance(v, set) else v for k, v in got.items()})}")
+    finally:
+        with work, work.cursor() as cur:
+            cur.execute(f"DROP SCHEMA IF EXISTS {s} CASCADE")
+        work.close()
+        wake.close()
+    return ok
+
+
+# ——— Main ———
+
+def main():
+    parser = argparse.ArgumentParser(description="Invalidate the derived caches from LISTEN/NOTIFY on the CMDB source tables")
+    parser.add_argument('-c', '--config', default='config.yaml', help='YAML config with the database section (default: config.yaml)')
+    parser.add_argument('--schema', default='public', help='Schema of the source tables (default: public)')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    sub.add_parser('install', help='Create the change log, triggers on the tables and poll baselines for the views')
+    sub.add_parser('uninstall', help='Drop the triggers and the change-log tables')
+
+    p_listen = sub.add_parser('listen', help='Invalidate the affected keys on every change')
+    p_listen.add_argument('--targets', nargs='+', choices=TARGETS, default=['query-cache', 'closure', 'rollup'],
+                          help='What to invalidate (default: query-cache closure rollup)')
+    p_listen.add_argument('--cache-dir', default='.query_cache', help='Result cache to invalidate (default: .query_cache)')
+    p_listen.add_argument('--consumer', default=CONSUMER, help=f'Cursor name in cmdb_change_consumers (default: {CONSUMER})')
+    p_listen.add_argument('--poll-interval', type=float, default=60, help='Seconds between polls of the views (default: 60)')
+    p_listen.add_argument('--debounce', type=float, default=1, help='Seconds of quiet before a batch is processed (default: 1)')
+    p_listen.add_argument('--once', action='store_true', help='Catch up, poll once and exit (cron)')
+    add_profile_args(p_listen)
+
+    p_prune = sub.add_parser('prune', help='Delete change-log rows every consumer has processed')
+    p_prune.add_argument('--days', type=float, default=7, help='Keep at least this many days of log (default: 7)')
+
+    sub.add_parser('selftest', help='Check capture and key resolution in a scratch schema (local Postgres)')
+    args = parser.parse_args()
+
+    cfg = load_config(args.config)
+
+    if args.command == 'selftest':
+        if not selftest(cfg):
+            raise SystemExit(1)
+        return
+
+    conn = connect(cfg)
+    if args.command == 'install':
+        for table, kind in install(conn, args.schema).items():
+            print({'trigger': '🟢', 'poll': '🟡'}.get(kind, '⚪'), f"{table}: {kind or 'missing'}")
+    elif args.command == 'uninstall':
+        uninstall(conn, args.schema)
+        print("✅ Triggers and change-log tables dropped")
+    elif args.command == 'prune':
+        with conn, conn.cursor() as cur:
+            cur.execute(f"DELETE FROM {args.schema}.cmdb_change_log "
+                        f"WHERE changed_at < now() - %s * interval '1 day' "
+                        f"AND id <= (SELECT COALESCE(MIN(last_id), 0) FROM {args.schema}.cmdb_change_consumers)",
+                        (args.days,))
+            print(f"✅ {cur.rowcount:,} log row(s) deleted")
+    else:
+        invalidator = Invalidator(cfg, args.targets, args.cache_dir)
+        with profiling(args):
+            try:
+                listen(cfg, invalidator, args.schema, args.consumer, args.poll_interval, args.debounce, args.once)
+            except KeyboardInterrupt:
+                pass
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,214 @@
+"""
+Array-backed hierarchy for large CMDB exports.
+
+A CompactTree stores one slot per unique node id in parallel NumPy arrays:
+``parent``, ``first_child`` and ``next_sibling`` (int32 indexes, -1 for none)
+plus dictionary-coded metadata columns (int32 codes into a per-column pool of
+distinct values). Ids and dictionary values live in ``StringPool``s, one UTF-8
+buffer plus an offsets array each, so there are no per-node Python objects;
+``NodeView`` is a two-slot handle created on demand.
+
+Like anytree_render, every node hangs under the first parent it appears with
+in the edge table.
+"""
+import numpy as np
+import pandas as pd
+
+from hierarchy import ROOT_ID
+
+META_COLUMNS = [
+    'name', 'lean_control_service_id', 'jira_backlog_id', 'app_id', 'app_name',
+    'instance_id', 'instance_name', 'environment', 'install_type',
+]
+
+
+class StringPool:
+    """Immutable sequence of strings stored as one UTF-8 buffer and int64 offsets."""
+    __slots__ = ('data', 'offsets')
+
+    def __init__(self, values):
+        encoded = [str(v).encode('utf-8') for v in values]
+        self.data = b''.join(encoded)
+        self.offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=self.offsets[1:])
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return self.data[self.offsets[i]:self.offsets[i + 1]].decode('utf-8')
+
+    def index_of(self, value):
+        """Position of ``value`` or -1 (a C-speed scan of the buffer)."""
+        needle = str(value).encode('utf-8')
+        start = 0
+        while True:
+            pos = self.data.find(needle, start)
+            if pos < 0:
+                return -1
+            i = int(np.searchsorted(self.offsets, pos, side='right')) - 1
+            if self.offsets[i] == pos and self.offsets[i + 1] == pos + len(needle):
+                return i
+            start = pos + 1
+
+    @property
+    def nbytes(self):
+        return len(self.data) + self.offsets.nbytes
+
+
+class CompactTree:
+    __slots__ = ('ids', 'parent', 'first_child', 'next_sibling', 'columns')
+
+    def __init__(self, ids, parent, first_child, next_sibling, columns):
+        self.ids = ids
+        self.parent = parent
+        self.first_child = first_child
+        self.next_sibling = next_sibling
+        self.columns = columns
+
+    @classmethod
+    def from_edges(cls, df, root_id=ROOT_ID, columns=META_COLUMNS):
+        """Build from the generate_dataset.py edge table (any row order)."""
+        first = df.drop_duplicates(subset=['id'], keep='first')
+        if not (first['id'] == root_id).any():
+            first = pd.concat([pd.DataFrame({'id': [root_id]}), first], ignore_index=True)
+        ids = first['id'].astype(str)
+        n = len(ids)
+        index = pd.Index(ids)
+        root = index.get_loc(root_id)
+
+        parent = index.get_indexer(first['parent'].astype(str).where(first['parent'].notna(), None)).astype(np.int32)
+        parent[parent < 0] = root           # unknown / missing parent -> root
+        parent[root] = -1
+
+        # Siblings in edge-table order: sort by (parent, position) and link neighbours.
+        order = np.lexsort((np.arange(n), parent)).astype(np.int32)
+        p_sorted = parent[order]
+        same = p_sorted[1:] == p_sorted[:-1]
+        next_sibling = np.full(n, -1, dtype=np.int32)
+        next_sibling[order[:-1][same]] = order[1:][same]
+        first_child = np.full(n, -1, dtype=np.int32)
+        starts = np.concatenate([[True], ~same])
+        heads = order[starts]
+        has_parent = p_sorted[starts] >= 0
+        first_child[p_sorted[starts][has_parent]] = heads[has_parent]
+
+        coded = {}
+        for col in columns:
+            if col in first.columns:
+                codes, uniques = pd.factorize(first[col], use_na_sentinel=True)
+                coded[col] = (codes.astype(np.int32), StringPool(uniques))
+        return cls(StringPool(ids), parent, first_child, next_sibling, coded)
+
+    # ——— Lookups ———
+
+    def __len__(self):
+        return len(self.ids)
+
+    def find(self, node_id):
+        """Index of ``node_id`` or -1."""
+        return self.ids.index_of(node_id)
+
+    def node(self, i):
+        return NodeView(self, i)
+
+    def value(self, col, i):
+        """Decoded metadata value, or None."""
+        codes, uniques = self.columns.get(col, (None, None))
+        if codes is None or codes[i] < 0:
+            return None
+        return uniques[codes[i]]
+
+    def children(self, i):
+        c = self.first_child[i]
+        while c >= 0:
+            yield int(c)
+            c = self.next_sibling[c]
+
+    def nbytes(self):
+        total = self.ids.nbytes + self.parent.nbytes + self.first_child.nbytes + self.next_sibling.nbytes
+        for codes, pool in self.columns.values():
+            total += codes.nbytes + pool.nbytes
+        return total
+
+    # ——— Traversal ———
+
+    def walk(self, roots, max_depth=None, max_children=None, order=None):
+        """
+        Depth-first pre-order over ``roots`` (indexes). Yields
+        (index, depth, branch) where ``branch`` is a tuple of "is last child"
+        flags for each level below the roots. When ``max_children`` cuts a
+        child list short, a (-k, depth, branch) item stands for "+k more".
+        ``order`` may re-sort each child list (default: edge-table order);
+        ``max_children`` keeps the first children in edge-table order before
+        that, as hierarchy.select_subtree does.
+        """
+        stack = [(r, 0, ()) for r in reversed(roots)]
+        while stack:
+            i, depth, branch = stack.pop()
+            yield i, depth, branch
+            if i < 0 or (max_depth is not None and depth >= max_depth):
+                continue
+            kids = list(self.children(i))
+            hidden = 0
+            if max_children is not None and len(kids) > max_children:
+                hidden = len(kids) - max_children
+                kids = kids[:max_children]
+            if order is not None:
+                kids = order(kids)
+            items = kids + ([-hidden] if hidden else [])
+            for pos in range(len(items) - 1, -1, -1):
+                stack.append((items[pos], depth + 1, branch + (pos == len(items) - 1,)))
+
+    def render_lines(self, roots, label, max_depth=None, max_children=None, order=None):
+        """
+        Yield text lines in anytree's RenderTree style, ``label(view)``
+        providing each node's text.
+        """
+        for i, depth, branch in self.walk(roots, max_depth, max_children, order):
+            if branch:
+                prefix = ''.join('    ' if last else '│   ' for last in branch[:-1])
+                prefix += '└── ' if branch[-1] else '├── '
+            else:
+                prefix = ''
+            yield prefix + (f"+{-i} more" if i < 0 else label(NodeView(self, i)))
+
+
+class NodeView:
+    """Lightweight handle on one node of a CompactTree."""
+    __slots__ = ('tree', 'index')
+
+    def __init__(self, tree, index):
+        self.tree = tree
+        self.index = index
+
+    @property
+    def id(self):
+        return self.tree.ids[self.index]
+
+    @property
+    def name(self):
+        return self.tree.value('name', self.index) or self.id
+
+    @property
+    def parent(self):
+        p = self.tree.parent[self.index]
+        return NodeView(self.tree, int(p)) if p >= 0 else None
+
+    @property
+    def is_root(self):
+        return self.tree.parent[self.index] < 0
+
+    @property
+    def children(self):
+        return [NodeView(self.tree, c) for c in self.tree.children(self.index)]
+
+    @property
+    def is_leaf(self):
+        return self.tree.first_child[self.index] < 0
+
+    def get(self, col):
+        return self.tree.value(col, self.index)
+
+    def __repr__(self):
+        return f"NodeView({self.id!r})"
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Render the hierarchy as the DAG it is.
+
+LCP ↔ Service and Backlog ↔ App are many-to-many, so an app can sit under
+several services. anytree_render hangs such a node under the first parent it
+appears with, and treelib_render skips it after its first insertion; both
+drop the other placements. Here every node is drawn under every parent it
+has, and its subtree is rendered once: the lines of a shared subtree are
+memoized and reused at each parent, so the work grows with unique nodes
+rather than with the paths through them.
+
+With --collapse a node's subtree is drawn only at its first placement;
+later placements print a back-reference ("↪ ... see under <parent>")
+instead, which keeps the output proportional to the unique nodes too.
+"""
+import argparse
+
+from hierarchy import ROOT_ID, filter_edges, children_index, more_label, add_selection_args
+from anytree_render import node_label
+from instrument import span, add_profile_args, profiling
+
+
+def reachable(children, roots):
+    """Unique node ids below ``roots`` (included), in depth-first order."""
+    seen, order = set(), []
+    stack = list(reversed(roots))
+    while stack:
+        node = stack.pop()
+        if node in seen:
+            continue
+        seen.add(node)
+        order.append(node)
+        stack.extend(reversed(children.get(node, [])))
+    return order
+
+
+class DagRenderer:
+    """
+    Text tree of a parent -> children index in which a node may have several
+    parents. ``label(node_id)`` is called once per unique node.
+    """
+
+    def __init__(self, children, label, max_depth=None, max_children=None, collapse=False):
+        self.children = children
+        self.label = label
+        self.max_depth = max_depth
+        self.max_children = max_children
+        self.collapse = collapse
+        self.labels = {}
+        self.blocks = {}        # _key(node, depth) -> lines of the node and everything drawn below it
+        self.first_parent = {}  # --collapse: node -> parent it was drawn under
+        self.on_path = set()
+        self.reused = 0
+
+    def _label(self, node):
+        if node not in self.labels:
+            self.labels[node] = self.label(node)
+        return self.labels[node]
+
+    def _key(self, node, depth):
+        """Memo key: without --max-depth a node's block does not depend on where it sits."""
+        if self.max_depth is None:
+            return node
+        return node, max(self.max_depth - depth, 0)
+
+    def block(self, node, parent=None, depth=0):
+        """
+        (lines, reusable) for ``node`` and its subtree, the first line without
+        a connector. A block that ran into a cycle depends on the path that
+        led to it and is not memoized.
+        """
+        if node in self.on_path:
+            return [f"↻ {self._label(node)} (cycle)"], False
+        if self.collapse:
+            if node in self.first_parent:
+                return [f"↪ {self._label(node)} (see under {self.first_parent[node]})"], True
+            self.first_parent[node] = parent
+        elif self._key(node, depth) in self.blocks:
+            self.reused += 1
+            return self.blocks[self._key(node, depth)], True
+
+        lines = [self._label(node)]
+        reusable = True
+        if self.max_depth is None or depth < self.max_depth:
+            kids = self.children.get(node, [])
+            hidden = 0
+            if self.max_children is not None and len(kids) > self.max_children:
+                hidden = len(kids) - self.max_children
+                kids = kids[:self.max_children]
+            self.on_path.add(node)
+            for pos, kid in enumerate(kids):
+                last = pos == len(kids) - 1 and not hidden
+                sub, ok = self.block(kid, node, depth + 1)
+                reusable &= ok
+                lines.append(('└── ' if last else '├── ') + sub[0])
+                pad = '    ' if last else '│   '
+                lines.extend(pad + line for line in sub[1:])
+            self.on_path.discard(node)
+            if hidden:
+                lines.append('└── ' + more_label(hidden))
+
+        if reusable and not self.collapse:
+            self.blocks[self._key(node, depth)] = lines
+        return lines, reusable
+
+    def render(self, roots):
+        lines = []
+        for root in roots:
+            lines.extend(self.block(root)[0])
+        return lines
+
+
+def shared_nodes(children):
+    """Node id -> number of parents, for nodes with more than one."""
+    parents = {}
+    for kids in children.values():
+        for kid in kids:
+            parents[kid] = parents.get(kid, 0) + 1
+    return {node: n for node, n in parents.items() if n > 1}
+
+
+def render_dag(df, roots=None, max_depth=None, max_children=None, collapse=False):
+    """Lines of the DAG rendering of an edge table, plus a stats dict."""
+    roots = roots or [ROOT_ID]
+    with span('index', rows=len(df)):
+        children = children_index(df)
+        nodes = reachable(children, roots)
+
+    # One metadata row per unique visible node, as anytree_render labels them
+    with span('metadata', rows=len(nodes)):
+        meta = (
+            df[df['id'].isin(nodes)]
+            .drop_duplicates(subset=['id'], keep='first')
+            .set_index('id')
+            .to_dict('index')
+        )
+
+    def label(node_id):
+        m = meta.get(node_id, {})
+        return node_label(node_id, m.get('name', node_id), m.get)
+
+    renderer = DagRenderer(children, label, max_depth, max_children, collapse)
+    with span('render') as s:
+        lines = renderer.render(roots)
+        s.add(rows=len(lines))
+    visible = set(nodes)
+    shared = shared_nodes({p: k for p, k in children.items() if p in visible})
+    return lines, {
+        'unique': len(renderer.labels), 'shared': len(shared), 'lines': len(lines), 'reused': renderer.reused,
+    }
+
+
+def write_md(lines, out_file):
+    with span('write') as s, open(out_file, 'w') as f:
+        f.write("```text\n")
+        f.write("\n".join(lines))
+        f.write("\n```\n")
+        s.add(bytes=f.tell())
+    print(f"[dag_render] Markdown tree written to {out_file}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Render the hierarchy with every parent of shared nodes (many-to-many aware)"
+    )
+    parser.add_argument("--input", default="tree_edges.csv", help="Input CSV file path from generate_dataset.py")
+    parser.add_argument("--output", default="tree.md", help="Output Markdown file path")
+    parser.add_argument("--collapse", action="store_true",
+                        help="Draw a shared subtree once; later placements print a back-reference")
+    add_selection_args(parser)
+    add_profile_args(parser)
+    args = parser.parse_args()
+
+    import pandas as pd
+
+    with profiling(args):
+        with span('read_csv') as s:
+            df = pd.read_csv(args.input, dtype=str)
+            s.add(rows=len(df))
+        with span('filter'):
+            df = filter_edges(df, args.env, args.install_type)
+        lines, stats = render_dag(df, args.root, args.max_depth, args.max_children, args.collapse)
+        write_md(lines, args.output)
+    print(f"[dag_render] {stats['unique']:,} unique nodes ({stats['shared']:,} with several parents), "
+          f"{stats['lines']:,} lines, {stats['reused']:,} subtrees reused")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Join Jira and GitLab delivery data onto the CMDB hierarchy and summarise it per LCP.
+
+Inputs (all optional except the hierarchy):
+  * hierarchy CSV from generate_dataset.py (LCP -> jira_backlog_id -> service -> app -> instance)
+  * jira_open_issues_<KEY>.csv files from jira/get_open_issues.py
+  * fix_version,issue_key,repo,commit_url CSV from jira/fetch_repos_from_fixversion.py --output
+  * MR/commit NDJSON from gitlab_collect.py
+
+Jira issues attach to an LCP through their project key, which is the
+``jira_backlog_id``. Repositories attach through the issue keys found in the
+dev-status links and in MR titles/branches/commit messages. Everything is done
+with pandas hash joins and group-bys; there are no Python-level loops over
+rows.
+"""
+import argparse
+import time
+
+ISSUE_KEY_PATTERN = r'\b([A-Z][A-Z0-9_]+)-\d+\b'
+
+
+def load_hierarchy(path):
+    import pandas as pd
+    df = pd.read_csv(path, dtype=str)
+    return df[df['lean_control_service_id'].notna()]
+
+
+def lcp_dimensions(hier):
+    """Per (LCP, backlog) counts of services, apps and instances."""
+    apps = hier[hier['instance_id'].isna() & hier['app_id'].notna()]
+    services = hier[hier['app_id'].isna()]
+    instances = hier[hier['instance_id'].notna()]
+    keys = ['lean_control_service_id', 'jira_backlog_id']
+    dims = hier[keys].drop_duplicates()
+    for name, frame, col in [
+        ('services', services, 'id'),
+        ('apps', apps, 'app_id'),
+        ('instances', instances, 'instance_id'),
+    ]:
+        counts = frame.groupby(keys, dropna=False)[col].nunique().rename(name)
+        dims = dims.merge(counts, on=keys, how='left')
+    return dims
+
+
+def load_jira_issues(paths):
+    import pandas as pd
+    if not paths:
+        return pd.DataFrame(columns=['jira_backlog_id', 'issue_key', 'updated'])
+    issues = pd.concat(
+        (pd.read_csv(p, dtype=str, usecols=['Key', 'Updated']) for p in paths),
+        ignore_index=True,
+    ).rename(columns={'Key': 'issue_key', 'Updated': 'updated'})
+    issues['jira_backlog_id'] = issues['issue_key'].str.extract(ISSUE_KEY_PATTERN, expand=False)
+    issues['updated'] = pd.to_datetime(issues['updated'], utc=True, errors='coerce')
+    return issues.drop_duplicates('issue_key')
+
+
+def load_repo_links(paths):
+    import pandas as pd
+    if not paths:
+        return pd.DataFrame(columns=['jira_backlog_id', 'repo'])
+    links = pd.concat((pd.read_csv(p, dtype=str) for p in paths), ignore_index=True)
+    links['jira_backlog_id'] = links['issue_key'].str.extract(ISSUE_KEY_PATTERN, expand=False)
+    return links.dropna(subset=['jira_backlog_id', 'repo'])[['jira_backlog_id', 'repo']].drop_duplicates()
+
+
+def load_gitlab(paths):
+    """Return (mrs, commits) frames with a ``repo`` column derived from the MR URL."""
+    import pandas as pd
+    if not paths:
+        empty_mrs = pd.DataFrame(columns=['mr_id', 'repo', 'merged_at', 'text'])
+        return empty_mrs, pd.DataFrame(columns=['mr_id', 'commit_id', 'message'])
+    raw = pd.concat((pd.read_json(p, lines=True, dtype=False) for p in paths), ignore_index=True)
+    raw = raw.drop_duplicates('mr_id')
+    mrs = pd.DataFrame({
+        'mr_id': raw['mr_id'],
+        'repo': raw['web_url'].str.extract(r'/([^/]+)/-/merge_requests/', expand=False),
+        'merged_at': pd.to_datetime(raw['merged_at'], utc=True, errors='coerce'),
+        'text': raw['title'].fillna('') + ' ' + raw['source_branch'].fillna(''),
+    })
+    commits = raw[['mr_id', 'commits']].explode('commits').dropna(subset=['commits'])
+    commits = pd.DataFrame({
+        'mr_id': commits['mr_id'].to_numpy(),
+        'commit_id': commits['commits'].str.get('id').to_numpy(),
+        'message': commits['commits'].str.get('message').fillna('').to_numpy(),
+    })
+    return mrs, commits
+
+
+def mr_backlog_links(mrs, commits, repo_links):
+    """(mr_id, jira_backlog_id) pairs from issue keys in MR text, commit messages and repo links."""
+    import pandas as pd
+    texts = pd.concat([mrs[['mr_id', 'text']], commits.rename(columns={'message': 'text'})[['mr_id', 'text']]])
+    by_key = (
+        texts.set_index('mr_id')['text']
+        .str.extractall(ISSUE_KEY_PATTERN)[0]
+        .rename('jira_backlog_id')
+        .reset_index(level='match', drop=True)
+        .reset_index()
+    )
+    by_repo = mrs[['mr_id', 'repo']].merge(repo_links, on='repo')[['mr_id', 'jira_backlog_id']]
+    return pd.concat([by_key, by_repo], ignore_index=True).drop_duplicates()
+
+
+def delivery_activity(hier, issues, repo_links, mrs, commits):
+    import pandas as pd
+    dims = lcp_dimensions(hier)
+
+    issue_stats = issues.groupby('jira_backlog_id').agg(
+        open_issues=('issue_key', 'nunique'),
+        last_issue_update=('updated', 'max'),
+    )
+
+    links = mr_backlog_links(mrs, commits, repo_links)
+    mr_facts = links.merge(mrs[['mr_id', 'repo', 'merged_at']], on='mr_id')
+    mr_stats = mr_facts.groupby('jira_backlog_id').agg(
+        merged_mrs=('mr_id', 'nunique'),
+        last_merged_at=('merged_at', 'max'),
+    )
+    commit_stats = (
+        links.merge(commits[['mr_id', 'commit_id']], on='mr_id')
+        .groupby('jira_backlog_id')['commit_id'].nunique().rename('commits')
+    )
+    repos = pd.concat([repo_links, mr_facts[['jira_backlog_id', 'repo']]]).dropna().drop_duplicates()
+    repo_stats = repos.groupby('jira_backlog_id')['repo'].agg(
+        repo_count='nunique',
+        repos=lambda s: ', '.join(sorted(s.unique())),
+    )
+
+    out = dims
+    for stats in (issue_stats, mr_stats, commit_stats, repo_stats):
+        out = out.merge(stats, left_on='jira_backlog_id', right_index=True, how='left')
+
+    count_cols = ['services', 'apps', 'instances', 'open_issues', 'merged_mrs', 'commits', 'repo_count']
+    out[count_cols] = out[count_cols].fillna(0).astype(int)
+    out['repos'] = out['repos'].fillna('')
+    return out.sort_values(['merged_mrs', 'open_issues', 'lean_control_service_id'],
+                           ascending=[False, False, True])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-LCP delivery activity from CMDB hierarchy + Jira + GitLab exports")
+    parser.add_argument('--hierarchy', required=True, help='Hierarchy CSV from generate_dataset.py')
+    parser.add_argument('--jira-issues', nargs='*', default=[], help='jira_open_issues_<KEY>.csv file(s)')
+    parser.add_argument('--repo-links', nargs='*', default=[],
+                        help='fix_version,issue_key,repo,commit_url CSV(s) from fetch_repos_from_fixversion.py --output')
+    parser.add_argument('--gitlab', nargs='*', default=[], help='NDJSON file(s) from gitlab_collect.py')
+    parser.add_argument('--output', '-o', default='delivery_activity.csv', help='Output CSV (default: delivery_activity.csv)')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    hier = load_hierarchy(args.hierarchy)
+    issues = load_jira_issues(args.jira_issues)
+    repo_links = load_repo_links(args.repo_links)
+    mrs, commits = load_gitlab(args.gitlab)
+    loaded = time.perf_counter()
+
+    result = delivery_activity(hier, issues, repo_links, mrs, commits)
+    result.to_csv(args.output, index=False)
+    finished = time.perf_counter()
+
+    print(f"[delivery_activity] {len(hier):,} hierarchy rows, {len(issues):,} issues, "
+          f"{len(mrs):,} MRs, {len(commits):,} commits loaded in {loaded - started:.2f}s")
+    print(f"[delivery_activity] Wrote {len(result):,} LCP rows to '{args.output}' "
+          f"(join {finished - loaded:.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
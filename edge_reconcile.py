@@ -0,0 +1,218 @@
+"""
+Run the by_si and by_ts extractions side by side and reconcile their edges.
+
+Each base runs on its own connection in a worker thread and streams its edge
+table, ordered by (parent, id), into a bounded queue. The main thread writes
+both CSVs and merge-joins the two ordered streams in one pass, holding only
+the rows of the current (parent, id) key, so memory stays bounded by the
+queue size whatever the size of the hierarchy.
+
+An edge's metadata (every column but parent and id) is compared by its
+xxhash digest. With by_si as the reference, the reconciliation CSV lists
+
+  missing      edges by_si has and by_ts does not
+  added        edges by_ts has and by_si does not
+  conflicting  (parent, id) pairs both have, with different metadata; one
+               row per side, ``columns`` naming the fields that differ
+"""
+import csv
+import functools
+import hashlib
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from instrument import span
+
+BASES = ('by_si', 'by_ts')
+BATCH = 5_000
+QUEUE_BATCHES = 8
+FIELD_SEPARATOR = '\x1f'
+NULL = '\x00'
+
+
+@functools.lru_cache(maxsize=None)
+def _hash_function():
+    """xxh3-64 when xxhash is installed, an 8-byte blake2b otherwise."""
+    try:
+        import xxhash
+    except ImportError:
+        return lambda data: hashlib.blake2b(data, digest_size=8).hexdigest()
+    return xxhash.xxh3_64_hexdigest
+
+
+def digest(values):
+    """64-bit hex digest of a row's metadata."""
+    return _hash_function()(FIELD_SEPARATOR.join(NULL if v is None else str(v) for v in values).encode())
+
+
+def ordered_sql(sql, dialect):
+    """
+    The pipeline SQL re-ordered by (parent, id), bytewise on Postgres so the
+    order matches Python's string comparison; the root's NULL parent sorts first.
+    """
+    collate = ' COLLATE "C"' if dialect == 'postgresql' else ''
+    return (f"SELECT * FROM (\n{sql}\n) AS edges\n"
+            f"ORDER BY COALESCE(parent, ''){collate}, COALESCE(id, ''){collate}")
+
+
+def edge_key(row, parent_pos, id_pos):
+    return (row[parent_pos] or '', row[id_pos] or '')
+
+
+# ——— Producers ———
+
+def _put(out, item, stop):
+    """Put ``item`` on the bounded queue unless the consumer gave up (``stop``). Returns False if it did."""
+    while not stop.is_set():
+        try:
+            out.put(item, timeout=0.5)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def stream_base(engine, sql, out, stop, batch=BATCH):
+    """Worker: put the result's column names, then row batches, then None on ``out``; errors are put too."""
+    from sqlalchemy import text
+
+    try:
+        with engine.connect() as conn, span('query') as s:
+            result = conn.execution_options(stream_results=True).execute(text(sql))
+            if not _put(out, list(result.keys()), stop):
+                return
+            while True:
+                rows = result.fetchmany(batch)
+                if not rows:
+                    break
+                s.add(rows=len(rows))
+                if not _put(out, [tuple(r) for r in rows], stop):
+                    return
+        _put(out, None, stop)
+    except BaseException as e:
+        _put(out, e, stop)
+
+
+def _drain(q):
+    """Rows from a producer queue, re-raising its error."""
+    while True:
+        item = q.get()
+        if item is None:
+            return
+        if isinstance(item, BaseException):
+            raise item
+        yield from item
+
+
+def _header(q):
+    item = q.get()
+    if isinstance(item, BaseException):
+        raise item
+    return item
+
+
+def _groups(rows, writer, key, tally, base):
+    """(key, [rows]) for consecutive rows with the same key, writing and counting each row on the way."""
+    current, group = None, []
+    for row in rows:
+        writer.writerow(row)
+        tally[base] += 1
+        k = key(row)
+        if group and k != current:
+            yield current, group
+            group = []
+        current = k
+        group.append(row)
+    if group:
+        yield current, group
+
+
+# ——— Reconciliation ———
+
+def reconcile(left, right, columns, emit):
+    """
+    Merge-join two (key, rows) streams sorted by key. ``emit(status, side, row,
+    differing columns)`` is called for every unmatched or conflicting row.
+    Returns counts of matched, missing, added and conflicting keys.
+    """
+    meta = [i for i, c in enumerate(columns) if c not in ('parent', 'id')]
+
+    def hashed(rows):
+        return {digest([row[i] for i in meta]): row for row in rows}
+
+    counts = {'matched': 0, 'missing': 0, 'added': 0, 'conflicting': 0}
+    a, b = next(left, None), next(right, None)
+    while a is not None or b is not None:
+        if b is None or (a is not None and a[0] < b[0]):
+            for row in hashed(a[1]).values():
+                emit('missing', 'by_si', row, '')
+            counts['missing'] += 1
+            a = next(left, None)
+        elif a is None or b[0] < a[0]:
+            for row in hashed(b[1]).values():
+                emit('added', 'by_ts', row, '')
+            counts['added'] += 1
+            b = next(right, None)
+        else:
+            si, ts = hashed(a[1]), hashed(b[1])
+            if si.keys() == ts.keys():
+                counts['matched'] += 1
+            else:
+                only_si = [si[h] for h in si.keys() - ts.keys()]
+                only_ts = [ts[h] for h in ts.keys() - si.keys()]
+                for side, rows, others in (('by_si', only_si, only_ts or list(ts.values())),
+                                           ('by_ts', only_ts, only_si or list(si.values()))):
+                    for row in rows:
+                        differ = [columns[i] for i in meta if all(row[i] != o[i] for o in others)]
+                        emit('conflicting', side, row, ' '.join(differ))
+                counts['conflicting'] += 1
+            a, b = next(left, None), next(right, None)
+    return counts
+
+
+def extract_both(engine, cfg, outputs, report_path, batch=BATCH, queue_batches=QUEUE_BATCHES):
+    """
+    Extract both bases concurrently to ``outputs`` (base -> CSV path) and
+    write the reconciliation to ``report_path``. Returns {'rows': {base: n}, **reconcile counts}.
+    """
+    from generate_dataset import build_sql
+
+    queues = {base: queue.Queue(maxsize=queue_batches) for base in BASES}
+    stop = threading.Event()
+    tally = dict.fromkeys(BASES, 0)
+    files = {base: open(path, 'w', newline='') for base, path in outputs.items()}
+    try:
+        with ThreadPoolExecutor(max_workers=len(BASES), thread_name_prefix='extract') as pool, \
+                open(report_path, 'w', newline='') as report_file:
+            for base in BASES:
+                pool.submit(stream_base, engine, ordered_sql(build_sql(cfg, base), engine.dialect.name),
+                            queues[base], stop, batch)
+            try:
+                headers = {base: _header(queues[base]) for base in BASES}
+                columns = headers['by_si']
+                if headers['by_ts'] != columns:
+                    raise ValueError(f"by_si and by_ts return different columns: {columns} vs {headers['by_ts']}")
+                pos = (columns.index('parent'), columns.index('id'))
+
+                groups = {}
+                for base in BASES:
+                    writer = csv.writer(files[base])
+                    writer.writerow(columns)
+                    groups[base] = _groups(_drain(queues[base]), writer, lambda row: edge_key(row, *pos),
+                                           tally, base)
+
+                report = csv.writer(report_file)
+                report.writerow(['status', 'side', 'columns'] + columns)
+                with span('reconcile') as s:
+                    counts = reconcile(groups['by_si'], groups['by_ts'], columns,
+                                       lambda status, side, row, differ: report.writerow([status, side, differ, *row]))
+                    s.add(rows=sum(counts.values()))
+            except BaseException:
+                stop.set()
+                raise
+    finally:
+        for f in files.values():
+            f.close()
+    counts['rows'] = tally
+    return counts
@@ -5,46 +5,64 @@ import yaml
 import argparse
 import json
 import logging
-import sqlparse
-from sqlalchemy import create_engine, Column, String
-from sqlalchemy.orm import declarative_base, Session, aliased
+import functools
+
+from instrument import span, add_profile_args, profiling
+from query_cache import cached_query, table_rows, add_cache_args, open_cache, report
+from app_closure import component_chains, app_node, nest, children_to_lists
 
 # ——— Setup Logging ———
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s %(levelname)s: %(message)s')
 logger = logging.getLogger(__name__)
 
 # ——— Models ———
-Base = declarative_base()
-
-class LeanControlApplication(Base):
-    __tablename__ = 'lean_control_application'
-    __table_args__ = {'schema': 'public'}
-    lean_control_service_id = Column(String, primary_key=True)
-    servicenow_app_id       = Column(String, index=True)
-
-class ProductBacklogDetails(Base):
-    __tablename__ = 'lean_control_product_backlog_details'
-    __table_args__ = {'schema': 'public'}
-    lct_product_id  = Column(String, primary_key=True)
-    jira_backlog_id = Column(String)
-
-class ServiceInstance(Base):
-    __tablename__ = 'vwsfitserviceinstance'
-    __table_args__ = {'schema': 'public'}
-    correlation_id             = Column(String, primary_key=True)
-    it_business_service        = Column('it_business_service', String)
-    business_application_sysid = Column(String)
-    it_service_instance        = Column(String)
-    environment                = Column(String)
-    install_type               = Column(String)
-
-class BusinessApp(Base):
-    __tablename__ = 'vwsfbusinessapplication'
-    __table_args__ = {'schema': 'public'}
-    business_application_sys_id       = Column(String, primary_key=True)
-    correlation_id                    = Column(String, index=True)
-    business_application_name         = Column(String)
-    application_parent_correlation_id = Column(String)
+@functools.lru_cache(maxsize=None)
+def orm_models():
+    """Declare the ORM models on first use, so --help and config errors don't load SQLAlchemy."""
+    from sqlalchemy import Column, Integer, String
+    from sqlalchemy.orm import declarative_base
+
+    Base = declarative_base()
+
+    class LeanControlApplication(Base):
+        __tablename__ = 'lean_control_application'
+        __table_args__ = {'schema': 'public'}
+        lean_control_service_id = Column(String, primary_key=True)
+        servicenow_app_id       = Column(String, index=True)
+
+    class ProductBacklogDetails(Base):
+        __tablename__ = 'lean_control_product_backlog_details'
+        __table_args__ = {'schema': 'public'}
+        lct_product_id  = Column(String, primary_key=True)
+        jira_backlog_id = Column(String)
+
+    class ServiceInstance(Base):
+        __tablename__ = 'vwsfitserviceinstance'
+        __table_args__ = {'schema': 'public'}
+        correlation_id             = Column(String, primary_key=True)
+        it_business_service        = Column('it_business_service', String)
+        business_application_sysid = Column(String)
+        it_service_instance        = Column(String)
+        environment                = Column(String)
+        install_type               = Column(String)
+
+    class BusinessApp(Base):
+        __tablename__ = 'vwsfbusinessapplication'
+        __table_args__ = {'schema': 'public'}
+        business_application_sys_id       = Column(String, primary_key=True)
+        correlation_id                    = Column(String, index=True)
+        business_application_name         = Column(String)
+        application_parent_correlation_id = Column(String)
+
+    class AppClosure(Base):
+        # Built and refreshed by app_closure.py
+        __tablename__ = 'app_closure'
+        __table_args__ = {'schema': 'public'}
+        ancestor_id   = Column(String, primary_key=True)
+        descendant_id = Column(String, primary_key=True)
+        depth         = Column(Integer)
+
+    return LeanControlApplication, ProductBacklogDetails, ServiceInstance, BusinessApp, AppClosure
 
 # ——— Helpers ———
 
@@ -53,6 +71,7 @@ def load_config(path):
         return yaml.safe_load(f)
 
 def build_engine(cfg):
+    from sqlalchemy import create_engine
     db = cfg['database']
     url = (
         f"postgresql+psycopg2://{db['user']}:{db['password']}"
@@ -60,6 +79,95 @@ def build_engine(cfg):
     )
     return create_engine(url, echo=False)
 
+# ——— Query & Grouping ———
+
+def build_query(session, lean_control_service_ids=None):
+    from sqlalchemy.orm import aliased
+
+    LeanControlApplication, ProductBacklogDetails, ServiceInstance, BusinessApp, AppClosure = orm_models()
+    ChildApp    = aliased(BusinessApp)
+    AncestorApp = aliased(BusinessApp)
+
+    q = (
+        session.query(
+            ServiceInstance.it_business_service.label('biz_service_id'),
+            LeanControlApplication.lean_control_service_id.label('lean_control_service_id'),
+            ProductBacklogDetails.jira_backlog_id.label('jira_backlog_id'),
+            ChildApp.correlation_id.label('app_id'),
+            ChildApp.business_application_name.label('app_name'),
+            AppClosure.ancestor_id.label('ancestor_id'),
+            AncestorApp.business_application_name.label('ancestor_name'),
+            AppClosure.depth.label('depth'),
+            ServiceInstance.correlation_id.label('instance_id'),
+            ServiceInstance.it_service_instance,
+            ServiceInstance.environment,
+            ServiceInstance.install_type
+        )
+        .join(LeanControlApplication,
+              LeanControlApplication.servicenow_app_id == ServiceInstance.correlation_id)
+        .join(ProductBacklogDetails,
+              ProductBacklogDetails.lct_product_id == LeanControlApplication.lean_control_service_id)
+        .join(ChildApp,
+              ServiceInstance.business_application_sysid == ChildApp.business_application_sys_id)
+        # One row per ancestor of the instance's app, whatever the depth of its parent chain
+        .outerjoin(AppClosure,
+                   (AppClosure.descendant_id == ChildApp.correlation_id) & (AppClosure.depth > 0))
+        .outerjoin(AncestorApp,
+                   AncestorApp.correlation_id == AppClosure.ancestor_id)
+    )
+
+    if lean_control_service_ids:
+        q = q.filter(
+            LeanControlApplication.lean_control_service_id.in_(lean_control_service_ids)
+        )
+    return q
+
+
+def group_services(rows):
+    """
+    Group query rows into services -> apps -> instances. Apps are the root
+    components of their parent chains and nest their sub-components to any
+    depth; an instance is listed under the root app and under its own app.
+    """
+    services = {}
+    chains = component_chains(rows, key=lambda r: (
+        r.biz_service_id, r.lean_control_service_id, r.jira_backlog_id, r.app_id, r.instance_id))
+    for _, row, chain in chains:
+        svc_id = row.biz_service_id
+        inst = {
+            'instance_id': row.instance_id,
+            'it_service_instance': row.it_service_instance,
+            'environment': row.environment,
+            'install_type': row.install_type
+        }
+
+        # initialize service
+        service = services.setdefault(svc_id, {
+            'it_business_service': svc_id,
+            'lean_control_service_id': row.lean_control_service_id,
+            'jira_backlog_id': row.jira_backlog_id,
+            'apps': {}
+        })
+
+        # root component, then the chain down to the instance's own app
+        (root_id, root_name), below = chain[0], chain[1:]
+        app = service['apps'].setdefault(root_id, app_node(root_id, root_name))
+        own = nest(app['children'], below) or app
+
+        # dedupe instance
+        for node in ([app] if own is app else [app, own]):
+            if not any(si['instance_id'] == inst['instance_id'] for si in node['service_instances']):
+                node['service_instances'].append(inst)
+
+    # finalize structure
+    output = []
+    for svc in services.values():
+        svc['apps'] = [children_to_lists(app) for app in svc['apps'].values()]
+        output.append(svc)
+
+    return output
+
+
 # ——— Main ———
 def main():
     parser = argparse.ArgumentParser(
@@ -74,44 +182,38 @@ def main():
         'lean_control_service_ids', nargs='*', metavar='LEAN_CONTROL_SERVICE_ID',
         help='Zero or more lean_control_service_id values; if omitted, returns all'
     )
+    parser.add_argument(
+        '--source', choices=['sql', 'mongo'], default='sql',
+        help='Join the CMDB tables (default) or read the documents loaded by mongo_store.py'
+    )
+    add_cache_args(parser)
+    add_profile_args(parser)
     args = parser.parse_args()
 
     cfg = load_config(args.config)
+
+    if args.source == 'mongo':
+        from mongo_store import open_db, find_documents
+        with profiling(args):
+            with span('query') as s:
+                result = find_documents(open_db(cfg), 'services_by_lcp', args.lean_control_service_ids)
+                s.add(rows=len(result))
+            with span('serialize'):
+                output = json.dumps(result, indent=2)
+            with span('write'):
+                print(output)
+        return
+
     engine = build_engine(cfg)
+    cache = open_cache(args, cfg)
 
-    ChildApp  = aliased(BusinessApp)
-    ParentApp = aliased(BusinessApp)
-
-    with Session(engine) as session:
-        # build query
-        q = (
-            session.query(
-                ServiceInstance.it_business_service.label('biz_service_id'),
-                LeanControlApplication.lean_control_service_id.label('lean_control_service_id'),
-                ProductBacklogDetails.jira_backlog_id.label('jira_backlog_id'),
-                ParentApp.correlation_id.label('parent_id'),
-                ParentApp.business_application_name.label('parent_name'),
-                ChildApp.correlation_id.label('child_id'),
-                ChildApp.business_application_name.label('child_name'),
-                ServiceInstance.correlation_id.label('instance_id'),
-                ServiceInstance.it_service_instance,
-                ServiceInstance.environment,
-                ServiceInstance.install_type
-            )
-            .join(LeanControlApplication,
-                  LeanControlApplication.servicenow_app_id == ServiceInstance.correlation_id)
-            .join(ProductBacklogDetails,
-                  ProductBacklogDetails.lct_product_id == LeanControlApplication.lean_control_service_id)
-            .join(ChildApp,
-                  ServiceInstance.business_application_sysid == ChildApp.business_application_sys_id)
-            .outerjoin(ParentApp,
-                       ChildApp.application_parent_correlation_id == ParentApp.correlation_id)
-        )
+    import sqlparse
+    from sqlalchemy.orm import Session
 
-        if args.lean_control_service_ids:
-            q = q.filter(
-                LeanControlApplication.lean_control_service_id.in_(args.lean_control_service_ids)
-            )
+    with profiling(args), Session(engine) as session:
+        with span('connect'):
+            session.connection()
+        q = build_query(session, args.lean_control_service_ids)
 
         # log SQL
         raw_sql = str(q.statement.compile(
@@ -120,72 +222,25 @@ def main():
         formatted_sql = sqlparse.format(raw_sql, reindent=True, keyword_case='upper')
         logger.debug("Generated SQL:\n%s", formatted_sql)
 
-        rows = q.all()
-
-    # group into services -> apps -> instances
-    services = {}
-    for row in rows:
-        svc_id = row.biz_service_id
-        lean_id = row.lean_control_service_id
-        jira_id = row.jira_backlog_id
-        pid = row.parent_id
-        cid = row.child_id
-        inst = {
-            'instance_id': row.instance_id,
-            'it_service_instance': row.it_service_instance,
-            'environment': row.environment,
-            'install_type': row.install_type
-        }
-
-        # initialize service
-        service = services.setdefault(svc_id, {
-            'it_business_service': svc_id,
-            'lean_control_service_id': lean_id,
-            'jira_backlog_id': jira_id,
-            'apps': {}
-        })
-
-        # determine app key and record
-        if pid is None:
-            app_key = cid
-            app_name = row.child_name
-        else:
-            app_key = pid
-            app_name = row.parent_name
-
-        app = service['apps'].setdefault(app_key, {
-            'app_id': app_key,
-            'app_name': app_name,
-            'service_instances': [],
-            'children': {}
-        })
-
-        # dedupe instance
-        if not any(si['instance_id'] == inst['instance_id'] for si in app['service_instances']):
-            app['service_instances'].append(inst)
-
-        # children grouping
-        if pid is not None:
-            child = app['children'].setdefault(cid, {
-                'app_id': cid,
-                'app_name': row.child_name,
-                'service_instances': []
-            })
-            if not any(si['instance_id']==inst['instance_id'] for si in child['service_instances']):
-                child['service_instances'].append(inst)
-
-    # finalize structure
-    output = []
-    for svc in services.values():
-        # convert apps dict to list and children dicts
-        apps_list = []
-        for app in svc['apps'].values():
-            app['children'] = list(app['children'].values())
-            apps_list.append(app)
-        svc['apps'] = apps_list
-        output.append(svc)
+        with span('query') as s:
+            if cache is None:
+                rows = q.all()
+            else:
+                # Tagged with the requested ids so change_feed.py drops only results for changed lcps
+                tags = [('lcp', i) for i in args.lean_control_service_ids] or None
+                rows = table_rows(cached_query(cache, session.connection(), q.statement,
+                                               refresh=args.refresh, tags=tags))
+            s.add(rows=len(rows))
+
+        with span('group', rows=len(rows)):
+            result = group_services(rows)
+        with span('serialize'):
+            output = json.dumps(result, indent=2)
+        with span('write'):
+            print(output)
+
+    report(cache)
 
-    print(json.dumps(output, indent=2))
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -5,51 +5,69 @@ import yaml
 import argparse
 import json
 import logging
-import sqlparse
-from sqlalchemy import create_engine, Column, String
-from sqlalchemy.orm import declarative_base, Session, aliased
+import functools
+
+from instrument import span, add_profile_args, profiling
+from query_cache import cached_query, table_rows, add_cache_args, open_cache, report
+from app_closure import component_chains, nest, children_to_lists
 
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s %(levelname)s: %(message)s')
 logger = logging.getLogger(__name__)
 
 # ——— Models ———
-Base = declarative_base()
-
-class BusinessService(Base):
-    __tablename__ = 'vwsfitbusinessservice'
-    __table_args__ = {'schema': 'public'}
-    it_business_service_sysid = Column(String, primary_key=True)
-    service_correlation_id    = Column(String, index=True)
-
-class ServiceInstance(Base):
-    __tablename__ = 'vwsfitserviceinstance'
-    __table_args__ = {'schema': 'public'}
-    correlation_id             = Column(String, primary_key=True)
-    it_business_service_sysid  = Column(String)
-    business_application_sysid = Column(String)
-    it_service_instance        = Column('it_service_instance', String)
-    environment                = Column('environment',         String)
-    install_type               = Column('install_type',        String)
-
-class LeanControlApplication(Base):
-    __tablename__ = 'lean_control_application'
-    __table_args__ = {'schema': 'public'}
-    lean_control_service_id = Column(String, primary_key=True)
-    servicenow_app_id       = Column(String, index=True)
-
-class ProductBacklogDetails(Base):
-    __tablename__ = 'lean_control_product_backlog_details'
-    __table_args__ = {'schema': 'public'}
-    lct_product_id  = Column(String, primary_key=True)
-    jira_backlog_id = Column(String)
-
-class BusinessApp(Base):
-    __tablename__ = 'vwsfbusinessapplication'
-    __table_args__ = {'schema': 'public'}
-    business_application_sys_id      = Column(String, primary_key=True)
-    correlation_id                   = Column(String, index=True)
-    business_application_name        = Column(String)
-    application_parent_correlation_id = Column(String)
+@functools.lru_cache(maxsize=None)
+def orm_models():
+    """Declare the ORM models on first use, so --help and config errors don't load SQLAlchemy."""
+    from sqlalchemy import Column, Integer, String
+    from sqlalchemy.orm import declarative_base
+
+    Base = declarative_base()
+
+    class BusinessService(Base):
+        __tablename__ = 'vwsfitbusinessservice'
+        __table_args__ = {'schema': 'public'}
+        it_business_service_sysid = Column(String, primary_key=True)
+        service_correlation_id    = Column(String, index=True)
+
+    class ServiceInstance(Base):
+        __tablename__ = 'vwsfitserviceinstance'
+        __table_args__ = {'schema': 'public'}
+        correlation_id             = Column(String, primary_key=True)
+        it_business_service_sysid  = Column(String)
+        business_application_sysid = Column(String)
+        it_service_instance        = Column('it_service_instance', String)
+        environment                = Column('environment',         String)
+        install_type               = Column('install_type',        String)
+
+    class LeanControlApplication(Base):
+        __tablename__ = 'lean_control_application'
+        __table_args__ = {'schema': 'public'}
+        lean_control_service_id = Column(String, primary_key=True)
+        servicenow_app_id       = Column(String, index=True)
+
+    class ProductBacklogDetails(Base):
+        __tablename__ = 'lean_control_product_backlog_details'
+        __table_args__ = {'schema': 'public'}
+        lct_product_id  = Column(String, primary_key=True)
+        jira_backlog_id = Column(String)
+
+    class BusinessApp(Base):
+        __tablename__ = 'vwsfbusinessapplication'
+        __table_args__ = {'schema': 'public'}
+        business_application_sys_id      = Column(String, primary_key=True)
+        correlation_id                   = Column(String, index=True)
+        business_application_name        = Column(String)
+        application_parent_correlation_id = Column(String)
+
+    class AppClosure(Base):
+        # Built and refreshed by app_closure.py
+        __tablename__ = 'app_closure'
+        __table_args__ = {'schema': 'public'}
+        ancestor_id   = Column(String, primary_key=True)
+        descendant_id = Column(String, primary_key=True)
+        depth         = Column(Integer)
+
+    return BusinessService, ServiceInstance, LeanControlApplication, ProductBacklogDetails, BusinessApp, AppClosure
 
 # ——— Helpers ———
 
@@ -58,6 +76,7 @@ def load_config(path):
         return yaml.safe_load(f)
 
 def build_engine(cfg):
+    from sqlalchemy import create_engine
     db = cfg['database']
     url = (
         f"postgresql+psycopg2://{db['user']}:{db['password']}"
@@ -65,6 +84,101 @@ def build_engine(cfg):
     )
     return create_engine(url, echo=False)
 
+# ——— Query & Grouping ———
+
+def build_query(session, service_correlation_ids=None):
+    from sqlalchemy.orm import aliased
+
+    (BusinessService, ServiceInstance, LeanControlApplication, ProductBacklogDetails, BusinessApp,
+     AppClosure) = orm_models()
+    ChildApp    = aliased(BusinessApp)
+    AncestorApp = aliased(BusinessApp)
+
+    q = (
+        session.query(
+            LeanControlApplication.lean_control_service_id.label('lean_control_service_id'),
+            ProductBacklogDetails.jira_backlog_id.label('jira_backlog_id'),
+            BusinessService.service_correlation_id.label('service_correlation_id'),
+            ChildApp.correlation_id.label('app_id'),
+            ChildApp.business_application_name.label('app_name'),
+            AppClosure.ancestor_id.label('ancestor_id'),
+            AncestorApp.business_application_name.label('ancestor_name'),
+            AppClosure.depth.label('depth'),
+            ServiceInstance.correlation_id.label('instance_id'),
+            ServiceInstance.it_service_instance,
+            ServiceInstance.environment,
+            ServiceInstance.install_type
+        )
+        .join(
+            ServiceInstance,
+            BusinessService.it_business_service_sysid == ServiceInstance.it_business_service_sysid
+        )
+        .join(
+            LeanControlApplication,
+            LeanControlApplication.servicenow_app_id == ServiceInstance.correlation_id
+        )
+        .join(
+            ProductBacklogDetails,
+            ProductBacklogDetails.lct_product_id == LeanControlApplication.lean_control_service_id
+        )
+        .join(
+            ChildApp,
+            ServiceInstance.business_application_sysid == ChildApp.business_application_sys_id
+        )
+        # One row per ancestor of the instance's app, whatever the depth of its parent chain
+        .outerjoin(
+            AppClosure,
+            (AppClosure.descendant_id == ChildApp.correlation_id) & (AppClosure.depth > 0)
+        )
+        .outerjoin(
+            AncestorApp,
+            AncestorApp.correlation_id == AppClosure.ancestor_id
+        )
+    )
+
+    if service_correlation_ids:
+        q = q.filter(
+            BusinessService.service_correlation_id.in_(
+                service_correlation_ids
+            )
+        )
+    return q
+
+
+def group_apps(rows):
+    """
+    Group query rows into root components (per LCP and service) with their
+    sub-components nested to any depth; each instance sits under its own app.
+    """
+    apps = {}
+    chains = component_chains(rows, key=lambda r: (
+        r.lean_control_service_id, r.jira_backlog_id, r.service_correlation_id, r.app_id, r.instance_id))
+    for _, row, chain in chains:
+        prod = row.lean_control_service_id
+        sid  = row.service_correlation_id
+        (root_id, root_name), below = chain[0], chain[1:]
+
+        key = (prod, sid, root_id)
+        root = apps.setdefault(key, {
+            'lean_control_service_id':   prod,
+            'jira_backlog_id':           row.jira_backlog_id,
+            'service_correlation_id':    sid,
+            'app_id':                    root_id,
+            'app_name':                  root_name,
+            'service_instances':         [],
+            'children':                  {}
+        })
+        own = nest(root['children'], below) or root
+        own['service_instances'].append({
+            'instance_id':         row.instance_id,
+            'it_service_instance': row.it_service_instance,
+            'environment':         row.environment,
+            'install_type':        row.install_type
+        })
+
+    return [children_to_lists(entry) for entry in apps.values()]
+
+
 # ——— Main ———
 
 def main():
@@ -86,117 +200,62 @@ def main():
             'if omitted, returns data for all services'
         )
     )
+    parser.add_argument(
+        '--source', choices=['sql', 'mongo'], default='sql',
+        help='Join the CMDB tables (default) or read the documents loaded by mongo_store.py'
+    )
+    add_cache_args(parser)
+    add_profile_args(parser)
     args = parser.parse_args()
 
     cfg    = load_config(args.config)
+
+    if args.source == 'mongo':
+        from mongo_store import open_db, find_documents
+        with profiling(args):
+            with span('query') as s:
+                result = find_documents(open_db(cfg), 'apps_by_service', args.service_correlation_ids)
+                s.add(rows=len(result))
+            with span('serialize'):
+                output = json.dumps(result, indent=2)
+            with span('write'):
+                print(output)
+        return
+
     engine = build_engine(cfg)
+    cache  = open_cache(args, cfg)
 
-    ChildApp  = aliased(BusinessApp)
-    ParentApp = aliased(BusinessApp)
-
-    with Session(engine) as session:
-        q = (
-            session.query(
-                LeanControlApplication.lean_control_service_id.label('lean_control_service_id'),
-                ProductBacklogDetails.jira_backlog_id.label('jira_backlog_id'),
-                BusinessService.service_correlation_id.label('service_correlation_id'),
-                ParentApp.correlation_id.label('parent_id'),
-                ParentApp.business_application_name.label('parent_name'),
-                ChildApp.correlation_id.label('child_id'),
-                ChildApp.business_application_name.label('child_name'),
-                ServiceInstance.correlation_id.label('instance_id'),
-                ServiceInstance.it_service_instance,
-                ServiceInstance.environment,
-                ServiceInstance.install_type
-            )
-            .join(
-                ServiceInstance,
-                BusinessService.it_business_service_sysid == ServiceInstance.it_business_service_sysid
-            )
-            .join(
-                LeanControlApplication,
-                LeanControlApplication.servicenow_app_id == ServiceInstance.correlation_id
-            )
-            .join(
-                ProductBacklogDetails,
-                ProductBacklogDetails.lct_product_id == LeanControlApplication.lean_control_service_id
-            )
-            .join(
-                ChildApp,
-                ServiceInstance.business_application_sysid == ChildApp.business_application_sys_id
-            )
-            .outerjoin(
-                ParentApp,
-                ChildApp.application_parent_correlation_id == ParentApp.correlation_id
-            )
-        )
+    import sqlparse
+    from sqlalchemy.orm import Session
 
-        if args.service_correlation_ids:
-            q = q.filter(
-                BusinessService.service_correlation_id.in_(
-                    args.service_correlation_ids
-                )
-            )
+    with profiling(args), Session(engine) as session:
+        with span('connect'):
+            session.connection()
+        q = build_query(session, args.service_correlation_ids)
 
         raw_sql = str(q.statement.compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True}))
         formatted_sql = sqlparse.format(raw_sql, reindent=True, keyword_case='upper')
         logger.debug("Generated SQL:\n%s", formatted_sql)
 
-        rows = q.all()
+        with span('query') as s:
+            if cache is None:
+                rows = q.all()
+            else:
+                # Tagged with the requested ids so change_feed.py drops only results for changed services
+                tags = [('service', i) for i in args.service_correlation_ids] or None
+                rows = table_rows(cached_query(cache, session.connection(), q.statement,
+                                               refresh=args.refresh, tags=tags))
+            s.add(rows=len(rows))
+
+        with span('group', rows=len(rows)):
+            result = group_apps(rows)
+        with span('serialize'):
+            output = json.dumps(result, indent=2)
+        with span('write'):
+            print(output)
+
+    report(cache)
 
-    apps = {}
-    for row in rows:
-        prod = row.lean_control_service_id
-        jira = row.jira_backlog_id
-        sid  = row.service_correlation_id
-        pid  = row.parent_id
-        cid  = row.child_id
-
-        if pid is None:
-            key = (prod, sid, cid)
-            apps.setdefault(key, {
-                'lean_control_service_id':   prod,
-                'jira_backlog_id':           jira,
-                'service_correlation_id':    sid,
-                'app_id':                    cid,
-                'app_name':                  row.child_name,
-                'service_instances':         [],
-                'children':                  {}
-            })['service_instances'].append({
-                'instance_id':         row.instance_id,
-                'it_service_instance': row.it_service_instance,
-                'environment':         row.environment,
-                'install_type':        row.install_type
-            })
-        else:
-            key = (prod, sid, pid)
-            parent = apps.setdefault(key, {
-                'lean_control_service_id':   prod,
-                'jira_backlog_id':           jira,
-                'service_correlation_id':    sid,
-                'app_id':                    pid,
-                'app_name':                  row.parent_name,
-                'service_instances':         [],
-                'children':                  {}
-            })
-            child_dict = parent['children'].setdefault(cid, {
-                'app_id':            cid,
-                'app_name':          row.child_name,
-                'service_instances': []
-            })
-            child_dict['service_instances'].append({
-                'instance_id':         row.instance_id,
-                'it_service_instance': row.it_service_instance,
-                'environment':         row.environment,
-                'install_type':        row.install_type
-            })
-
-    results = []
-    for _, entry in apps.items():
-        entry['children'] = list(entry['children'].values())
-        results.append(entry)
-
-    print(json.dumps(results, indent=2))
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
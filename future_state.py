@@ -0,0 +1,506 @@
+#!/usr/bin/env python3
+"""
+Materialize the future-state model of current_futrure_state.md and measure it
+against the current views.
+
+The normalized model is one chain, LCP -> Business Service -> Application ->
+Service Instance, with the Jira backlog moved onto the application:
+
+    fs_service(service_id PK, service_sysid, service_name)
+    fs_lcp(lcp_id PK, service_id UNIQUE NOT NULL -> fs_service)            LCP 1:1 Service
+    fs_application(app_id PK, app_sysid, app_name,
+                   service_id NOT NULL -> fs_service,                     Service 1:N App
+                   jira_backlog_id UNIQUE)                                App 1:1 Backlog
+    fs_service_instance(instance_id PK, instance_name, environment,
+                        install_type, app_id NOT NULL -> fs_application)  App 1:N Instance
+
+``build`` fills them from the five source tables. A row whose current links
+do not fit these cardinalities (an LCP reaching several services, an app whose
+instances sit in several services, a backlog shared by apps, an instance
+without a loadable app, duplicate ids, ...) is not loaded; it goes to
+``fs_quarantine(entity, entity_id, reason, detail)`` instead, and for the
+app/backlog link only the link is dropped.
+
+``compare`` runs the same workloads on both schemas: the find_by_product_id
+and find_by_technical_service queries for a sample of ids, and the
+generate_dataset export (config.yaml's pipeline over a future-state ``base``
+CTE, so the edge table has the same shape), with the current export limited
+to the LCPs that loaded into fs_lcp. It reports the median latency, the rows
+returned and the planner's estimate of each query: the total cost on
+Postgres, the number of full scans in the plan on SQLite. A workload whose
+row counts differ by more than ROW_TOLERANCE gets no speed-up, only a flag.
+"""
+import argparse
+import json
+import statistics
+import time
+
+import yaml
+
+from instrument import span, add_profile_args, profiling
+
+ENTITIES = ['service', 'lcp', 'application', 'service_instance']
+
+SCHEMA = [
+    """CREATE TABLE {service} (
+        service_id    VARCHAR PRIMARY KEY,
+        service_sysid VARCHAR NOT NULL,
+        service_name  VARCHAR)""",
+    "CREATE INDEX ix_fs_service_sysid ON {service} (service_sysid)",
+    """CREATE TABLE {lcp} (
+        lcp_id     VARCHAR PRIMARY KEY,
+        service_id VARCHAR NOT NULL UNIQUE REFERENCES {service} (service_id))""",
+    """CREATE TABLE {application} (
+        app_id          VARCHAR PRIMARY KEY,
+        app_sysid       VARCHAR NOT NULL,
+        app_name        VARCHAR,
+        service_id      VARCHAR NOT NULL REFERENCES {service} (service_id),
+        jira_backlog_id VARCHAR UNIQUE)""",
+    "CREATE INDEX ix_fs_application_service_id ON {application} (service_id)",
+    "CREATE INDEX ix_fs_application_sysid ON {application} (app_sysid)",
+    """CREATE TABLE {service_instance} (
+        instance_id   VARCHAR PRIMARY KEY,
+        instance_name VARCHAR,
+        environment   VARCHAR,
+        install_type  VARCHAR,
+        app_id        VARCHAR NOT NULL REFERENCES {application} (app_id))""",
+    "CREATE INDEX ix_fs_service_instance_app_id ON {service_instance} (app_id)",
+    """CREATE TABLE {quarantine} (
+        entity    VARCHAR NOT NULL,
+        entity_id VARCHAR,
+        reason    VARCHAR NOT NULL,
+        detail    VARCHAR)""",
+]
+
+# (span, statements) in load order. {src} prefixes the source tables; fs_* temp tables hold the candidate links.
+LOAD = [
+    ('service', [
+        """INSERT INTO {service} (service_id, service_sysid, service_name)
+           SELECT service_correlation_id, MIN(it_business_service_sysid), MIN(service)
+           FROM {src}vwsfitbusinessservice
+           WHERE service_correlation_id IS NOT NULL
+           GROUP BY service_correlation_id
+           HAVING COUNT(DISTINCT it_business_service_sysid) = 1""",
+        """INSERT INTO {quarantine} (entity, entity_id, reason, detail)
+           SELECT 'service', service_correlation_id, 'duplicate_id',
+                  CAST(COUNT(DISTINCT it_business_service_sysid) AS VARCHAR) || ' sys_ids'
+           FROM {src}vwsfitbusinessservice
+           WHERE service_correlation_id IS NOT NULL
+           GROUP BY service_correlation_id
+           HAVING COUNT(DISTINCT it_business_service_sysid) > 1""",
+    ]),
+    ('lcp', [
+        # An LCP reaches a service directly (by_ts) or through a service instance (by_si)
+        """CREATE TEMPORARY TABLE fs_lcp_links AS
+           SELECT la.lean_control_service_id AS lcp_id, s.service_id
+           FROM {src}lean_control_application AS la
+           JOIN {service} AS s ON s.service_id = la.servicenow_app_id
+           WHERE la.lean_control_service_id IS NOT NULL
+           UNION
+           SELECT la.lean_control_service_id, s.service_id
+           FROM {src}lean_control_application AS la
+           JOIN {src}vwsfitserviceinstance AS si ON si.correlation_id = la.servicenow_app_id
+           JOIN {service} AS s ON s.service_sysid = si.it_business_service_sysid
+           WHERE la.lean_control_service_id IS NOT NULL""",
+        """CREATE TEMPORARY TABLE fs_shared_services AS
+           SELECT service_id FROM fs_lcp_links GROUP BY service_id HAVING COUNT(*) > 1""",
+        """INSERT INTO {lcp} (lcp_id, service_id)
+           SELECT lcp_id, MIN(service_id)
+           FROM fs_lcp_links
+           GROUP BY lcp_id
+           HAVING COUNT(*) = 1 AND MIN(service_id) NOT IN (SELECT service_id FROM fs_shared_services)""",
+        """INSERT INTO {quarantine} (entity, entity_id, reason, detail)
+           SELECT 'lcp', lcp_id, 'multiple_services', CAST(COUNT(*) AS VARCHAR) || ' services'
+           FROM fs_lcp_links
+           GROUP BY lcp_id
+           HAVING COUNT(*) > 1""",
+        """INSERT INTO {quarantine} (entity, entity_id, reason, detail)
+           SELECT 'lcp', lcp_id, 'service_shared_with_other_lcps', MIN(service_id)
+           FROM fs_lcp_links
+           GROUP BY lcp_id
+           HAVING COUNT(*) = 1 AND MIN(service_id) IN (SELECT service_id FROM fs_shared_services)""",
+        """INSERT INTO {quarantine} (entity, entity_id, reason, detail)
+           SELECT DISTINCT 'lcp', lean_control_service_id, 'no_service', NULL
+           FROM {src}lean_control_application AS la
+           WHERE la.lean_control_service_id IS NOT NULL
+             AND NOT EXISTS (SELECT 1 FROM fs_lcp_links AS l WHERE l.lcp_id = la.lean_control_service_id)""",
+    ]),
+    ('application', [
+        # An app belongs to the service of its instances
+        """CREATE TEMPORARY TABLE fs_app_links AS
+           SELECT DISTINCT ba.correlation_id AS app_id, ba.business_application_sys_id AS app_sysid,
+                  ba.business_application_name AS app_name, s.service_id
+           FROM {src}vwsfbusinessapplication AS ba
+           JOIN {src}vwsfitserviceinstance AS si ON si.business_application_sysid = ba.business_application_sys_id
+           JOIN {service} AS s ON s.service_sysid = si.it_business_service_sysid
+           WHERE ba.correlation_id IS NOT NULL""",
+        """INSERT INTO {application} (app_id, app_sysid, app_name, service_id)
+           SELECT app_id, MIN(app_sysid), MIN(app_name), MIN(service_id)
+           FROM fs_app_links
+           GROUP BY app_id
+           HAVING COUNT(DISTINCT app_sysid) = 1 AND COUNT(DISTINCT service_id) = 1""",
+        """INSERT INTO {quarantine} (entity, entity_id, reason, detail)
+           SELECT 'application', app_id,
+                  CASE WHEN COUNT(DISTINCT app_sysid) > 1 THEN 'duplicate_id' ELSE 'multiple_services' END,
+                  CAST(COUNT(DISTINCT service_id) AS VARCHAR) || ' services'
+           FROM fs_app_links
+           GROUP BY app_id
+           HAVING COUNT(DISTINCT app_sysid) > 1 OR COUNT(DISTINCT service_id) > 1""",
+        """INSERT INTO {quarantine} (entity, entity_id, reason, detail)
+           SELECT DISTINCT 'application', correlation_id, 'no_service', NULL
+           FROM {src}vwsfbusinessapplication AS ba
+           WHERE ba.correlation_id IS NOT NULL
+             AND NOT EXISTS (SELECT 1 FROM fs_app_links AS l WHERE l.app_id = ba.correlation_id)""",
+        # The backlog moves from the LCP to the app: the parent backlogs of the LCPs on its instances
+        """CREATE TEMPORARY TABLE fs_app_backlogs AS
+           SELECT DISTINCT a.app_id, b.jira_backlog_id
+           FROM {application} AS a
+           JOIN {src}vwsfitserviceinstance AS si ON si.business_application_sysid = a.app_sysid
+           JOIN {src}lean_control_application AS la ON la.servicenow_app_id = si.correlation_id
+           JOIN {src}lean_control_product_backlog_details AS b
+             ON b.lct_product_id = la.lean_control_service_id AND b.is_parent = TRUE
+           WHERE b.jira_backlog_id IS NOT NULL""",
+        """CREATE TEMPORARY TABLE fs_shared_backlogs AS
+           SELECT jira_backlog_id FROM fs_app_backlogs GROUP BY jira_backlog_id HAVING COUNT(*) > 1""",
+        """UPDATE {application}
+           SET jira_backlog_id = (SELECT MIN(ab.jira_backlog_id) FROM fs_app_backlogs AS ab
+                                  WHERE ab.app_id = {application}.app_id)
+           WHERE app_id IN (SELECT app_id FROM fs_app_backlogs
+                            GROUP BY app_id
+                            HAVING COUNT(*) = 1
+                               AND MIN(jira_backlog_id) NOT IN (SELECT jira_backlog_id FROM fs_shared_backlogs))""",
+        """INSERT INTO {quarantine} (entity, entity_id, reason, detail)
+           SELECT 'application_backlog', app_id, 'multiple_backlogs', CAST(COUNT(*) AS VARCHAR) || ' backlogs'
+           FROM fs_app_backlogs
+           GROUP BY app_id
+           HAVING COUNT(*) > 1""",
+        """INSERT INTO {quarantine} (entity, entity_id, reason, detail)
+           SELECT 'application_backlog', app_id, 'backlog_shared_with_other_apps', MIN(jira_backlog_id)
+           FROM fs_app_backlogs
+           GROUP BY app_id
+           HAVING COUNT(*) = 1 AND MIN(jira_backlog_id) IN (SELECT jira_backlog_id FROM fs_shared_backlogs)""",
+    ]),
+    ('service_instance', [
+        """INSERT INTO {service_instance} (instance_id, instance_name, environment, install_type, app_id)
+           SELECT si.correlation_id, MIN(si.it_service_instance), MIN(si.environment), MIN(si.install_type),
+                  MIN(a.app_id)
+           FROM {src}vwsfitserviceinstance AS si
+           JOIN {application} AS a ON a.app_sysid = si.business_application_sysid
+           WHERE si.correlation_id IS NOT NULL
+           GROUP BY si.correlation_id
+           HAVING COUNT(*) = 1""",
+        """INSERT INTO {quarantine} (entity, entity_id, reason, detail)
+           SELECT 'service_instance', si.correlation_id, 'duplicate_id', CAST(COUNT(*) AS VARCHAR) || ' rows'
+           FROM {src}vwsfitserviceinstance AS si
+           JOIN {application} AS a ON a.app_sysid = si.business_application_sysid
+           WHERE si.correlation_id IS NOT NULL
+           GROUP BY si.correlation_id
+           HAVING COUNT(*) > 1""",
+        """INSERT INTO {quarantine} (entity, entity_id, reason, detail)
+           SELECT DISTINCT 'service_instance', si.correlation_id, 'no_application', si.business_application_sysid
+           FROM {src}vwsfitserviceinstance AS si
+           LEFT JOIN {application} AS a ON a.app_sysid = si.business_application_sysid
+           WHERE si.correlation_id IS NOT NULL AND a.app_id IS NULL""",
+    ]),
+]
+TEMP_TABLES = ['fs_lcp_links', 'fs_shared_services', 'fs_app_links', 'fs_app_backlogs', 'fs_shared_backlogs']
+
+# Same columns as the base CTEs in config.yaml, so the shared pipeline renders
+# the same edge table. Each is driven from the same entity as its current base:
+# instances for by_si, services for by_ts.
+FUTURE_COLUMNS = """
+    l.lcp_id            AS lean_control_service_id,
+    a.jira_backlog_id   AS jira_backlog_id,
+    s.service_id        AS service_id,
+    s.service_name      AS service_name,
+    a.app_id            AS app_id,
+    a.app_name          AS app_name,
+    i.instance_id       AS instance_id,
+    i.instance_name     AS instance_name,
+    i.environment       AS environment,
+    i.install_type      AS install_type"""
+FUTURE_BASES = {
+    'by_si': f"""
+WITH base AS (
+  SELECT{FUTURE_COLUMNS}
+  FROM public.fs_service_instance AS i
+  JOIN public.fs_application AS a ON a.app_id = i.app_id
+  JOIN public.fs_service AS s ON s.service_id = a.service_id
+  JOIN public.fs_lcp AS l ON l.service_id = s.service_id
+)
+""",
+    'by_ts': f"""
+WITH base AS (
+  SELECT{FUTURE_COLUMNS}
+  FROM public.fs_service AS s
+  JOIN public.fs_lcp AS l ON l.service_id = s.service_id
+  JOIN public.fs_application AS a ON a.service_id = s.service_id
+  JOIN public.fs_service_instance AS i ON i.app_id = a.app_id
+)
+""",
+}
+
+# The current export limited to the LCPs the future-state model loaded, so both
+# sides cover the same scope; most LCPs may be quarantined.
+SCOPED_BASE = """
+, base AS (
+  SELECT * FROM unscoped_base
+  WHERE lean_control_service_id IN (SELECT lcp_id FROM public.fs_lcp)
+)
+"""
+# Above this relative row-count difference the timings are not comparable
+ROW_TOLERANCE = 0.05
+
+FUTURE_LOOKUP = """
+SELECT s.service_id, l.lcp_id, a.jira_backlog_id, a.app_id, a.app_name,
+       i.instance_id, i.instance_name, i.environment, i.install_type
+FROM public.fs_service AS s
+{lcp_join} public.fs_lcp AS l ON l.service_id = s.service_id
+JOIN public.fs_application AS a ON a.service_id = s.service_id
+JOIN public.fs_service_instance AS i ON i.app_id = a.app_id
+WHERE {column} IN ({ids})
+"""
+
+
+# ——— Helpers ———
+
+def load_config(path):
+    with open(path, 'r') as f:
+        return yaml.safe_load(f)
+
+
+def build_engine(cfg):
+    from sqlalchemy import create_engine
+    db = cfg['database']
+    url = (
+        f"postgresql+psycopg2://{db['user']}:{db['password']}"
+        f"@{db['host']}:{db['port']}/{db['name']}"
+    )
+    return create_engine(url, echo=False)
+
+
+def _names(conn):
+    """Table names for this connection's database; SQLite writes go through main (see app_closure._names)."""
+    prefix = 'public.' if conn.dialect.name == 'postgresql' else ''
+    names = {entity: f"{prefix}fs_{entity}" for entity in ENTITIES + ['quarantine']}
+    names['src'] = prefix
+    return names
+
+
+def _literals(ids):
+    return ', '.join("'" + str(i).replace("'", "''") + "'" for i in ids)
+
+
+# ——— Build ———
+
+def build(engine):
+    """(Re)create the future-state tables. Returns {'loaded': {entity: rows}, 'quarantined': {(entity, reason): rows}}."""
+    with engine.begin() as conn:
+        n = _names(conn)
+        with span('schema'):
+            for entity in reversed(ENTITIES + ['quarantine']):
+                conn.exec_driver_sql(f"DROP TABLE IF EXISTS {n[entity]}")
+            for temp in TEMP_TABLES:
+                conn.exec_driver_sql(f"DROP TABLE IF EXISTS {temp}")
+            for ddl in SCHEMA:
+                conn.exec_driver_sql(ddl.format(**n))
+        for name, statements in LOAD:
+            with span(name) as s:
+                for sql in statements:
+                    conn.exec_driver_sql(sql.format(**n))
+                s.add(rows=conn.exec_driver_sql(f"SELECT COUNT(*) FROM {n[name]}").scalar())
+        for temp in TEMP_TABLES:
+            conn.exec_driver_sql(f"DROP TABLE {temp}")
+        with span('analyze'):
+            for entity in ENTITIES:
+                conn.exec_driver_sql(f"ANALYZE {n[entity]}")
+
+        loaded = {e: conn.exec_driver_sql(f"SELECT COUNT(*) FROM {n[e]}").scalar() for e in ENTITIES}
+        quarantined = {
+            (entity, reason): count for entity, reason, count in conn.exec_driver_sql(
+                f"SELECT entity, reason, COUNT(*) FROM {n['quarantine']} GROUP BY entity, reason ORDER BY entity, reason")
+        }
+    return {'loaded': loaded, 'quarantined': quarantined}
+
+
+# ——— Compare ———
+
+def orm_sql(query, dialect):
+    """SQL text of a find_by_* ORM query with its parameters inlined."""
+    return str(query.statement.compile(dialect=dialect, compile_kwargs={'literal_binds': True}))
+
+
+def scoped_export(cfg, base):
+    """generate_dataset's SQL for ``base`` over the LCPs loaded into fs_lcp only."""
+    base_sql = cfg['bases'][base]
+    if 'WITH base AS (' not in base_sql:
+        raise ValueError(f"config.yaml base {base!r} does not start with 'WITH base AS ('")
+    return "\n".join([base_sql.replace('WITH base AS (', 'WITH unscoped_base AS (', 1), SCOPED_BASE, cfg['pipeline']])
+
+
+def workloads(engine, cfg, sample):
+    """[(name, current SQL, future SQL)] for ``sample`` LCPs / services that exist in the future-state model."""
+    from sqlalchemy.orm import Session
+    import app_closure
+    import find_by_product_id
+    import find_by_technical_service
+
+    with engine.connect() as conn:
+        n = _names(conn)
+        lcps, services = [], []
+        for lcp_id, service_id in conn.exec_driver_sql(
+                f"SELECT lcp_id, service_id FROM {n['lcp']} ORDER BY lcp_id LIMIT {int(sample)}"):
+            lcps.append(lcp_id)
+            services.append(service_id)
+    if not lcps:
+        raise ValueError("The future-state tables are empty; run 'build' first")
+
+    # The current finders join the app_closure table
+    with span('closure'):
+        app_closure.refresh(engine)
+    with Session(engine) as session:
+        by_product = orm_sql(find_by_product_id.build_query(session, lcps), engine.dialect)
+        by_service = orm_sql(find_by_technical_service.build_query(session, services), engine.dialect)
+
+    return [
+        (f"find_by_product_id ({len(lcps)} ids)", by_product,
+         FUTURE_LOOKUP.format(lcp_join='JOIN', column='l.lcp_id', ids=_literals(lcps))),
+        (f"find_by_technical_service ({len(services)} ids)", by_service,
+         FUTURE_LOOKUP.format(lcp_join='LEFT JOIN', column='s.service_id', ids=_literals(services))),
+    ] + [
+        (f"generate_dataset [{base}, loaded LCPs]", scoped_export(cfg, base),
+         "\n".join([FUTURE_BASES[base], cfg['pipeline']]))
+        for base in ('by_si', 'by_ts')
+    ]
+
+
+def plan_cost(conn, sql):
+    """Planner estimate: total cost on Postgres, full table scans on SQLite."""
+    if conn.dialect.name == 'postgresql':
+        plan = conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {sql}").scalar()
+        plan = json.loads(plan) if isinstance(plan, str) else plan
+        return plan[0]['Plan']['Total Cost']
+    steps = [row[-1] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}")]
+    return sum(1 for step in steps if step.startswith('SCAN') and 'USING' not in step)
+
+
+def measure(conn, sql, repeat):
+    """(median seconds, rows) over ``repeat`` runs."""
+    timings, rows = [], 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        rows = len(conn.exec_driver_sql(sql).fetchall())
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings), rows
+
+
+def comparable(entry, tolerance=ROW_TOLERANCE):
+    """True when both sides return about the same rows, so their timings measure the schema and not missing data."""
+    cur, fut = entry['current']['rows'], entry['future']['rows']
+    return abs(cur - fut) <= tolerance * max(cur, fut, 1)
+
+
+def compare(engine, cfg, sample=20, repeat=5):
+    """One result dict per workload, with 'current' and 'future' (seconds, rows, cost)."""
+    results = []
+    for name, current_sql, future_sql in workloads(engine, cfg, sample):
+        entry = {'workload': name}
+        with engine.connect() as conn:
+            for schema, sql in (('current', current_sql), ('future', future_sql)):
+                with span(f"{schema}: {name}") as s:
+                    seconds, rows = measure(conn, sql, repeat)
+                    s.add(rows=rows)
+                entry[schema] = {'seconds': seconds, 'rows': rows, 'cost': plan_cost(conn, sql)}
+        results.append(entry)
+    return results
+
+
+def render_markdown(results, built, dialect):
+    cost = 'plan cost' if dialect == 'postgresql' else 'full scans'
+    lines = [
+        '# Current vs future-state schema', '',
+        f"| Workload | Current ms | Future ms | Speed-up | Current {cost} | Future {cost} | Current rows | Future rows |",
+        '| --- | ---: | ---: | ---: | ---: | ---: | ---: | ---: |',
+    ]
+    for r in results:
+        cur, fut = r['current'], r['future']
+        if not comparable(r):
+            speedup = '⚠️ rows differ'
+        else:
+            speedup = f"{cur['seconds'] / fut['seconds']:.1f}×" if fut['seconds'] else '—'
+        lines.append(
+            f"| {r['workload']} | {cur['seconds'] * 1000:.1f} | {fut['seconds'] * 1000:.1f} | {speedup} "
+            f"| {cur['cost']:,} | {fut['cost']:,} | {cur['rows']:,} | {fut['rows']:,} |"
+        )
+    if built:
+        lines += ['', '## Future-state tables', '', '| Table | Rows |', '| --- | ---: |']
+        lines += [f"| fs_{entity} | {rows:,} |" for entity, rows in built['loaded'].items()]
+        lines += ['', '## Quarantined', '', '| Entity | Reason | Rows |', '| --- | --- | ---: |']
+        lines += [f"| {entity} | {reason} | {rows:,} |" for (entity, reason), rows in built['quarantined'].items()]
+    lines += ['', f"The exports cover only the LCPs loaded into fs_lcp on both sides. Where row counts differ "
+                  f"by more than {ROW_TOLERANCE:.0%} (the current model fanning out over many-to-many links, "
+                  f"or quarantined apps and instances) no speed-up is given: the timings are not comparable.", '']
+    return '\n'.join(lines)
+
+
+# ——— Main ———
+
+def print_build(result):
+    for entity, rows in result['loaded'].items():
+        print(f"✅ fs_{entity}: {rows:,} rows")
+    total = sum(result['quarantined'].values())
+    if total:
+        print(f"⚠️  {total:,} row(s) quarantined in fs_quarantine:")
+        for (entity, reason), rows in result['quarantined'].items():
+            print(f"   {entity:<20} {reason:<32} {rows:,}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Build the normalized future-state schema and compare query cost against the current views"
+    )
+    parser.add_argument('-c', '--config', default='config.yaml',
+                        help='YAML config with the database and the pipeline SQL (default: config.yaml)')
+    parser.add_argument('--sqlite', help='Use this SQLite file (synthetic_cmdb.py --sqlite) instead of the database')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p_build = sub.add_parser('build', help='(Re)create the future-state tables, quarantining violating rows')
+    add_profile_args(p_build)
+
+    p_compare = sub.add_parser('compare', help='Time the finder and export workloads on both schemas')
+    p_compare.add_argument('--build', action='store_true', help='Rebuild the future-state tables first')
+    p_compare.add_argument('--sample', type=int, default=20, help='LCP / service ids per lookup (default: 20)')
+    p_compare.add_argument('--repeat', type=int, default=5, help='Runs per query; the median is kept (default: 5)')
+    p_compare.add_argument('--output', '-o', default='future_state_comparison.md', help='Markdown report')
+    add_profile_args(p_compare)
+    args = parser.parse_args()
+
+    cfg = load_config(args.config)
+    if args.sqlite:
+        from synthetic_cmdb import sqlite_engine
+        engine = sqlite_engine(args.sqlite)
+    else:
+        engine = build_engine(cfg)
+
+    with profiling(args):
+        built = build(engine) if args.command == 'build' or args.build else None
+        if built:
+            print_build(built)
+        if args.command == 'compare':
+            try:
+                results = compare(engine, cfg, args.sample, args.repeat)
+            except ValueError as e:
+                parser.error(str(e))
+
+    if args.command == 'compare':
+        with open(args.output, 'w') as f:
+            f.write(render_markdown(results, built, engine.dialect.name))
+        for r in results:
+            cur, fut = r['current'], r['future']
+            flag = '' if comparable(r) else f"  ⚠️  rows differ ({cur['rows']:,} vs {fut['rows']:,})"
+            print(f"⏱  {r['workload']}: {cur['seconds'] * 1000:.1f} ms -> {fut['seconds'] * 1000:.1f} ms{flag}")
+        print(f"✅ Comparison written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -2,8 +2,13 @@
 import argparse
 import os
 import yaml
-import pandas as pd
-from sqlalchemy import create_engine
+from typing import TYPE_CHECKING
+
+from instrument import span, add_profile_args, profiling
+from query_cache import cached_query, add_cache_args, open_cache, report
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 def load_config(path: str) -> dict:
     if not os.path.exists(path):
@@ -14,6 +19,50 @@ def load_config(path: str) -> dict:
 def build_conn(db: dict) -> str:
     return f"postgresql://{db['user']}:{db['password']}@{db['host']}:{db['port']}/{db['name']}"
 
+def build_sql(cfg: dict, base: str) -> str:
+    return "\n".join([cfg["bases"][base], cfg["pipeline"]])
+
+def generate(engine, cfg: dict, base: str, cache=None, refresh: bool = False) -> "pd.DataFrame":
+    """
+    Run the chosen base CTE plus the shared pipeline and return the edge table.
+    With a QueryCache the result is served from disk while the source data is unchanged.
+    """
+    import pandas as pd
+    from sqlalchemy import text
+
+    with span('connect'):
+        conn = engine.connect()
+    if cache is not None:
+        with conn, span('cached_query') as s:
+            table = cached_query(cache, conn, build_sql(cfg, base), refresh=refresh)
+            s.add(rows=table.num_rows)
+        with span('materialize', rows=table.num_rows):
+            return table.to_pandas()
+    with conn:
+        with span('query'):
+            result = conn.execute(text(build_sql(cfg, base)))
+        with span('fetch') as s:
+            rows = result.fetchall()
+            s.add(rows=len(rows))
+    with span('materialize', rows=len(rows)):
+        return pd.DataFrame(rows, columns=list(result.keys()))
+
+def generate_both(args):
+    """--base both: stream the two bases concurrently (no result cache) and reconcile them in one pass."""
+    from sqlalchemy import create_engine
+    from edge_reconcile import extract_both
+
+    cfg    = load_config(args.config)
+    engine = create_engine(build_conn(cfg["database"]), pool_size=2)
+    outputs = {"by_si": "si_hierarchy.csv", "by_ts": "ts_hierarchy.csv"}
+
+    with profiling(args):
+        counts = extract_both(engine, cfg, outputs, args.reconcile_output)
+    for base, path in outputs.items():
+        print(f"[generate_dataset] Wrote {counts['rows'][base]:,} rows to '{path}'")
+    print(f"[generate_dataset] {counts['matched']:,} edges match; {counts['missing']:,} only in by_si, "
+          f"{counts['added']:,} only in by_ts, {counts['conflicting']:,} conflicting -> '{args.reconcile_output}'")
+
 def main():
     p = argparse.ArgumentParser(
         description="Generate hierarchy CSV from configurable base CTE"
@@ -26,29 +75,42 @@ def main():
     p.add_argument(
         "--base", "-b",
         required=True,
-        choices=["by_si", "by_ts"],
-        help="Which base CTE to use (by_si or by_ts)"
+        choices=["by_si", "by_ts", "both"],
+        help="Which base CTE to use (by_si or by_ts); both runs them concurrently and reconciles the edges"
     )
     p.add_argument(
         "--output", "-o",
-        help="Output CSV file path (default: <base>_hierarchy.csv)"
+        help="Output CSV file path (default: <base>_hierarchy.csv; with --base both, the two defaults)"
+    )
+    p.add_argument(
+        "--reconcile-output",
+        default="si_ts_reconciliation.csv",
+        help="With --base both: missing/added/conflicting edges CSV (default: si_ts_reconciliation.csv)"
     )
+    add_cache_args(p)
+    add_profile_args(p)
     args = p.parse_args()
 
+    if args.base == "both":
+        return generate_both(args)
+
     # Determine default output if not supplied
     if not args.output:
         args.output = "si_hierarchy.csv" if args.base == "by_si" else "ts_hierarchy.csv"
 
+    from sqlalchemy import create_engine
+
     cfg    = load_config(args.config)
     engine = create_engine(build_conn(cfg["database"]))
 
-    base_sql     = cfg["bases"][args.base]
-    pipeline_sql = cfg["pipeline"]
-    full_sql     = "\n".join([base_sql, pipeline_sql])
+    cache  = open_cache(args, cfg)
 
-    df = pd.read_sql(full_sql, con=engine)
-    df.to_csv(args.output, index=False)
+    with profiling(args):
+        df = generate(engine, cfg, args.base, cache, args.refresh)
+        with span('write', rows=len(df)):
+            df.to_csv(args.output, index=False)
     print(f"[generate_dataset] Wrote {len(df):,} rows to '{args.output}'")
+    report(cache)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
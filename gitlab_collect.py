@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import sys
+import threading
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime, timezone
+from urllib.parse import quote
+
+from gitlab_mr_commits import load_config
+from instrument import span, add_profile_args, profiling
+
+
+class GitLabClient:
+    """
+    Thin GitLab REST client shared by all collector threads.
+
+    One pooled keep-alive session serves every request. Rate limiting follows
+    GitLab's headers: a 429 pauses all workers until ``Retry-After`` /
+    ``RateLimit-Reset``, and when ``RateLimit-Remaining`` drops below the
+    worker count requests are held back until the window resets.
+    """
+
+    def __init__(self, base_url, private_token, verify_ssl=True, pool_size=8, max_retries=5):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.base_url = base_url.rstrip('/')
+        self.pool_size = pool_size
+        self.max_retries = max_retries
+        self.session = requests.Session()
+        self.session.headers.update({'PRIVATE-TOKEN': private_token})
+        self.session.verify = verify_ssl
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._lock = threading.Lock()
+        self._resume_at = 0.0
+        self.requests_made = 0
+
+        if not verify_ssl:
+            warnings.warn("SSL verification is disabled - this is not recommended for production use!")
+
+    def _pause_until(self, ts):
+        with self._lock:
+            self._resume_at = max(self._resume_at, ts)
+
+    def _wait_for_window(self):
+        delay = self._resume_at - time.time()
+        if delay > 0:
+            time.sleep(delay)
+
+    def _note_rate_limit(self, response):
+        remaining = response.headers.get('RateLimit-Remaining')
+        reset = response.headers.get('RateLimit-Reset')
+        if remaining is not None and reset is not None and int(remaining) < self.pool_size:
+            self._pause_until(float(reset))
+
+    def get(self, url, params=None):
+        if not url.startswith('http'):
+            url = f"{self.base_url}{url}"
+        for attempt in range(self.max_retries + 1):
+            self._wait_for_window()
+            with span('request') as s:
+                response = self.session.get(url, params=params)
+                s.add(bytes=len(response.content))
+            with self._lock:
+                self.requests_made += 1
+            if response.status_code == 429 and attempt < self.max_retries:
+                retry_after = response.headers.get('Retry-After')
+                reset = response.headers.get('RateLimit-Reset')
+                if retry_after is not None:
+                    self._pause_until(time.time() + float(retry_after))
+                elif reset is not None:
+                    self._pause_until(float(reset))
+                else:
+                    self._pause_until(time.time() + 2 ** attempt)
+                continue
+            response.raise_for_status()
+            self._note_rate_limit(response)
+            return response
+        response.raise_for_status()
+
+    def paginate(self, path, params=None):
+        """Yield items from every page, following Link rel=next (or X-Next-Page)."""
+        params = dict(params or {})
+        params.setdefault('per_page', 100)
+        url = path
+        while url:
+            response = self.get(url, params=params)
+            yield from response.json()
+            next_link = response.links.get('next', {}).get('url')
+            if next_link:
+                url, params = next_link, None
+            elif response.headers.get('X-Next-Page'):
+                params = dict(params or {}, page=response.headers['X-Next-Page'])
+            else:
+                url = None
+
+
+def merged_mr_params(since, until, target_branch):
+    params = {
+        'state': 'merged',
+        'order_by': 'updated_at',
+        'sort': 'desc',
+    }
+    if target_branch:
+        params['target_branch'] = target_branch
+    # A merge always bumps updated_at, so updated_* is a safe server-side
+    # prefilter on every GitLab version; merged_* is honoured by newer ones.
+    if since:
+        params['updated_after'] = since.isoformat()
+        params['merged_after'] = since.isoformat()
+    if until:
+        params['merged_before'] = until.isoformat()
+    return params
+
+
+def in_window(mr, since, until):
+    merged_at = mr.get('merged_at')
+    if not merged_at:
+        return False
+    ts = datetime.fromisoformat(merged_at.replace('Z', '+00:00'))
+    return (since is None or ts >= since) and (until is None or ts < until)
+
+
+def list_merged_mrs(client, scope, scope_id, since, until, target_branch):
+    path = f"/{scope}/{quote(str(scope_id), safe='')}/merge_requests"
+    params = merged_mr_params(since, until, target_branch)
+    with span('list_mrs') as s:
+        mrs = [mr for mr in client.paginate(path, params) if in_window(mr, since, until)]
+        s.add(rows=len(mrs))
+    return mrs
+
+
+def collect_mr(client, mr):
+    with span('mr_commits') as s:
+        commits = list(client.paginate(f"/projects/{mr['project_id']}/merge_requests/{mr['iid']}/commits"))
+        s.add(rows=len(commits))
+    return {
+        'project_id': mr['project_id'],
+        'mr_id': mr['id'],
+        'mr_iid': mr['iid'],
+        'title': mr.get('title'),
+        'description': mr.get('description'),
+        'web_url': mr.get('web_url'),
+        'source_branch': mr.get('source_branch'),
+        'target_branch': mr.get('target_branch'),
+        'merged_at': mr.get('merged_at'),
+        'author': {
+            'name': (mr.get('author') or {}).get('name'),
+            'username': (mr.get('author') or {}).get('username'),
+        },
+        'commits': [
+            {
+                'id': c.get('id'),
+                'short_id': c.get('short_id'),
+                'title': c.get('title'),
+                'message': c.get('message'),
+                'author_name': c.get('author_name'),
+                'authored_date': c.get('authored_date'),
+                'web_url': c.get('web_url'),
+            }
+            for c in commits
+        ],
+    }
+
+
+def collect(client, scopes, since, until, target_branch, out, workers=8):
+    """
+    List merged MRs for every (scope, id) and fetch their commits, writing one
+    NDJSON line per MR as soon as its commits are in. Returns (mrs, commits).
+    """
+    mr_count = commit_count = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = {
+            pool.submit(list_merged_mrs, client, scope, scope_id, since, until, target_branch): 'list'
+            for scope, scope_id in scopes
+        }
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                kind = pending.pop(future)
+                if kind == 'list':
+                    for mr in future.result():
+                        pending[pool.submit(collect_mr, client, mr)] = 'mr'
+                else:
+                    record = future.result()
+                    with span('write', rows=1):
+                        out.write(json.dumps(record) + '\n')
+                    mr_count += 1
+                    commit_count += len(record['commits'])
+    return mr_count, commit_count
+
+
+def parse_date(value):
+    return datetime.strptime(value, '%Y-%m-%d').replace(tzinfo=timezone.utc)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Collect merged MRs and their commits from many GitLab projects (or a group) as NDJSON'
+    )
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--project-id', nargs='+', help='One or more GitLab project IDs or paths')
+    target.add_argument('--group-id', help='GitLab group ID or path (includes subgroups)')
+    parser.add_argument('--since', type=parse_date, help='Only MRs merged on/after this date (YYYY-MM-DD)')
+    parser.add_argument('--until', type=parse_date, help='Only MRs merged before this date (YYYY-MM-DD)')
+    parser.add_argument('--target-branch', default='main',
+                        help="Target branch filter; pass '' for all branches (default: main)")
+    parser.add_argument('--workers', type=int, default=8, help='Concurrent requests (default: 8)')
+    parser.add_argument('--output', '-o', default='-', help='NDJSON output file (default: stdout)')
+    parser.add_argument('--config', default='gitlab_config.yaml',
+                        help='Path to YAML config file (default: gitlab_config.yaml)')
+    parser.add_argument('--base-url', help='Override base_url from the config (e.g. a local mock API)')
+    add_profile_args(parser)
+    args = parser.parse_args()
+
+    try:
+        config = load_config(args.config)
+        client = GitLabClient(
+            args.base_url or config['base_url'],
+            config['private_token'],
+            config.get('verify_ssl', True),
+            pool_size=args.workers,
+        )
+        if args.group_id:
+            scopes = [('groups', args.group_id)]
+        else:
+            scopes = [('projects', pid) for pid in args.project_id]
+
+        started = time.perf_counter()
+        out = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8', buffering=1 << 16)
+        try:
+            with profiling(args):
+                mrs, commits = collect(client, scopes, args.since, args.until, args.target_branch or None, out, args.workers)
+        finally:
+            if out is not sys.stdout:
+                out.close()
+        elapsed = time.perf_counter() - started
+        print(f"[gitlab_collect] {mrs:,} MRs / {commits:,} commits via {client.requests_made:,} requests "
+              f"in {elapsed:.1f}s", file=sys.stderr)
+
+    except Exception as e:
+        print(f"\nERROR: {str(e)}", file=sys.stderr)
+        exit(1)
+
+
+if __name__ == '__main__':
+    main()
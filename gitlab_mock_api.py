@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the slice of the GitLab v4 API used by gitlab_collect.py.
+
+Serves deterministic synthetic projects, merged MRs and commits with GitLab's
+pagination headers (Link, X-Next-Page, X-Total) and rate-limit headers, and
+answers 429 once the per-window budget is spent. Point the collector at it
+with --base-url http://127.0.0.1:<port>/api/v4.
+"""
+import argparse
+import json
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs, urlencode
+
+
+class MockData:
+    def __init__(self, projects, mrs_per_project, commits_per_mr, start):
+        self.projects = projects
+        self.mrs_per_project = mrs_per_project
+        self.commits_per_mr = commits_per_mr
+        self.start = start
+
+    def mr(self, project_id, iid):
+        merged_at = self.start + timedelta(hours=iid * 7 + project_id)
+        return {
+            'id': project_id * 100000 + iid,
+            'iid': iid,
+            'project_id': project_id,
+            'title': f"DASH-{iid}: change {iid} in project {project_id}",
+            'description': '',
+            'state': 'merged',
+            'source_branch': f"feature/DASH-{iid}",
+            'target_branch': 'main',
+            'web_url': f"http://gitlab.local/group/project-{project_id}/-/merge_requests/{iid}",
+            'merged_at': merged_at.isoformat().replace('+00:00', 'Z'),
+            'updated_at': merged_at.isoformat().replace('+00:00', 'Z'),
+            'author': {'name': f"Dev {iid % 7}", 'username': f"dev{iid % 7}"},
+        }
+
+    def merged_mrs(self, project_ids, params):
+        since = params.get('updated_after')
+        until = params.get('merged_before')
+        since = datetime.fromisoformat(since) if since else None
+        until = datetime.fromisoformat(until) if until else None
+        mrs = []
+        for pid in project_ids:
+            for iid in range(self.mrs_per_project, 0, -1):
+                mr = self.mr(pid, iid)
+                merged_at = datetime.fromisoformat(mr['merged_at'].replace('Z', '+00:00'))
+                if (since is None or merged_at >= since) and (until is None or merged_at < until):
+                    mrs.append(mr)
+        return mrs
+
+    def commits(self, project_id, iid):
+        return [
+            {
+                'id': f"{project_id:04x}{iid:06x}{n:06x}".ljust(40, '0'),
+                'short_id': f"{project_id:04x}{iid:04x}",
+                'title': f"DASH-{iid} commit {n}",
+                'message': f"DASH-{iid} commit {n}\n",
+                'author_name': f"Dev {iid % 7}",
+                'authored_date': self.mr(project_id, iid)['merged_at'],
+                'web_url': f"http://gitlab.local/group/project-{project_id}/-/commit/{n}",
+            }
+            for n in range(self.commits_per_mr)
+        ]
+
+
+class RateLimiter:
+    def __init__(self, limit, window):
+        self.limit = limit
+        self.window = window
+        self.lock = threading.Lock()
+        self.reset_at = time.time() + window
+        self.used = 0
+
+    def take(self):
+        with self.lock:
+            now = time.time()
+            if now >= self.reset_at:
+                self.reset_at = now + self.window
+                self.used = 0
+            self.used += 1
+            return self.used <= self.limit, max(self.limit - self.used, 0), self.reset_at
+
+
+def make_handler(data, limiter, max_per_page, latency):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):
+            pass
+
+        def send_json(self, status, body, extra_headers=()):
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            for key, value in extra_headers:
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            ok, remaining, reset_at = limiter.take()
+            rate_headers = [('RateLimit-Limit', str(limiter.limit)),
+                            ('RateLimit-Remaining', str(remaining)),
+                            ('RateLimit-Reset', str(int(reset_at) + 1))]
+            if not ok:
+                retry = max(reset_at - time.time(), 0)
+                return self.send_json(429, {'message': 'Retry later'},
+                                      rate_headers + [('Retry-After', f"{retry:.0f}")])
+            if latency:
+                time.sleep(latency)
+
+            url = urlparse(self.path)
+            params = {k: v[0] for k, v in parse_qs(url.query).items()}
+            path = url.path
+            if path.startswith('/api/v4'):
+                path = path[len('/api/v4'):]
+
+            m = re.fullmatch(r'/projects/(\d+)/merge_requests/(\d+)/commits', path)
+            if m:
+                items = data.commits(int(m.group(1)), int(m.group(2)))
+            elif re.fullmatch(r'/projects/(\d+)/merge_requests', path):
+                items = data.merged_mrs([int(path.split('/')[2])], params)
+            elif re.fullmatch(r'/groups/[^/]+/merge_requests', path):
+                items = data.merged_mrs(range(1, data.projects + 1), params)
+            else:
+                return self.send_json(404, {'message': '404 Not Found'}, rate_headers)
+
+            per_page = min(int(params.get('per_page', 20)), max_per_page)
+            page = int(params.get('page', 1))
+            chunk = items[(page - 1) * per_page: page * per_page]
+            headers = rate_headers + [('X-Total', str(len(items))), ('X-Per-Page', str(per_page))]
+            if page * per_page < len(items):
+                next_params = dict(params, page=page + 1)
+                next_url = f"http://{self.headers['Host']}{url.path}?{urlencode(next_params)}"
+                headers += [('X-Next-Page', str(page + 1)), ('Link', f'<{next_url}>; rel="next"')]
+            self.send_json(200, chunk, headers)
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve a local mock of the GitLab MR/commit API')
+    parser.add_argument('--port', type=int, default=8929)
+    parser.add_argument('--projects', type=int, default=20)
+    parser.add_argument('--mrs-per-project', type=int, default=250)
+    parser.add_argument('--commits-per-mr', type=int, default=30)
+    parser.add_argument('--max-per-page', type=int, default=20,
+                        help='Server-side page size cap, like GitLab.com (default: 20)')
+    parser.add_argument('--rate-limit', type=int, default=2000, help='Requests per window (default: 2000)')
+    parser.add_argument('--rate-window', type=float, default=60.0, help='Rate-limit window in seconds (default: 60)')
+    parser.add_argument('--latency', type=float, default=0.0, help='Artificial per-request latency in seconds')
+    args = parser.parse_args()
+
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    data = MockData(args.projects, args.mrs_per_project, args.commits_per_mr, start)
+    limiter = RateLimiter(args.rate_limit, args.rate_window)
+    server = ThreadingHTTPServer(('127.0.0.1', args.port),
+                                 make_handler(data, limiter, args.max_per_page, args.latency))
+    print(f"Mock GitLab API on http://127.0.0.1:{args.port}/api/v4 "
+          f"({args.projects} projects x {args.mrs_per_project} MRs x {args.commits_per_mr} commits)")
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
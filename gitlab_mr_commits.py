@@ -1,4 +1,3 @@
-import requests
 import argparse
 import yaml
 from pathlib import Path
@@ -32,6 +31,7 @@ def get_latest_merged_mr(project_id, private_token, base_url='https://gitlab.com
     """
     Get the latest merge request merged into the main branch
     """
+    import requests
     url = f"{base_url}/projects/{project_id}/merge_requests"
     params = {
         'state': 'merged',
@@ -58,6 +58,7 @@ def get_commit_messages_from_mr(project_id, private_token, mr_iid, base_url='htt
     """
     Get all commit messages from a merge request
     """
+    import requests
     url = f"{base_url}/projects/{project_id}/merge_requests/{mr_iid}/commits"
     headers = {'PRIVATE-TOKEN': private_token}
 
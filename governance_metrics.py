@@ -0,0 +1,427 @@
+#!/usr/bin/env python3
+"""
+Governance metrics for hypotheses H1–H5 (hypothesis_tests.md).
+
+One aggregate statement over the five source tables returns a handful of
+histograms:
+
+  lcp      LCPs per (instance count, app count, has a Technical Service link)
+  project  Jira projects per number of LCPs they track
+  app      Business Applications per number of LCPs controlling them
+  outlier  the LCP with the most apps (then instances)
+
+and summarize() turns them into the H1–H5 numbers. compute_frames() builds
+the same histograms with grouped pandas operations from a local copy of the
+tables (synthetic_cmdb.py --output files), so both paths share one summary.
+
+Each run is written to ``<snapshots>/metrics-<date>.json`` (re-running on the
+same day replaces it), and ``report`` renders the latest snapshot plus the
+trend across all of them as Markdown.
+
+A Technical Service link is a lean_control_application row whose
+servicenow_app_id is a business service correlation id, as in the by_ts base.
+"""
+import argparse
+import datetime
+import glob
+import json
+import os
+import time
+
+import yaml
+
+from instrument import span, add_profile_args, profiling
+
+SNAPSHOT_VERSION = 1
+HISTOGRAM_COLUMNS = ['kind', 'id', 'inst_count', 'app_count', 'tech', 'n']
+
+LCP_SQL = """
+WITH lcp AS (
+  SELECT
+    la.lean_control_service_id                AS lcp,
+    COUNT(DISTINCT si.correlation_id)         AS inst_count,
+    COUNT(DISTINCT ba.correlation_id)         AS app_count,
+    COUNT(DISTINCT bs.service_correlation_id) AS tech_count
+  FROM public.lean_control_application AS la
+  LEFT JOIN public.vwsfitserviceinstance AS si
+    ON la.servicenow_app_id = si.correlation_id
+  LEFT JOIN public.vwsfbusinessapplication AS ba
+    ON si.business_application_sysid = ba.business_application_sys_id
+  LEFT JOIN public.vwsfitbusinessservice AS bs
+    ON la.servicenow_app_id = bs.service_correlation_id
+  GROUP BY la.lean_control_service_id
+)
+"""
+
+# The same per-LCP counts, maintained incrementally by lcp_rollup.py (collect --rollup)
+ROLLUP_LCP_SQL = """
+WITH lcp AS (
+  SELECT
+    lean_control_service_id AS lcp,
+    instance_count          AS inst_count,
+    app_count               AS app_count,
+    technical_service_count AS tech_count
+  FROM public.lcp_rollup
+)
+"""
+
+HISTOGRAMS_SQL = """
+, project AS (
+  SELECT b.jira_backlog_id, COUNT(DISTINCT la.lean_control_service_id) AS lcp_count
+  FROM public.lean_control_product_backlog_details AS b
+  LEFT JOIN public.lean_control_application AS la
+    ON b.lct_product_id = la.lean_control_service_id
+  GROUP BY b.jira_backlog_id
+)
+, app AS (
+  SELECT ba.correlation_id, COUNT(DISTINCT la.lean_control_service_id) AS lcp_count
+  FROM public.vwsfbusinessapplication AS ba
+  JOIN public.vwsfitserviceinstance AS si
+    ON ba.business_application_sys_id = si.business_application_sysid
+  JOIN public.lean_control_application AS la
+    ON si.correlation_id = la.servicenow_app_id
+  GROUP BY ba.correlation_id
+)
+, outlier AS (
+  SELECT lcp FROM lcp ORDER BY app_count DESC, inst_count DESC, lcp LIMIT 1
+)
+SELECT 'lcp' AS kind, NULL AS id, inst_count, app_count,
+       CASE WHEN tech_count > 0 THEN 1 ELSE 0 END AS tech, COUNT(*) AS n
+FROM lcp
+GROUP BY inst_count, app_count, CASE WHEN tech_count > 0 THEN 1 ELSE 0 END
+UNION ALL
+SELECT 'project', NULL, lcp_count, NULL, NULL, COUNT(*) FROM project GROUP BY lcp_count
+UNION ALL
+SELECT 'app', NULL, lcp_count, NULL, NULL, COUNT(*) FROM app GROUP BY lcp_count
+UNION ALL
+SELECT 'outlier', lcp.lcp, lcp.inst_count, lcp.app_count, NULL, 1
+FROM lcp JOIN outlier ON lcp.lcp = outlier.lcp
+"""
+
+METRICS_SQL = LCP_SQL + HISTOGRAMS_SQL
+
+
+# ——— Histograms ———
+
+def compute_sql(engine, rollup=False):
+    """
+    Histogram rows (HISTOGRAM_COLUMNS) from the database, in one statement.
+    With ``rollup`` the per-LCP counts come from lcp_rollup, refreshed first.
+    """
+    sql = METRICS_SQL
+    if rollup:
+        import lcp_rollup
+        with span('rollup_refresh'):
+            lcp_rollup.refresh(engine)
+        sql = ROLLUP_LCP_SQL + HISTOGRAMS_SQL
+    with span('connect'):
+        conn = engine.connect()
+    with conn, span('query') as s:
+        rows = [tuple(r) for r in conn.exec_driver_sql(sql)]
+        s.add(rows=len(rows))
+    return rows
+
+
+def compute_frames(tables):
+    """compute_sql() for synthetic_cmdb.read_tables() DataFrames, with grouped pandas operations."""
+    import pandas as pd
+
+    la = tables['lean_control_application'][['lean_control_service_id', 'servicenow_app_id']]
+    si = tables['vwsfitserviceinstance'][['correlation_id', 'business_application_sysid']]
+    ba = tables['vwsfbusinessapplication'][['business_application_sys_id', 'correlation_id']]
+    bs = tables['vwsfitbusinessservice'][['service_correlation_id']]
+    backlog = tables['lean_control_product_backlog_details'][['jira_backlog_id', 'lct_product_id']]
+
+    with span('lcp', rows=len(la)):
+        m = (
+            la.merge(si.rename(columns={'correlation_id': 'inst_id'}),
+                     left_on='servicenow_app_id', right_on='inst_id', how='left')
+              .merge(ba.rename(columns={'correlation_id': 'app_id'}),
+                     left_on='business_application_sysid', right_on='business_application_sys_id', how='left')
+              .merge(bs.rename(columns={'service_correlation_id': 'tech_id'}),
+                     left_on='servicenow_app_id', right_on='tech_id', how='left')
+        )
+        lcp = m.groupby('lean_control_service_id', dropna=False).agg(
+            inst_count=('inst_id', 'nunique'), app_count=('app_id', 'nunique'), tech_count=('tech_id', 'nunique'))
+        lcp['tech'] = (lcp['tech_count'] > 0).astype(int)
+        lcp_hist = lcp.groupby(['inst_count', 'app_count', 'tech']).size().rename('n').reset_index()
+
+    with span('project', rows=len(backlog)):
+        matched = backlog['lct_product_id'].where(backlog['lct_product_id'].isin(la['lean_control_service_id']))
+        per_project = matched.groupby(backlog['jira_backlog_id'], dropna=False).nunique()
+        project_hist = per_project.value_counts().rename_axis('inst_count').rename('n').reset_index()
+
+    with span('app', rows=len(si)):
+        a = (ba.rename(columns={'correlation_id': 'app_id'})
+               .merge(si.rename(columns={'correlation_id': 'inst_id'}),
+                      left_on='business_application_sys_id', right_on='business_application_sysid')
+               .merge(la, left_on='inst_id', right_on='servicenow_app_id'))
+        per_app = a.groupby('app_id', dropna=False)['lean_control_service_id'].nunique()
+        app_hist = per_app.value_counts().rename_axis('inst_count').rename('n').reset_index()
+
+    top = lcp.sort_values(['app_count', 'inst_count'], ascending=False, kind='stable').head(1)
+    frames = [
+        lcp_hist.assign(kind='lcp', id=None),
+        project_hist.assign(kind='project', id=None, app_count=None, tech=None),
+        app_hist.assign(kind='app', id=None, app_count=None, tech=None),
+        top.reset_index().rename(columns={'lean_control_service_id': 'id'}).assign(kind='outlier', tech=None, n=1),
+    ]
+    hist = pd.concat([f.reindex(columns=HISTOGRAM_COLUMNS) for f in frames], ignore_index=True)
+    return list(hist.astype(object).where(hist.notna(), None).itertuples(index=False, name=None))
+
+
+# ——— Summary ———
+
+def _median(counts):
+    """Median of a {value: frequency} histogram."""
+    total = sum(counts.values())
+    if not total:
+        return None
+    middle = [(total - 1) // 2, total // 2]
+    found, seen = [], 0
+    for value in sorted(counts):
+        seen += counts[value]
+        while middle and middle[0] < seen:
+            found.append(value)
+            middle.pop(0)
+    return (found[0] + found[1]) / 2
+
+
+def _buckets(counts):
+    """{'0', '1', '>1'} totals of a {count: frequency} histogram."""
+    out = {'0': 0, '1': 0, '>1': 0}
+    for value, n in counts.items():
+        out['0' if value == 0 else '1' if value == 1 else '>1'] += n
+    return out
+
+
+def _share(part, whole):
+    return round(part / whole, 4) if whole else None
+
+
+def summarize(rows):
+    """H1–H5 numbers from the histogram rows."""
+    lcps, projects, apps, outlier = [], {}, {}, None
+    for kind, id_, inst, app, tech, n in rows:
+        inst, app, n = int(inst), (int(app) if app is not None else None), int(n)
+        if kind == 'lcp':
+            lcps.append((inst, app, int(tech), n))
+        elif kind == 'project':
+            projects[inst] = projects.get(inst, 0) + n
+        elif kind == 'app':
+            apps[inst] = apps.get(inst, 0) + n
+        elif kind == 'outlier':
+            outlier = {'lean_control_service_id': id_, 'instances': inst, 'apps': app}
+
+    total = sum(n for *_, n in lcps)
+    app_service = sum(n for inst, _, _, n in lcps if inst > 0)
+    technical = sum(n for _, _, tech, n in lcps if tech)
+    both = sum(n for inst, _, tech, n in lcps if inst > 0 and tech)
+    h1 = {
+        'lcps': total,
+        'application_service': app_service,
+        'technical_service': technical,
+        'both': both,
+        'neither': sum(n for inst, _, tech, n in lcps if inst == 0 and not tech),
+        'application_service_share': _share(app_service, total),
+        'technical_service_share': _share(technical, total),
+        # H1 holds when no Technical Service LCP has application links
+        'technical_with_app_links': sum(n for inst, app, tech, n in lcps if tech and (inst > 0 or app > 0)),
+    }
+
+    app_counts, inst_counts, distribution = {}, {}, {}
+    for inst, app, _, n in lcps:
+        app_counts[app] = app_counts.get(app, 0) + n
+        inst_counts[inst] = inst_counts.get(inst, 0) + n
+        distribution[(inst, app)] = distribution.get((inst, app), 0) + n
+    h2 = dict(_buckets(app_counts), lcps=total)
+
+    h3 = dict(_buckets(projects), projects=sum(projects.values()))
+    h3['anomalies'] = h3['0'] + h3['>1']
+
+    controlled = sum(apps.values())
+    h4 = {'apps': controlled, '1': apps.get(1, 0), '>1': controlled - apps.get(1, 0)}
+    h4['one_to_one_share'] = _share(h4['1'], controlled)
+
+    h5 = {
+        'median_apps': _median(app_counts),
+        'median_instances': _median(inst_counts),
+        'zero_apps_zero_instances': distribution.get((0, 0), 0),
+        'outlier': outlier,
+        'distribution': [{'inst_count': i, 'app_count': a, 'lcps': n} for (i, a), n in sorted(distribution.items())],
+    }
+    return {'H1': h1, 'H2': h2, 'H3': h3, 'H4': h4, 'H5': h5}
+
+
+# ——— Snapshots ———
+
+def write_snapshot(metrics, directory, source, seconds, today=None):
+    today = today or datetime.date.today()
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"metrics-{today.isoformat()}.json")
+    snapshot = {
+        'version': SNAPSHOT_VERSION,
+        'date': today.isoformat(),
+        'generated_at': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'source': source,
+        'seconds': round(seconds, 3),
+        'metrics': metrics,
+    }
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(snapshot, f, indent=2)
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_snapshots(directory):
+    """Snapshots in date order; files written by a newer SNAPSHOT_VERSION are skipped."""
+    snapshots = []
+    for path in sorted(glob.glob(os.path.join(directory, 'metrics-*.json'))):
+        with open(path) as f:
+            snapshot = json.load(f)
+        if snapshot.get('version', 0) <= SNAPSHOT_VERSION:
+            snapshots.append(snapshot)
+    return snapshots
+
+
+def _delta(now, before):
+    if before is None or now is None or now == before:
+        return ''
+    return f" ({now - before:+,})" if isinstance(now, int) else f" ({now - before:+.1%})"
+
+
+def render_markdown(snapshots):
+    latest = snapshots[-1]
+    m = latest['metrics']
+    prev = snapshots[-2]['metrics'] if len(snapshots) > 1 else None
+
+    def val(h, key, pct=False):
+        now = m[h][key]
+        before = prev[h].get(key) if prev else None
+        text = f"{now:.1%}" if pct and now is not None else (f"{now:,}" if isinstance(now, int) else str(now))
+        return text + _delta(now, before)
+
+    lines = [
+        '# Governance Metrics',
+        '',
+        f"Snapshot {latest['date']} from {latest['source']} (computed in {latest['seconds']:.2f}s)"
+        + (f"; changes against {snapshots[-2]['date']} in brackets." if prev else '.'),
+        '',
+        '## H1: Each Lean Control Product is linked to Application Services or Technical Services',
+        f"* {val('H1', 'application_service')} LCPs ({val('H1', 'application_service_share', True)}) "
+        f"map to Application Services; {val('H1', 'technical_service')} "
+        f"({val('H1', 'technical_service_share', True)}) are linked to Technical Services.",
+        f"* {val('H1', 'both')} are linked to both; {val('H1', 'neither')} to neither.",
+        f"* {val('H1', 'technical_with_app_links')} Technical Service LCPs also have Application Service "
+        f"or Business Application links.",
+        '',
+        '## H2: Business Applications per Lean Control Product',
+        f"* {val('H2', '0')} LCPs control 0 Business Applications; {val('H2', '1')} control exactly 1; "
+        f"{val('H2', '>1')} control more than 1.",
+        '',
+        '## H3: Every Jira Project tracks exactly one Lean Control Product',
+        f"* {val('H3', '1')} projects track one LCP; {val('H3', '0')} have no LCP link; "
+        f"{val('H3', '>1')} track several ({val('H3', 'anomalies')} anomalous).",
+        '',
+        '## H4: Each Business Application is controlled by exactly one Lean Control Product',
+        f"* {val('H4', '1')} applications ({val('H4', 'one_to_one_share', True)}) have one LCP; "
+        f"{val('H4', '>1')} have several.",
+        '',
+        '## H5: Lean Control Products linked to applications and environments',
+        f"* Median {m['H5']['median_apps']} apps and {m['H5']['median_instances']} instances per LCP; "
+        f"{val('H5', 'zero_apps_zero_instances')} LCPs have neither.",
+    ]
+    if m['H5']['outlier']:
+        o = m['H5']['outlier']
+        lines.append(f"* Largest: {o['lean_control_service_id']} with {o['apps']:,} apps and "
+                     f"{o['instances']:,} instances.")
+    lines += ['', '| inst_count | app_count | LCPs |', '|---:|---:|---:|']
+    lines += [f"| {d['inst_count']} | {d['app_count']} | {d['lcps']:,} |" for d in m['H5']['distribution']]
+
+    lines += [
+        '', '## Trend', '',
+        '| date | LCPs | tech share | 0 apps | 1 app | >1 apps | projects 0/1/>1 | apps 1:1 share |',
+        '|---|---:|---:|---:|---:|---:|---|---:|',
+    ]
+    for s in snapshots:
+        h = s['metrics']
+        share = h['H1']['technical_service_share']
+        one = h['H4']['one_to_one_share']
+        lines.append(
+            f"| {s['date']} | {h['H1']['lcps']:,} | {share:.1%} | {h['H2']['0']:,} | {h['H2']['1']:,} | "
+            f"{h['H2']['>1']:,} | {h['H3']['0']:,}/{h['H3']['1']:,}/{h['H3']['>1']:,} | {one:.1%} |"
+            if share is not None and one is not None else f"| {s['date']} | {h['H1']['lcps']:,} | | | | | | |"
+        )
+    return '\n'.join(lines) + '\n'
+
+
+# ——— Main ———
+
+def load_config(path):
+    with open(path, 'r') as f:
+        return yaml.safe_load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compute the H1–H5 governance metrics and trend them as Markdown")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p_collect = sub.add_parser('collect', help='Compute the metrics and write the day\'s snapshot')
+    p_collect.add_argument('-c', '--config', default='config.yaml', help='YAML config with the database')
+    source = p_collect.add_mutually_exclusive_group()
+    source.add_argument('--sqlite', help='Query this SQLite file (synthetic_cmdb.py --sqlite) instead')
+    source.add_argument('--tables', help='Compute with pandas from the table files in this directory')
+    p_collect.add_argument('--format', choices=['csv', 'parquet'], default='parquet',
+                           help='Format of the --tables files (default: parquet)')
+    p_collect.add_argument('--rollup', action='store_true',
+                           help='Read the per-LCP counts from lcp_rollup (refreshed incrementally) instead of the join')
+    p_collect.add_argument('--snapshots', default='governance_snapshots', help='Snapshot directory')
+    p_collect.add_argument('--markdown', help='Also render the report to this file')
+    add_profile_args(p_collect)
+
+    p_report = sub.add_parser('report', help='Render the latest snapshot and the trend as Markdown')
+    p_report.add_argument('--snapshots', default='governance_snapshots', help='Snapshot directory')
+    p_report.add_argument('--output', '-o', default='governance_metrics.md')
+    args = parser.parse_args()
+
+    if args.command == 'collect':
+        started = time.perf_counter()
+        with profiling(args):
+            if args.tables:
+                from synthetic_cmdb import read_tables
+                with span('read_tables'):
+                    tables = read_tables(args.tables, args.format)
+                rows = compute_frames(tables)
+                label = f"tables:{args.tables}"
+            else:
+                if args.sqlite:
+                    from synthetic_cmdb import sqlite_engine
+                    engine, label = sqlite_engine(args.sqlite), f"sqlite:{args.sqlite}"
+                else:
+                    from sqlalchemy import create_engine
+                    db = load_config(args.config)['database']
+                    engine = create_engine(f"postgresql://{db['user']}:{db['password']}"
+                                           f"@{db['host']}:{db['port']}/{db['name']}")
+                    label = f"postgres:{db['name']}"
+                rows = compute_sql(engine, args.rollup)
+            with span('summarize', rows=len(rows)):
+                metrics = summarize(rows)
+        path = write_snapshot(metrics, args.snapshots, label, time.perf_counter() - started)
+        print(f"✅ Snapshot written to {path} in {time.perf_counter() - started:.2f}s")
+        if not args.markdown:
+            return
+        output = args.markdown
+    else:
+        output = args.output
+
+    snapshots = load_snapshots(args.snapshots)
+    if not snapshots:
+        parser.error(f"No snapshots in {args.snapshots}; run 'collect' first")
+    with open(output, 'w') as f:
+        f.write(render_markdown(snapshots))
+    print(f"✅ Markdown written to {output} ({len(snapshots)} snapshot(s))")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""
+Shared helpers for working with the generate_dataset.py edge table
+(id, parent, name, lean_control_service_id, jira_backlog_id, app_id, ...).
+
+Renderers use these to cut the hierarchy down to what will actually be shown
+(filters, a chosen root, depth and width limits) on plain dict/list indexes,
+before any anytree/treelib/rich node objects are created.
+"""
+ROOT_ID = 'Business Services'
+
+
+def filter_edges(df, environments=None, install_types=None):
+    """
+    Keep only instances whose environment / install_type match, then drop
+    apps and services that are left without children because of it.
+    Matching is case-insensitive; ``None`` means no filter.
+    """
+    if not environments and not install_types:
+        return df
+
+    import pandas as pd
+    is_instance = df['instance_id'].notna() & (df['instance_id'] != '')
+    keep = pd.Series(True, index=df.index)
+    if environments:
+        wanted = {e.lower() for e in environments}
+        keep &= df['environment'].fillna('').str.lower().isin(wanted)
+    if install_types:
+        wanted = {t.lower() for t in install_types}
+        keep &= df['install_type'].fillna('').str.lower().isin(wanted)
+    filtered = df[~is_instance | keep]
+
+    # Two passes: apps that lost all their instances, then services that lost all their apps.
+    for _ in range(2):
+        emptied = set(df['parent'].dropna()) - set(filtered['parent'].dropna())
+        df, filtered = filtered, filtered[~filtered['id'].isin(emptied) | (filtered['id'] == ROOT_ID)]
+    return filtered
+
+
+def children_index(df, root_id=ROOT_ID):
+    """
+    parent id -> ordered, de-duplicated list of child ids. Rows whose parent is
+    not itself a node are attached to ``root_id``.
+    """
+    edges = df[['parent', 'id']].copy()
+    edges['parent'] = edges['parent'].where(edges['parent'].notna() & (edges['parent'] != ''), root_id)
+    edges = edges[edges['id'] != root_id]
+    valid = set(df['id']) | {root_id}
+    edges.loc[~edges['parent'].isin(valid), 'parent'] = root_id
+    edges = edges.drop_duplicates()
+    return {parent: group.tolist() for parent, group in edges.groupby('parent', sort=False)['id']}
+
+
+def select_subtree(children, roots, max_depth=None, max_children=None):
+    """
+    Walk ``children`` from ``roots`` and return (visible, more):
+
+    * visible: parent id -> child ids to draw, in order
+    * more:    parent id -> number of children hidden by ``max_children``
+      (rendered as a "+K more" node)
+
+    Each node is expanded once; a node reachable from several parents is
+    listed under the first one reached. Roots sit at depth 0, so
+    ``max_depth=1`` shows the roots and their direct children.
+    """
+    visible, more = {}, {}
+    seen = set(roots)
+    stack = [(root, 0) for root in reversed(roots)]
+    while stack:
+        node, depth = stack.pop()
+        if max_depth is not None and depth >= max_depth:
+            continue
+        kids = [k for k in children.get(node, []) if k not in seen]
+        if not kids:
+            continue
+        if max_children is not None and len(kids) > max_children:
+            more[node] = len(kids) - max_children
+            kids = kids[:max_children]
+        seen.update(kids)
+        visible[node] = kids
+        stack.extend((k, depth + 1) for k in reversed(kids))
+    return visible, more
+
+
+def walk(visible, roots):
+    """Yield visible node ids in depth-first order (roots first)."""
+    stack = list(reversed(roots))
+    while stack:
+        node = stack.pop()
+        yield node
+        stack.extend(reversed(visible.get(node, [])))
+
+
+def notna(value):
+    """pd.notna for the scalars found in edge-table cells (None, NaN or a string), without importing pandas."""
+    return value is not None and value == value
+
+
+def more_label(count):
+    return f"+{count} more"
+
+
+def add_selection_args(parser):
+    """The --root/--max-depth/--max-children/--env/--install-type options shared by the renderers."""
+    parser.add_argument('--root', action='append',
+                        help='Render only the subtree under this node id (repeatable)')
+    parser.add_argument('--max-depth', type=int, help='Levels below the root(s) to render')
+    parser.add_argument('--max-children', type=int,
+                        help='Children shown per node; the rest collapse into a "+K more" node')
+    parser.add_argument('--env', action='append', help='Only instances in this environment (repeatable)')
+    parser.add_argument('--install-type', action='append', help='Only instances with this install_type (repeatable)')
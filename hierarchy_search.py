@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+Prefix / fuzzy search over the generate_dataset.py hierarchy.
+
+The index is a SQLite file next to the dataset (``<csv>.search.sqlite``) with
+one row per reachable LCP → service → app → instance path, a sorted term table
+(names, name words and ids) for prefix lookups, and an FTS5 trigram index over
+the distinct names for fuzzy lookups. Both read a bounded number of index
+entries instead of sorting every match, so queries stay in the low
+milliseconds as the dataset grows.
+"""
+import argparse
+import difflib
+import json
+import os
+import sqlite3
+import time
+
+ROOT_ID = 'Business Services'
+
+TEXT_COLUMNS = ['name', 'app_name', 'instance_name']
+ID_COLUMNS = ['id', 'lean_control_service_id', 'jira_backlog_id', 'service_id', 'app_id', 'instance_id']
+SEARCH_COLUMNS = TEXT_COLUMNS + ID_COLUMNS
+HIT_COLUMNS = [
+    'kind', 'id', 'name', 'lean_control_service_id', 'jira_backlog_id',
+    'service_id', 'service_name', 'app_id', 'app_name', 'instance_id', 'instance_name',
+    'environment', 'install_type',
+]
+
+
+def default_index_path(csv_path):
+    return f"{csv_path}.search.sqlite"
+
+
+def build_paths(df):
+    """
+    One row per distinct ancestor path, for services, apps and instances.
+    An instance's service comes from its own row's ``service_id``; CSVs
+    written before that column existed fall back to the services of its app
+    in the same LCP, which lists an instance under every service of its app.
+    """
+    import pandas as pd
+    df = df[df['id'] != ROOT_ID]
+    own_service = 'service_id' in df.columns
+    services = df[df['parent'] == ROOT_ID].assign(
+        kind='service', service_id=lambda d: d['id'], service_name=lambda d: d['name'])
+    service_names = services[['service_id', 'service_name']].drop_duplicates('service_id')
+
+    apps = df[df['app_id'].notna() & df['instance_id'].isna()].drop(columns=['service_id'], errors='ignore')
+    apps = apps.merge(service_names, left_on='parent', right_on='service_id', how='left').assign(kind='app')
+
+    instances = df[df['instance_id'].notna()]
+    if own_service:
+        instances = instances.merge(service_names, on='service_id', how='left')
+    else:
+        app_services = apps[['app_id', 'lean_control_service_id', 'jira_backlog_id', 'service_id', 'service_name']]
+        instances = instances.merge(
+            app_services.drop_duplicates(),
+            on=['app_id', 'lean_control_service_id', 'jira_backlog_id'], how='left',
+        )
+    instances = instances.assign(kind='instance')
+
+    paths = pd.concat([services, apps, instances], ignore_index=True)
+    return paths.reindex(columns=HIT_COLUMNS).drop_duplicates()
+
+
+def format_path(hit):
+    parts = []
+    if hit.get('lean_control_service_id'):
+        parts.append(f"LCP {hit['lean_control_service_id']}")
+    if hit.get('service_id'):
+        parts.append(f"{hit.get('service_name') or ''} ({hit['service_id']})".strip())
+    if hit.get('app_id'):
+        parts.append(f"{hit.get('app_name') or ''} ({hit['app_id']})".strip())
+    if hit.get('instance_id'):
+        parts.append(f"{hit.get('instance_name') or ''} ({hit['instance_id']})".strip())
+    return ' → '.join(parts)
+
+
+def path_terms(paths):
+    """(term, hit_id) pairs: every lower-cased searchable value plus each word of the names."""
+    import pandas as pd
+    frames = []
+    for col in SEARCH_COLUMNS:
+        values = paths[col].dropna().str.lower()
+        frames.append(values)
+        if col in TEXT_COLUMNS:
+            frames.append(values.str.split(r'[\s_\-/()]+').explode())
+    terms = pd.concat(frames).rename('term').reset_index().rename(columns={'index': 'hit_id'})
+    return terms[terms['term'].str.len() > 0].drop_duplicates()
+
+
+def build_index(csv_path, index_path=None):
+    import pandas as pd
+    index_path = index_path or default_index_path(csv_path)
+    df = pd.read_csv(csv_path, dtype=str)
+    paths = build_paths(df).reset_index(drop=True)
+    paths.index += 1
+
+    tmp_path = f"{index_path}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    conn = sqlite3.connect(tmp_path)
+    conn.executescript(f"""
+        CREATE TABLE hits (hit_id INTEGER PRIMARY KEY, {', '.join(f'{c} TEXT' for c in HIT_COLUMNS)});
+        CREATE TABLE terms (term TEXT NOT NULL, hit_id INTEGER NOT NULL);
+        CREATE TABLE names (name TEXT PRIMARY KEY);
+        CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+    """)
+    conn.executemany(
+        f"INSERT INTO hits VALUES ({', '.join('?' * (len(HIT_COLUMNS) + 1))})",
+        paths.astype(object).where(paths.notna(), None).itertuples(index=True, name=None),
+    )
+    conn.executemany("INSERT INTO terms VALUES (?, ?)", path_terms(paths)[['term', 'hit_id']].itertuples(index=False, name=None))
+    conn.executemany("INSERT INTO names VALUES (?)", ((n,) for n in paths['name'].dropna().str.lower().unique()))
+    conn.executescript("""
+        CREATE INDEX ix_terms_term ON terms (term, hit_id);
+        CREATE INDEX ix_hits_name ON hits (name COLLATE NOCASE);
+        CREATE VIRTUAL TABLE names_fts USING fts5(name, content='names', tokenize='trigram');
+        INSERT INTO names_fts (names_fts) VALUES ('rebuild');
+    """)
+    stat = os.stat(csv_path)
+    conn.executemany("INSERT INTO meta VALUES (?, ?)", [
+        ('source_mtime', str(stat.st_mtime)), ('source_size', str(stat.st_size)),
+    ])
+    conn.commit()
+    conn.close()
+    os.replace(tmp_path, index_path)
+    return index_path, len(paths)
+
+
+class HierarchySearch:
+    """
+    Read-only handle on a built index.
+
+    Prefix queries are a range scan over the sorted ``terms`` index (the
+    on-disk equivalent of walking a trie), read in index order. Fuzzy queries
+    take a capped set of names that contain part of every query word, rank
+    those by edit similarity, then expand the winners to their paths.
+    """
+
+    def __init__(self, index_path):
+        self.conn = sqlite3.connect(f"file:{index_path}?mode=ro", uri=True, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+
+    @classmethod
+    def for_dataset(cls, csv_path, index_path=None):
+        """Open the dataset's index, (re)building it first if missing or stale."""
+        index_path = index_path or default_index_path(csv_path)
+        if cls.is_stale(csv_path, index_path):
+            build_index(csv_path, index_path)
+        return cls(index_path)
+
+    @staticmethod
+    def is_stale(csv_path, index_path):
+        if not os.path.exists(index_path):
+            return True
+        conn = sqlite3.connect(index_path)
+        try:
+            meta = dict(conn.execute("SELECT key, value FROM meta"))
+        finally:
+            conn.close()
+        stat = os.stat(csv_path)
+        return meta.get('source_mtime') != str(stat.st_mtime) or meta.get('source_size') != str(stat.st_size)
+
+    def _hits(self, hit_ids):
+        if not hit_ids:
+            return []
+        rows = self.conn.execute(
+            f"SELECT * FROM hits WHERE hit_id IN ({', '.join('?' * len(hit_ids))})", hit_ids)
+        by_id = {r['hit_id']: dict(r) for r in rows}
+        return [by_id[h] for h in hit_ids if h in by_id]
+
+    def prefix(self, query, limit=20):
+        """Hits where a name, a word of a name, or an id starts with ``query`` (case-insensitive)."""
+        q = query.strip().lower()
+        if not q:
+            return []
+        # Exact matches lead; the rest follow in index order, so LIMIT stops the scan early.
+        hit_ids = [r['hit_id'] for r in self.conn.execute(
+            "SELECT hit_id FROM terms WHERE term = ? LIMIT ?", (q, limit))]
+        if len(hit_ids) < limit:
+            rows = self.conn.execute(
+                "SELECT hit_id FROM terms WHERE term > ? AND term < ? ORDER BY term LIMIT ?",
+                (q, q + '\uffff', limit * 10),
+            )
+            hit_ids = list(dict.fromkeys(hit_ids + [r['hit_id'] for r in rows]))[:limit]
+        return self._hits(hit_ids)
+
+    def _candidates(self, q, max_candidates):
+        """
+        Up to ``max_candidates`` names, in index order, containing a piece of
+        every query word; names with a piece of any word if none match them
+        all. A word's pieces are its first and last trigrams, one of which
+        survives a single typo once they do not overlap, or else all its
+        trigrams; single trigrams also skip FTS5's phrase position checks.
+        Three-letter words are one trigram with no typo tolerance, so they
+        only filter when the query has no longer word.
+        """
+        words = [w for w in q.split() if len(w) > 3] or [w for w in q.split() if len(w) == 3]
+        clauses = []
+        for word in words:
+            pieces = [word[:3], word[-3:]] if len(word) >= 6 else [word[i:i + 3] for i in range(len(word) - 2)]
+            clauses.append('(' + ' OR '.join('"' + p.replace('"', '""') + '"' for p in pieces) + ')')
+        for op in (' AND ', ' OR ') if len(clauses) > 1 else (' AND ',) if clauses else ():
+            names = [r['name'] for r in self.conn.execute(
+                "SELECT name FROM names_fts WHERE names_fts MATCH ? LIMIT ?", (op.join(clauses), max_candidates))]
+            if names:
+                return names
+        return []
+
+    def fuzzy(self, query, limit=20, cutoff=0.5, max_names=10, max_candidates=50):
+        """Approximate name matches, best first."""
+        q = query.strip().lower()
+        if len(q) < 3:
+            return self.prefix(q, limit)
+        scored = []
+        for name in self._candidates(q, max_candidates):
+            matcher = difflib.SequenceMatcher(None, q, name)
+            if matcher.quick_ratio() >= cutoff:
+                ratio = matcher.ratio()
+                if ratio >= cutoff:
+                    scored.append((ratio, name))
+        best = [name for ratio, name in sorted(scored, reverse=True)][:max_names]
+
+        hit_ids = []
+        for name in best:
+            hit_ids.extend(r['hit_id'] for r in self.conn.execute(
+                "SELECT hit_id FROM hits WHERE name = ? COLLATE NOCASE LIMIT ?", (name, limit)))
+            if len(hit_ids) >= limit:
+                break
+        return self._hits(hit_ids[:limit])
+
+    def search(self, query, fuzzy=False, limit=20):
+        hits = self.fuzzy(query, limit) if fuzzy else self.prefix(query, limit)
+        for hit in hits:
+            hit['path'] = format_path(hit)
+        return hits
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or query the hierarchy search index")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p_build = sub.add_parser('build', help='Build the index next to a hierarchy CSV')
+    p_build.add_argument('--input', '-i', default='si_hierarchy.csv', help='Hierarchy CSV from generate_dataset.py')
+    p_build.add_argument('--index', help='Index path (default: <input>.search.sqlite)')
+
+    p_search = sub.add_parser('search', help='Search services, apps and instances by name or id')
+    p_search.add_argument('query')
+    p_search.add_argument('--input', '-i', default='si_hierarchy.csv', help='Hierarchy CSV from generate_dataset.py')
+    p_search.add_argument('--index', help='Index path (default: <input>.search.sqlite)')
+    p_search.add_argument('--fuzzy', action='store_true', help='Approximate matching instead of prefix')
+    p_search.add_argument('--limit', type=int, default=20)
+    p_search.add_argument('--json', action='store_true', help='Emit hits as JSON')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        started = time.perf_counter()
+        index_path, count = build_index(args.input, args.index)
+        print(f"[hierarchy_search] Indexed {count:,} paths into '{index_path}' "
+              f"in {time.perf_counter() - started:.2f}s")
+        return
+
+    index = HierarchySearch.for_dataset(args.input, args.index)
+    started = time.perf_counter()
+    hits = index.search(args.query, fuzzy=args.fuzzy, limit=args.limit)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+
+    if args.json:
+        print(json.dumps(hits, indent=2))
+        return
+    for hit in hits:
+        print(f"[{hit['kind']:>8}] {hit['path']}")
+    print(f"[hierarchy_search] {len(hits)} hit(s) in {elapsed_ms:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,188 @@
+"""
+Lightweight hot-path instrumentation shared by the CLIs.
+
+Wrap a stage in ``span`` and count what it processed:
+
+    with span('fetch') as s:
+        rows = result.fetchall()
+        s.add(rows=len(rows))
+
+Spans nest within a thread (a span opened in a worker thread starts a new
+top-level stage) and cost one attribute check while profiling is
+off. Scripts add ``--profile`` / ``--profile-cprofile`` / ``--profile-trace``
+with ``add_profile_args`` and wrap their work in ``profiling(args)``, which
+prints a per-stage breakdown (time, share, rows/sec, peak RSS) and writes
+the optional cProfile stats or Chrome trace (chrome://tracing, Perfetto).
+"""
+import contextlib
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from collections import defaultdict
+
+
+def peak_rss_mb():
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # KiB on Linux, bytes on macOS
+    return usage / (2 ** 20 if sys.platform == 'darwin' else 1024)
+
+
+class Span:
+    __slots__ = ('name', 'path', 'tid', 'start', 'duration', 'counters', 'rss_mb')
+
+    def __init__(self, name, path, tid):
+        self.name = name
+        self.path = path
+        self.tid = tid
+        self.start = time.perf_counter()
+        self.duration = 0.0
+        self.counters = {}
+        self.rss_mb = 0.0
+
+    def add(self, **counts):
+        for key, n in counts.items():
+            self.counters[key] = self.counters.get(key, 0) + n
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def add(self, **counts):
+        pass
+
+
+NULL_SPAN = _NullSpan()
+
+
+class Recorder:
+    def __init__(self):
+        self.enabled = False
+        self.spans = []
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.started = time.perf_counter()
+
+    def reset(self):
+        self.spans = []
+        self.started = time.perf_counter()
+
+    @contextlib.contextmanager
+    def span(self, name, **counts):
+        if not self.enabled:
+            yield NULL_SPAN
+            return
+        stack = getattr(self.local, 'stack', None)
+        if stack is None:
+            stack = self.local.stack = []
+        path = '/'.join([s.name for s in stack] + [name])
+        s = Span(name, path, threading.get_ident())
+        if counts:
+            s.add(**counts)
+        stack.append(s)
+        try:
+            yield s
+        finally:
+            stack.pop()
+            s.duration = time.perf_counter() - s.start
+            s.rss_mb = peak_rss_mb()
+            with self.lock:
+                self.spans.append(s)
+
+    def summary(self):
+        """
+        Per span path: calls, total seconds, counters, peak RSS. Paths are in
+        tree order: each one follows its parent, siblings in first-seen order,
+        so stages that ran in other threads meanwhile do not split a parent
+        from its children.
+        """
+        stages, first = {}, {}
+        for s in sorted(self.spans, key=lambda s: s.start):
+            first.setdefault(s.path, s.start)
+            st = stages.setdefault(s.path, {'calls': 0, 'seconds': 0.0, 'counters': defaultdict(int),
+                                            'rss_mb': 0.0, 'depth': s.path.count('/')})
+            st['calls'] += 1
+            st['seconds'] += s.duration
+            st['rss_mb'] = max(st['rss_mb'], s.rss_mb)
+            for key, n in s.counters.items():
+                st['counters'][key] += n
+
+        def tree_key(path):
+            parts = path.split('/')
+            prefixes = ['/'.join(parts[:k]) for k in range(1, len(parts) + 1)]
+            return [(first.get(p, first[path]), p) for p in prefixes]
+
+        return {path: stages[path] for path in sorted(stages, key=tree_key)}
+
+    def report(self, out=sys.stderr):
+        """Stage table; stages run in worker threads can add up to more than the wall time."""
+        wall = time.perf_counter() - self.started
+        stages = self.summary()
+        if not stages:
+            return
+        print(f"\n⏱️  Profile ({wall:.3f}s wall, peak RSS {peak_rss_mb():.1f} MB)", file=out)
+        print(f"   {'stage':<36} {'calls':>7} {'seconds':>9} {'%':>6} {'rows':>11} {'rows/s':>11} {'RSS MB':>8}",
+              file=out)
+        for path, st in stages.items():
+            label = '  ' * st['depth'] + path.rsplit('/', 1)[-1]
+            rows = st['counters'].get('rows')
+            rate = f"{rows / st['seconds']:,.0f}" if rows and st['seconds'] > 0 else ''
+            extra = ', '.join(f"{k}={v:,}" for k, v in st['counters'].items() if k != 'rows')
+            print(f"   {label:<36} {st['calls']:>7,} {st['seconds']:>9.3f} {100 * st['seconds'] / wall:>5.1f}% "
+                  f"{'' if rows is None else f'{rows:,}':>11} {rate:>11} {st['rss_mb']:>8.1f}"
+                  + (f"  ({extra})" if extra else ''), file=out)
+
+    def chrome_trace(self, path):
+        """Write spans as Chrome trace 'complete' events."""
+        pid = os.getpid()
+        events = [{
+            'name': s.name, 'cat': s.path, 'ph': 'X', 'pid': pid, 'tid': s.tid,
+            'ts': (s.start - self.started) * 1e6, 'dur': s.duration * 1e6,
+            'args': dict(s.counters, rss_mb=round(s.rss_mb, 1)),
+        } for s in self.spans]
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+
+
+RECORDER = Recorder()
+span = RECORDER.span
+
+
+def add_profile_args(parser):
+    group = parser.add_argument_group('profiling')
+    group.add_argument('--profile', action='store_true',
+                       help='Print a per-stage timing breakdown (rows/sec, peak RSS) to stderr')
+    group.add_argument('--profile-cprofile', metavar='PATH', help='Also dump cProfile stats to PATH')
+    group.add_argument('--profile-trace', metavar='PATH', help='Also write a Chrome trace JSON to PATH')
+
+
+@contextlib.contextmanager
+def profiling(args):
+    """Enable spans (and cProfile) for the block when any --profile* option was given."""
+    wanted = getattr(args, 'profile', False) or getattr(args, 'profile_cprofile', None) \
+        or getattr(args, 'profile_trace', None)
+    if not wanted:
+        yield
+        return
+    RECORDER.reset()
+    RECORDER.enabled = True
+    profiler = None
+    if args.profile_cprofile:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(args.profile_cprofile)
+            print(f"[profile] cProfile stats written to {args.profile_cprofile}", file=sys.stderr)
+        RECORDER.enabled = False
+        if args.profile_trace:
+            RECORDER.chrome_trace(args.profile_trace)
+            print(f"[profile] Chrome trace written to {args.profile_trace}", file=sys.stderr)
+        if args.profile:
+            RECORDER.report()
@@ -0,0 +1,101 @@
+import json
+import sqlite3
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS dev_status (
+    issue_id TEXT NOT NULL,
+    application_type TEXT NOT NULL,
+    status_code INTEGER NOT NULL,
+    body TEXT,
+    etag TEXT,
+    last_modified TEXT,
+    fetched_at REAL NOT NULL,
+    last_access REAL NOT NULL,
+    PRIMARY KEY (issue_id, application_type)
+);
+CREATE INDEX IF NOT EXISTS ix_dev_status_last_access ON dev_status (last_access);
+"""
+
+
+class DevStatusCache:
+    """
+    Persistent cache of Jira dev-status detail responses keyed by
+    (issueId, applicationType).
+
+    Entries younger than ``ttl`` seconds are served as-is. Older entries are
+    revalidated with If-None-Match / If-Modified-Since when the server sent a
+    validator, otherwise refetched. 404s are cached too, since "no development
+    data" is the common answer. The table is capped at ``max_entries`` rows,
+    evicting the least recently used.
+    """
+
+    def __init__(self, path, ttl=24 * 3600, max_entries=50000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(SCHEMA)
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+
+    def close(self):
+        self._evict()
+        self.conn.close()
+
+    def get(self, issue_id, application_type):
+        """Return (entry, fresh). ``entry`` is a dict or None when nothing is cached."""
+        row = self.conn.execute(
+            "SELECT status_code, body, etag, last_modified, fetched_at FROM dev_status "
+            "WHERE issue_id = ? AND application_type = ?",
+            (str(issue_id), application_type),
+        ).fetchone()
+        if row is None:
+            return None, False
+        self.conn.execute(
+            "UPDATE dev_status SET last_access = ? WHERE issue_id = ? AND application_type = ?",
+            (time.time(), str(issue_id), application_type),
+        )
+        status_code, body, etag, last_modified, fetched_at = row
+        entry = {
+            "status_code": status_code,
+            "data": json.loads(body) if body else None,
+            "etag": etag,
+            "last_modified": last_modified,
+        }
+        return entry, time.time() - fetched_at < self.ttl
+
+    def put(self, issue_id, application_type, status_code, data=None, etag=None, last_modified=None):
+        now = time.time()
+        self.conn.execute(
+            "INSERT OR REPLACE INTO dev_status "
+            "(issue_id, application_type, status_code, body, etag, last_modified, fetched_at, last_access) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (str(issue_id), application_type, status_code,
+             json.dumps(data) if data is not None else None, etag, last_modified, now, now),
+        )
+        self.conn.commit()
+        # Keep the bound during the run, not only at close(): a long or crashed run never gets there
+        self._evict()
+
+    def touch(self, issue_id, application_type):
+        """Mark a revalidated (304) entry as fresh again."""
+        now = time.time()
+        self.conn.execute(
+            "UPDATE dev_status SET fetched_at = ?, last_access = ? WHERE issue_id = ? AND application_type = ?",
+            (now, now, str(issue_id), application_type),
+        )
+        self.conn.commit()
+
+    def _evict(self):
+        (count,) = self.conn.execute("SELECT COUNT(*) FROM dev_status").fetchone()
+        if count > self.max_entries:
+            self.conn.execute(
+                "DELETE FROM dev_status WHERE rowid IN ("
+                "SELECT rowid FROM dev_status ORDER BY last_access ASC LIMIT ?)",
+                (count - self.max_entries,),
+            )
+        self.conn.commit()
+
+    def stats(self):
+        return f"{self.hits} hit(s), {self.revalidated} revalidated, {self.misses} fetched"
@@ -1,52 +1,82 @@
-import requests
 import yaml
 import os
 import sys
-import urllib3
 import argparse
 import json
-
-# --- Ignore self-signed cert warnings ---
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
-
-# --- Load Config from YAML ---
-with open("config.yaml", "r") as f:
-    config = yaml.safe_load(f)
-
-JIRA_URL = config.get("jira_url", "").strip()
-JIRA_PROJECT_KEYS = config.get("jira_project_keys", [])
-
-if not JIRA_PROJECT_KEYS or not isinstance(JIRA_PROJECT_KEYS, list):
-    print("Error: jira_project_keys must be a non-empty list in config.yaml")
-    sys.exit(1)
-
-DEFAULT_PROJECT_KEY = JIRA_PROJECT_KEYS[0]
-
-JIRA_API_TOKEN = os.getenv("JIRA_TOKEN")
-if not JIRA_API_TOKEN:
-    print("Error: JIRA_TOKEN environment variable is not set.")
-    sys.exit(1)
-
-headers = {
-    "Authorization": f"Bearer {JIRA_API_TOKEN}",
-    "Accept": "application/json",
-    "Content-Type": "application/json"
-}
-
-# --- CLI Argument Parsing ---
-parser = argparse.ArgumentParser(description="Fetch Git repositories and commit URLs linked to a Jira Fix Version")
-parser.add_argument("--fix-version", required=True, help="Name of the Jira Fix Version (e.g. 'Payments v1.4')")
-parser.add_argument("--project", default=DEFAULT_PROJECT_KEY, help=f"Jira project key (default: {DEFAULT_PROJECT_KEY})")
-parser.add_argument("--application-type", default="stash", help="Source control type (e.g., stash, gitlab, bitbucket)")
-
-args = parser.parse_args()
-FIX_VERSION = args.fix_version.strip()
-PROJECT_KEY = args.project.strip()
-APPLICATION_TYPE = args.application_type.strip()
-
-
-def get_issues_for_fix_version(project_key, fix_version):
-    jql = f'project="{project_key}" AND fixVersion="{fix_version}"'
+import csv
+from dev_status_cache import DevStatusCache
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CONFIG = os.path.join(HERE, "config.yaml")
+
+sys.path.insert(0, os.path.join(HERE, ".."))
+from instrument import span, add_profile_args, profiling  # noqa: E402
+
+# --- Config, filled in by configure() so the module imports without side effects ---
+JIRA_URL = ""
+JIRA_PROJECT_KEYS = []
+headers = {}
+
+
+def configure(config_path=DEFAULT_CONFIG):
+    """Load the Jira URL and project keys from YAML and the token from JIRA_TOKEN; exit if either is missing."""
+    global JIRA_URL, JIRA_PROJECT_KEYS
+    import urllib3
+
+    # Ignore self-signed cert warnings
+    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+    with open(config_path, "r") as f:
+        config = yaml.safe_load(f)
+
+    JIRA_URL = config.get("jira_url", "").strip()
+    JIRA_PROJECT_KEYS = config.get("jira_project_keys", [])
+
+    if not JIRA_PROJECT_KEYS or not isinstance(JIRA_PROJECT_KEYS, list):
+        print(f"Error: jira_project_keys must be a non-empty list in {config_path}")
+        sys.exit(1)
+
+    token = os.getenv("JIRA_TOKEN")
+    if not token:
+        print("Error: JIRA_TOKEN environment variable is not set.")
+        sys.exit(1)
+
+    headers.update({
+        "Authorization": f"Bearer {token}",
+        "Accept": "application/json",
+        "Content-Type": "application/json"
+    })
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Fetch Git repositories and commit URLs linked to a Jira Fix Version")
+    parser.add_argument("--config", default=DEFAULT_CONFIG, help="Jira config YAML (default: config.yaml next to this script)")
+    parser.add_argument("--fix-version", required=True, action="append",
+                        help="Name of the Jira Fix Version (e.g. 'Payments v1.4'); repeat to query several at once")
+    parser.add_argument("--project", help="Jira project key (default: first of jira_project_keys in the config)")
+    parser.add_argument("--application-type", default="stash", help="Source control type (e.g., stash, gitlab, bitbucket)")
+    parser.add_argument("--cache", default="dev_status_cache.sqlite",
+                        help="Dev-status response cache file (default: dev_status_cache.sqlite)")
+    parser.add_argument("--cache-ttl", type=float, default=24.0,
+                        help="Hours before a cached dev-status response is revalidated (default: 24)")
+    parser.add_argument("--cache-max-entries", type=int, default=50000,
+                        help="Maximum cached responses; least recently used are evicted (default: 50000)")
+    parser.add_argument("--refresh", action="store_true", help="Ignore cached dev-status responses and refetch them")
+    parser.add_argument("--output", help="Optional CSV of fix_version,issue_key,repo,commit_url rows")
+    add_profile_args(parser)
+    return parser
+
+
+def get_issues_for_fix_versions(project_key, fix_versions):
+    """
+    Fetch the issues in any of ``fix_versions`` with one search. Jira returns
+    each issue once even when it belongs to several of the versions; its
+    ``fixVersions`` field says which.
+    """
+    import requests
+
+    versions = ", ".join(f'"{v}"' for v in fix_versions)
+    jql = f'project="{project_key}" AND fixVersion in ({versions})'
     issues = []
     start_at = 0
     max_results = 50
@@ -56,12 +86,14 @@ def get_issues_for_fix_version(project_key, fix_version):
             "jql": jql,
             "startAt": start_at,
             "maxResults": max_results,
-            "fields": "summary"
+            "fields": "summary,fixVersions"
         }
-        response = requests.get(f"{JIRA_URL}/rest/api/2/search", headers=headers, params=params, verify=False)
-        if response.status_code != 200:
-            raise Exception(f"Failed to fetch issues: {response.status_code} {response.text}")
-        data = response.json()
+        with span("fetch_page") as s:
+            response = requests.get(f"{JIRA_URL}/rest/api/2/search", headers=headers, params=params, verify=False)
+            if response.status_code != 200:
+                raise Exception(f"Failed to fetch issues: {response.status_code} {response.text}")
+            data = response.json()
+            s.add(rows=len(data.get("issues", [])), bytes=len(response.content))
         issues.extend(data.get("issues", []))
         if start_at + max_results >= data.get("total", 0):
             break
@@ -84,33 +116,70 @@ def infer_repos_from_commits(detail):
     return repos
 
 
-def get_repos_and_commit_urls_from_issue(issue_id):
+def fetch_dev_status(issue_id, cache, application_type, refresh=False):
+    """
+    Return the dev-status detail payload for an issue, or None when there is
+    no development data. Served from ``cache`` while fresh; stale entries are
+    revalidated conditionally when the server supplied a validator.
+    """
+    import requests
+
+    entry, fresh = (None, False) if refresh else cache.get(issue_id, application_type)
+    if entry and fresh:
+        cache.hits += 1
+        print("   💾 Using cached dev-status response.")
+        return entry["data"]
+
     url = f"{JIRA_URL}/rest/dev-status/1.0/issue/detail"
     params = {
         "issueId": issue_id,
-        "applicationType": APPLICATION_TYPE,
+        "applicationType": application_type,
         "dataType": "all"
     }
+    request_headers = dict(headers)
+    if entry and entry["status_code"] == 200:
+        if entry["etag"]:
+            request_headers["If-None-Match"] = entry["etag"]
+        if entry["last_modified"]:
+            request_headers["If-Modified-Since"] = entry["last_modified"]
 
     print(f"   🐛 DEBUG: Calling dev-status API with params: {params}")
-    response = requests.get(url, headers=headers, params=params, verify=False)
+    with span("dev_status_request") as s:
+        response = requests.get(url, headers=request_headers, params=params, verify=False)
+        s.add(bytes=len(response.content))
 
+    if response.status_code == 304:
+        cache.revalidated += 1
+        cache.touch(issue_id, application_type)
+        return entry["data"]
+
+    cache.misses += 1
     if response.status_code == 404:
         print("   ⚠️  Dev panel returned 404 — no development data.")
-        return set(), []
+        cache.put(issue_id, application_type, 404)
+        return None
 
     if response.status_code != 200:
         print(f"   ❌ Failed to get dev-status info: {response.status_code} {response.text}")
-        return set(), []
+        return None
 
     try:
         data = response.json()
     except Exception as e:
         print(f"   ❌ Failed to parse JSON: {e}")
-        return set(), []
+        return None
 
     print("   🐛 DEBUG: Raw dev-status response:")
     print(json.dumps(data, indent=2))
+    cache.put(issue_id, application_type, 200, data,
+              response.headers.get("ETag"), response.headers.get("Last-Modified"))
+    return data
+
+
+def get_repos_and_commit_urls_from_issue(issue_id, cache, application_type, refresh=False):
+    data = fetch_dev_status(issue_id, cache, application_type, refresh)
+    if data is None:
+        return set(), []
 
     repos = set()
     commit_urls = []
@@ -141,41 +210,88 @@ def get_repos_and_commit_urls_from_issue(issue_id):
 
 
 def main():
-    print(f"🔍 Fetching issues for Fix Version: '{FIX_VERSION}' in project '{PROJECT_KEY}'...")
-    issues = get_issues_for_fix_version(PROJECT_KEY, FIX_VERSION)
-    print(f"Found {len(issues)} issues.")
-
-    all_repos = set()
-    all_commit_urls = set()
-
-    for issue in issues:
-        issue_key = issue["key"]
-        issue_id = issue["id"]
-        print(f"→ Checking linked repositories and commits for {issue_key}...")
-        repos, commit_urls = get_repos_and_commit_urls_from_issue(issue_id)
-        if repos:
-            print(f"   🔗 Repos: {sorted(repos)}")
-            all_repos.update(repos)
-        else:
-            print("   ⚠️  No repositories found or inferred.")
-
-        if commit_urls:
-            print(f"   🔗 Commit URLs:")
-            for url in commit_urls:
-                print(f"      {url}")
-            all_commit_urls.update(commit_urls)
-        else:
-            print("   ⚠️  No commit URLs found.")
-
-    print("\n📦 Unique Repositories involved in Fix Version:")
-    for repo in sorted(all_repos):
-        print(f" - {repo}")
-
-    print("\n🔗 Unique Commit URLs involved in Fix Version:")
-    for url in sorted(all_commit_urls):
-        print(f" - {url}")
-
-    print(f"\n✅ Done. {len(all_repos)} unique repositories and {len(all_commit_urls)} unique commit URLs found.")
+    args = build_parser().parse_args()
+    configure(args.config)
+    fix_versions = list(dict.fromkeys(v.strip() for v in args.fix_version))
+    project_key = (args.project or JIRA_PROJECT_KEYS[0]).strip()
+    application_type = args.application_type.strip()
+
+    with profiling(args):
+        run(args, fix_versions, project_key, application_type)
+
+
+def run(args, fix_versions, project_key, application_type):
+    versions_label = ", ".join(f"'{v}'" for v in fix_versions)
+    print(f"🔍 Fetching issues for Fix Version(s): {versions_label} in project '{project_key}'...")
+    with span("search") as s:
+        issues = get_issues_for_fix_versions(project_key, fix_versions)
+        s.add(rows=len(issues))
+    print(f"Found {len(issues)} unique issues.")
+
+    cache = DevStatusCache(args.cache, ttl=args.cache_ttl * 3600, max_entries=args.cache_max_entries)
+
+    repos_by_version = {v: set() for v in fix_versions}
+    commit_urls_by_version = {v: set() for v in fix_versions}
+    output_rows = []
+
+    try:
+        for issue in issues:
+            issue_key = issue["key"]
+            issue_id = issue["id"]
+            issue_versions = [
+                fv["name"] for fv in issue.get("fields", {}).get("fixVersions", [])
+                if fv.get("name") in repos_by_version
+            ] or fix_versions
+            print(f"→ Checking linked repositories and commits for {issue_key}...")
+            with span("dev_status", rows=1):
+                repos, commit_urls = get_repos_and_commit_urls_from_issue(issue_id, cache, application_type, args.refresh)
+            if repos:
+                print(f"   🔗 Repos: {sorted(repos)}")
+            else:
+                print("   ⚠️  No repositories found or inferred.")
+
+            if commit_urls:
+                print(f"   🔗 Commit URLs:")
+                for url in commit_urls:
+                    print(f"      {url}")
+            else:
+                print("   ⚠️  No commit URLs found.")
+
+            for version in issue_versions:
+                repos_by_version[version].update(repos)
+                commit_urls_by_version[version].update(commit_urls)
+                for url in commit_urls:
+                    inferred = infer_repos_from_commits({"commits": [{"url": url}]})
+                    repo = next(iter(inferred), "") or (next(iter(repos)) if len(repos) == 1 else "")
+                    output_rows.append([version, issue_key, repo, url])
+                if not commit_urls:
+                    for repo in sorted(repos):
+                        output_rows.append([version, issue_key, repo, ""])
+    finally:
+        cache.close()
+
+    for version in fix_versions:
+        all_repos = repos_by_version[version]
+        all_commit_urls = commit_urls_by_version[version]
+
+        print(f"\n📦 Unique Repositories involved in Fix Version '{version}':")
+        for repo in sorted(all_repos):
+            print(f" - {repo}")
+
+        print(f"\n🔗 Unique Commit URLs involved in Fix Version '{version}':")
+        for url in sorted(all_commit_urls):
+            print(f" - {url}")
+
+        print(f"\n✅ {version}: {len(all_repos)} unique repositories and {len(all_commit_urls)} unique commit URLs found.")
+
+    if args.output:
+        with span("write", rows=len(output_rows)), open(args.output, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["fix_version", "issue_key", "repo", "commit_url"])
+            writer.writerows(output_rows)
+        print(f"\n📝 Wrote {len(output_rows)} rows to {args.output}")
+
+    print(f"\n💾 Dev-status cache: {cache.stats()}")
 
 
 if __name__ == "__main__":
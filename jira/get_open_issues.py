@@ -1,44 +1,197 @@
-import requests
 import csv
 import yaml
 import os
 import sys
+import json
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
-import urllib3
+from issue_store import IssueStore, incremental_lower_bound
 
-# --- Ignore self-signed cert warnings ---
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CONFIG = os.path.join(HERE, "config.yaml")
 
-# --- Load Config from YAML ---
-with open("config.yaml", "r") as f:
-    config = yaml.safe_load(f)
+sys.path.insert(0, os.path.join(HERE, ".."))
+from instrument import span, add_profile_args, profiling  # noqa: E402
 
-JIRA_URL = config.get("jira_url", "").strip()
-JIRA_PROJECT_KEYS = config.get("jira_project_keys")
+# --- Config, filled in by configure() so the module imports without side effects ---
+JIRA_URL = ""
+JIRA_PROJECT_KEYS = []
+headers = {}
 
-if not JIRA_PROJECT_KEYS or not isinstance(JIRA_PROJECT_KEYS, list):
-    print("Error: jira_project_keys must be a non-empty list in config.yaml")
-    sys.exit(1)
 
-JIRA_API_TOKEN = os.getenv("JIRA_TOKEN")
-if not JIRA_API_TOKEN:
-    print("Error: JIRA_TOKEN environment variable is not set.")
-    sys.exit(1)
+def configure(config_path=DEFAULT_CONFIG):
+    """Load the Jira URL and project keys from YAML and the token from JIRA_TOKEN; exit if either is missing."""
+    global JIRA_URL, JIRA_PROJECT_KEYS
+    with open(config_path, "r") as f:
+        config = yaml.safe_load(f)
 
-headers = {
-    "Authorization": f"Bearer {JIRA_API_TOKEN}",
-    "Accept": "application/json",
-    "Content-Type": "application/json"
-}
+    JIRA_URL = config.get("jira_url", "").strip()
+    JIRA_PROJECT_KEYS = config.get("jira_project_keys")
 
-for project_key in JIRA_PROJECT_KEYS:
-    project_key = project_key.strip()
+    if not JIRA_PROJECT_KEYS or not isinstance(JIRA_PROJECT_KEYS, list):
+        print(f"Error: jira_project_keys must be a non-empty list in {config_path}")
+        sys.exit(1)
+
+    token = os.getenv("JIRA_TOKEN")
+    if not token:
+        print("Error: JIRA_TOKEN environment variable is not set.")
+        sys.exit(1)
+
+    headers.update({
+        "Authorization": f"Bearer {token}",
+        "Accept": "application/json",
+        "Content-Type": "application/json"
+    })
+
+# Jira clamps maxResults to its own limit (1000 by default on Server/DC) and
+# echoes the effective page size back, so we ask for the ceiling and use
+# whatever the first page reports.
+MAX_RESULTS = 1000
+
+CSV_COLUMNS = [
+    ("Key", "key"),
+    ("Summary", "summary"),
+    ("Description", "description"),
+    ("Status", "status"),
+    ("Assignee", "assignee"),
+    ("Reporter", "reporter"),
+    ("Created", "created"),
+    ("Updated", "updated"),
+    ("Priority", "priority"),
+    ("Issue Type", "issuetype"),
+    ("Labels", "labels"),
+]
+
+
+def build_session(pool_size):
+    """Keep-alive session shared by all page workers."""
+    import requests
+    import urllib3
+    from requests.adapters import HTTPAdapter
+
+    # Ignore self-signed cert warnings
+    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+    session = requests.Session()
+    session.headers.update(headers)
+    session.verify = False
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def fetch_page(session, jql, fields, start_at, max_results):
+    params = {
+        "jql": jql,
+        "startAt": start_at,
+        "maxResults": max_results,
+        "fields": ",".join(fields),
+    }
+    with span("fetch_page") as s:
+        response = session.get(f"{JIRA_URL}/rest/api/2/search", params=params)
+        if response.status_code != 200:
+            raise Exception(f"Failed to fetch issues (startAt={start_at}): {response.status_code} {response.text}")
+        data = response.json()
+        s.add(rows=len(data.get("issues", [])), bytes=len(response.content))
+    return data
+
+
+def search_pages(session, pool, jql, fields, skip_offsets=()):
+    """
+    Yield (start_at, issues, total) for every page of a JQL search.
+
+    The first page is fetched synchronously to learn ``total`` and the
+    effective page size; the remaining pages are submitted to ``pool`` at once
+    and yielded in completion order.
+    """
+    first = fetch_page(session, jql, fields, 0, MAX_RESULTS)
+    total = first.get("total", 0)
+    page_size = first.get("maxResults") or MAX_RESULTS
+    if 0 not in skip_offsets:
+        yield 0, first.get("issues", []), total
+
+    futures = {
+        pool.submit(fetch_page, session, jql, fields, start_at, page_size): start_at
+        for start_at in range(page_size, total, page_size)
+        if start_at not in skip_offsets
+    }
+    for future in as_completed(futures):
+        yield futures[future], future.result().get("issues", []), total
+
+
+def issue_values(issue):
+    fields = issue["fields"]
+    description = fields.get("description", "")
+    if isinstance(description, dict):
+        description = description.get("content", "")  # Some Jira servers return rich text structure
+    elif description is None:
+        description = ""
+    return {
+        "key": issue["key"],
+        "summary": fields.get("summary", ""),
+        "description": description,
+        "status": fields.get("status", {}).get("name", ""),
+        "assignee": fields.get("assignee", {}).get("displayName", "") if fields.get("assignee") else "",
+        "reporter": fields.get("reporter", {}).get("displayName", "") if fields.get("reporter") else "",
+        "created": fields.get("created", ""),
+        "updated": fields.get("updated", ""),
+        "priority": fields.get("priority", {}).get("name", "") if fields.get("priority") else "",
+        "issuetype": fields.get("issuetype", {}).get("name", ""),
+        "labels": ", ".join(fields.get("labels", [])),
+    }
+
+
+def issue_to_row(issue, columns):
+    values = issue_values(issue)
+    return [values[field] for _, field in columns]
+
+
+# --- Checkpointing ---
+
+def load_checkpoint(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def save_checkpoint(path, state):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
 
-    # Calculate date range for the last 12 months
-    end_date = datetime.now()
-    start_date = end_date - timedelta(days=365)
-    start_date_str = start_date.strftime('%Y-%m-%d')
-    end_date_str = end_date.strftime('%Y-%m-%d')
+
+def export_project(project_key, session, pool, output_dir, columns, resume=True):
+    csv_file = os.path.join(output_dir, f"jira_open_issues_{project_key}.csv")
+    checkpoint_file = f"{csv_file}.checkpoint"
+    fields = [field for _, field in columns if field != "key"]
+
+    state = load_checkpoint(checkpoint_file) if resume and os.path.exists(csv_file) else None
+    if state and state.get("fields") != fields:
+        print(f"⚠️  Ignoring checkpoint for {project_key}: column selection changed")
+        state = None
+
+    if state:
+        # Resume with the original date window so page offsets still line up,
+        # and drop anything written after the last recorded page.
+        start_date_str, end_date_str = state["start_date"], state["end_date"]
+        with open(csv_file, "r+b") as f:
+            f.truncate(state["csv_offset"])
+        print(f"↻ Resuming {project_key}: {len(state['done'])} page(s) already exported")
+    else:
+        start_date, end_date = export_window()
+        start_date_str = start_date.strftime('%Y-%m-%d')
+        end_date_str = end_date.strftime('%Y-%m-%d')
+        state = {
+            "start_date": start_date_str,
+            "end_date": end_date_str,
+            "fields": fields,
+            "done": [],
+            "rows": 0,
+            "csv_offset": 0,
+        }
 
     # JQL query
     jql = (
@@ -49,51 +202,165 @@ for project_key in JIRA_PROJECT_KEYS:
         f"ORDER BY created DESC"
     )
 
-    params = {
-        "jql": jql,
-        "startAt": 0,
-        "maxResults": 50,
-        "fields": "key,summary,description,status,assignee,reporter,created,updated,priority,issuetype,labels"
-    }
-
-    all_issues = []
-    while True:
-        response = requests.get(f"{JIRA_URL}/rest/api/2/search", headers=headers, params=params, verify=False)
-        if response.status_code != 200:
-            raise Exception(f"Failed to fetch issues for {project_key}: {response.status_code} {response.text}")
-        data = response.json()
-        issues = data.get("issues", [])
-        all_issues.extend(issues)
-        if params["startAt"] + params["maxResults"] >= data["total"]:
-            break
-        params["startAt"] += params["maxResults"]
-
-    csv_file = f"../jira_open_issues_{project_key}.csv"
-    with open(csv_file, mode="w", newline="", encoding="utf-8") as f:
+    mode = "a" if state["done"] else "w"
+    with open(csv_file, mode=mode, newline="", encoding="utf-8") as f:
         writer = csv.writer(f)
-        writer.writerow([
-            "Key", "Summary", "Description", "Status", "Assignee", "Reporter",
-            "Created", "Updated", "Priority", "Issue Type", "Labels"
-        ])
-        for issue in all_issues:
-            fields = issue["fields"]
-            description = fields.get("description", "")
-            if isinstance(description, dict):
-                description = description.get("content", "")  # Some Jira servers return rich text structure
-            elif description is None:
-                description = ""
-            writer.writerow([
-                issue["key"],
-                fields.get("summary", ""),
-                description,
-                fields.get("status", {}).get("name", ""),
-                fields.get("assignee", {}).get("displayName", "") if fields.get("assignee") else "",
-                fields.get("reporter", {}).get("displayName", "") if fields.get("reporter") else "",
-                fields.get("created", ""),
-                fields.get("updated", ""),
-                fields.get("priority", {}).get("name", "") if fields.get("priority") else "",
-                fields.get("issuetype", {}).get("name", ""),
-                ", ".join(fields.get("labels", []))
-            ])
-
-    print(f"✅ Exported {len(all_issues)} issues to {csv_file}")
+        if mode == "w":
+            writer.writerow([header for header, _ in columns])
+        for start_at, issues, _ in search_pages(session, pool, jql, fields, set(state["done"])):
+            with span("write", rows=len(issues)):
+                writer.writerows(issue_to_row(issue, columns) for issue in issues)
+                f.flush()
+            state["done"].append(start_at)
+            state["rows"] += len(issues)
+            state["csv_offset"] = f.tell()
+            with span("checkpoint"):
+                save_checkpoint(checkpoint_file, state)
+
+    if os.path.exists(checkpoint_file):
+        os.remove(checkpoint_file)
+    print(f"✅ Exported {state['rows']} issues to {csv_file}")
+    return state["rows"]
+
+
+# --- Incremental sync ---
+
+def export_window():
+    # Calculate date range for the last 12 months
+    end_date = datetime.now()
+    return end_date - timedelta(days=365), end_date
+
+
+def sync_project(project_key, session, pool, store_path, output_dir, columns,
+                 force_reconcile=False, reconcile_days=7):
+    """
+    Bring the local store up to date for one project and regenerate its CSV
+    from the store.
+
+    The first run loads the open set for the 12-month window. Later runs only
+    ask Jira for issues with ``updated`` since the last sync, which also
+    captures status transitions (issues moving to Done are updated in place
+    and dropped from the export). Deleted or moved issues never show up in an
+    ``updated`` query, so every ``reconcile_days`` the open set's keys are
+    listed and anything else is removed from the store.
+    """
+    store = IssueStore(store_path)
+    try:
+        start_date, end_date = export_window()
+        start_date_str = start_date.strftime('%Y-%m-%d')
+        fields = [field for _, field in columns if field != "key"]
+        open_jql = (
+            f"project = {project_key} "
+            f"AND statusCategory != Done "
+            f"AND created >= \"{start_date_str}\" "
+        )
+        last_updated, last_reconcile = store.get_state(project_key)
+        now = datetime.now()
+
+        if last_updated is None:
+            jql = open_jql + "ORDER BY created DESC"
+            last_reconcile = now  # a full load is a reconcile
+        else:
+            jql = (
+                f"project = {project_key} "
+                f"AND updated >= \"{incremental_lower_bound(last_updated)}\" "
+                f"AND created >= \"{start_date_str}\" "
+                f"ORDER BY updated ASC"
+            )
+
+        fetched = 0
+        newest = last_updated
+        for _, issues, _ in search_pages(session, pool, jql, fields):
+            records = []
+            for issue in issues:
+                rec = issue_values(issue)
+                rec["issue_id"] = issue.get("id")
+                rec["status_category"] = issue["fields"].get("status", {}).get("statusCategory", {}).get("key")
+                records.append(rec)
+            with span("store_upsert", rows=len(records)):
+                # Fields left out of the request (--no-description) keep their stored values
+                batch_newest = store.upsert(project_key, records, fields)
+            if batch_newest and (newest is None or batch_newest > newest):
+                newest = batch_newest
+            fetched += len(issues)
+
+        removed = 0
+        if force_reconcile or last_reconcile is None or now - last_reconcile >= timedelta(days=reconcile_days):
+            live_keys = set()
+            for _, issues, _ in search_pages(session, pool, open_jql, ["status"]):
+                live_keys.update(issue["key"] for issue in issues)
+            removed = store.retain_only(project_key, live_keys)
+            last_reconcile = now
+        removed += store.prune_created_before(project_key, start_date)
+
+        store.set_state(project_key, last_updated=newest, last_reconcile=last_reconcile)
+
+        csv_file = os.path.join(output_dir, f"jira_open_issues_{project_key}.csv")
+        rows = 0
+        with span("write") as s, open(csv_file, mode="w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow([header for header, _ in columns])
+            for row in store.open_issues(project_key, start_date, end_date, [field for _, field in columns]):
+                writer.writerow(["" if v is None else v for v in row])
+                rows += 1
+            s.add(rows=rows)
+    finally:
+        store.close()
+
+    print(f"✅ {project_key}: fetched {fetched} changed issue(s), removed {removed}; exported {rows} issues to {csv_file}")
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export open Jira issues from the last 12 months to CSV, one file per project")
+    parser.add_argument("--config", default=DEFAULT_CONFIG, help="Jira config YAML (default: config.yaml next to this script)")
+    parser.add_argument("--output-dir", default="..", help="Directory for the CSV files (default: ..)")
+    parser.add_argument("--workers", type=int, default=8, help="Concurrent page requests across all projects (default: 8)")
+    parser.add_argument("--project-workers", type=int, default=4, help="Projects exported in parallel (default: 4)")
+    parser.add_argument("--no-description", action="store_true",
+                        help="Do not request or export the (large) description field")
+    parser.add_argument("--restart", action="store_true", help="Ignore existing checkpoints and start over")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Sync only issues updated since the last run into a local store and export the CSV from it")
+    parser.add_argument("--store", default="../jira_issues.sqlite",
+                        help="SQLite issue store used by --incremental (default: ../jira_issues.sqlite)")
+    parser.add_argument("--reconcile", action="store_true",
+                        help="With --incremental, re-list open issue keys now to drop deleted/moved issues")
+    parser.add_argument("--reconcile-days", type=int, default=7,
+                        help="With --incremental, reconcile automatically when the last one is older than this (default: 7)")
+    add_profile_args(parser)
+    args = parser.parse_args()
+    configure(args.config)
+
+    columns = [c for c in CSV_COLUMNS if not (args.no_description and c[1] == "description")]
+    project_keys = [key.strip() for key in JIRA_PROJECT_KEYS]
+    session = build_session(args.workers + args.project_workers)
+
+    with profiling(args), ThreadPoolExecutor(max_workers=args.workers) as page_pool, \
+            ThreadPoolExecutor(max_workers=args.project_workers) as project_pool:
+        if args.incremental:
+            futures = {
+                project_pool.submit(sync_project, key, session, page_pool, args.store, args.output_dir, columns,
+                                    args.reconcile, args.reconcile_days): key
+                for key in project_keys
+            }
+        else:
+            futures = {
+                project_pool.submit(export_project, key, session, page_pool, args.output_dir, columns, not args.restart): key
+                for key in project_keys
+            }
+        failed = []
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except Exception as e:
+                failed.append(futures[future])
+                hint = "re-run to continue" if args.incremental else "re-run to resume from the checkpoint"
+                print(f"❌ {futures[future]}: {e} ({hint})")
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+import sqlite3
+from datetime import datetime, timedelta
+
+# Columns kept per issue; names match the field keys used by get_open_issues.CSV_COLUMNS.
+ISSUE_FIELDS = [
+    "key", "summary", "description", "status", "assignee", "reporter",
+    "created", "updated", "priority", "issuetype", "labels",
+]
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS issues (
+    key TEXT PRIMARY KEY,
+    project TEXT NOT NULL,
+    issue_id TEXT,
+    status_category TEXT,
+    {", ".join(f"{col} TEXT" for col in ISSUE_FIELDS if col != "key")},
+    synced_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_issues_project_created ON issues (project, created);
+
+CREATE TABLE IF NOT EXISTS sync_state (
+    project TEXT PRIMARY KEY,
+    last_updated TEXT,
+    last_reconcile TEXT
+);
+"""
+
+JIRA_TS_FORMAT = "%Y-%m-%dT%H:%M:%S.%f%z"
+
+
+def parse_jira_ts(value):
+    return datetime.strptime(value, JIRA_TS_FORMAT) if value else None
+
+
+class IssueStore:
+    """
+    Local SQLite mirror of Jira issues used by ``get_open_issues.py --incremental``.
+
+    Issues are upserted by key. Per project the store remembers the newest
+    ``updated`` timestamp it has seen (the next sync's JQL lower bound) and
+    when the open set was last reconciled against Jira to drop deleted or
+    moved issues.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        # One store per worker thread; WAL lets their writes interleave with export reads.
+        self.conn = sqlite3.connect(path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    # --- sync state ---
+
+    def get_state(self, project):
+        row = self.conn.execute(
+            "SELECT last_updated, last_reconcile FROM sync_state WHERE project = ?", (project,)
+        ).fetchone()
+        if row is None:
+            return None, None
+        return (
+            datetime.fromisoformat(row[0]) if row[0] else None,
+            datetime.fromisoformat(row[1]) if row[1] else None,
+        )
+
+    def set_state(self, project, last_updated=None, last_reconcile=None):
+        self.conn.execute("INSERT OR IGNORE INTO sync_state (project) VALUES (?)", (project,))
+        if last_updated is not None:
+            self.conn.execute(
+                "UPDATE sync_state SET last_updated = ? WHERE project = ?",
+                (last_updated.isoformat(), project),
+            )
+        if last_reconcile is not None:
+            self.conn.execute(
+                "UPDATE sync_state SET last_reconcile = ? WHERE project = ?",
+                (last_reconcile.isoformat(), project),
+            )
+        self.conn.commit()
+
+    # --- writes ---
+
+    def upsert(self, project, records, fields=None):
+        """
+        Insert or replace issues. ``records`` are dicts with the ISSUE_FIELDS
+        keys plus ``issue_id`` and ``status_category``. ``fields`` names the
+        ISSUE_FIELDS that were fetched (default: all); the others keep their
+        stored value when an issue is updated. Returns the newest ``updated``
+        timestamp in the batch (or None).
+        """
+        now = datetime.now().isoformat(timespec="seconds")
+        cols = ["key", "project", "issue_id", "status_category"] + [c for c in ISSUE_FIELDS if c != "key"] + ["synced_at"]
+        rows = []
+        newest = None
+        for rec in records:
+            rows.append([rec["key"], project, rec.get("issue_id"), rec.get("status_category")]
+                        + [rec.get(c, "") for c in ISSUE_FIELDS if c != "key"] + [now])
+            ts = parse_jira_ts(rec.get("updated"))
+            if ts and (newest is None or ts > newest):
+                newest = ts
+        skipped = set() if fields is None else set(ISSUE_FIELDS) - set(fields) - {"key"}
+        updates = ", ".join(f"{c} = excluded.{c}" for c in cols if c != "key" and c not in skipped)
+        self.conn.executemany(
+            f"INSERT INTO issues ({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))}) "
+            f"ON CONFLICT(key) DO UPDATE SET {updates}",
+            rows,
+        )
+        self.conn.commit()
+        return newest
+
+    def retain_only(self, project, keys):
+        """Delete issues of ``project`` whose key is not in ``keys``; returns the number removed."""
+        self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS live_keys (key TEXT PRIMARY KEY)")
+        self.conn.execute("DELETE FROM live_keys")
+        self.conn.executemany("INSERT OR IGNORE INTO live_keys VALUES (?)", ((k,) for k in keys))
+        cur = self.conn.execute(
+            "DELETE FROM issues WHERE project = ? AND key NOT IN (SELECT key FROM live_keys)", (project,)
+        )
+        self.conn.commit()
+        return cur.rowcount
+
+    def prune_created_before(self, project, cutoff):
+        """Drop issues that have aged out of the export window."""
+        cur = self.conn.execute(
+            "DELETE FROM issues WHERE project = ? AND substr(created, 1, 10) < ?",
+            (project, cutoff.strftime("%Y-%m-%d")),
+        )
+        self.conn.commit()
+        return cur.rowcount
+
+    # --- reads ---
+
+    def open_issues(self, project, start_date, end_date, fields=ISSUE_FIELDS):
+        """Yield open issues created in [start_date, end_date], newest first, as value lists."""
+        return self.conn.execute(
+            f"SELECT {', '.join(fields)} FROM issues "
+            "WHERE project = ? AND COALESCE(status_category, '') != 'done' "
+            "AND substr(created, 1, 10) BETWEEN ? AND ? "
+            "ORDER BY created DESC",
+            (project, start_date.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d")),
+        )
+
+
+def incremental_lower_bound(last_updated, overlap=timedelta(days=1)):
+    """
+    JQL date for ``updated >= ...``. JQL dates are evaluated in the Jira
+    user's timezone, so we step back a full day from the newest timestamp
+    seen and rely on the upsert to absorb the overlap.
+    """
+    return (last_updated - overlap).strftime("%Y-%m-%d")
@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+"""
+Per-LCP rollup of the counts that H5 and the dashboards ask for.
+
+    public.lcp_rollup(lean_control_service_id PK, instance_count, app_count,
+                      technical_service_count, environment_count,
+                      install_type_count, refreshed_at)
+    public.lcp_rollup_mix(lean_control_service_id, dimension, value, instance_count)
+
+``dimension`` is 'environment' or 'install_type', so the environment and
+install-type mix of an LCP is a handful of rows. Counts follow the lcp CTE of
+governance_metrics.py: instances and apps reached through the LCP's
+servicenow_app_id, Technical Services linked directly, LCPs without any link
+kept with zeros.
+
+The rows each LCP was aggregated from are kept in
+``public.lcp_rollup_rows``. A refresh re-runs the join without aggregating,
+diffs it against those rows, and re-aggregates only the LCPs whose rows were
+added, changed or removed; an LCP that is gone from lean_control_application
+drops out. Readers (``report``, governance_metrics.py collect --rollup,
+lct_viewer.py) then read a table with one row per LCP.
+"""
+import argparse
+import datetime
+
+import yaml
+
+from instrument import span, add_profile_args, profiling
+
+ROLLUP = 'lcp_rollup'
+MIX = 'lcp_rollup_mix'
+ROWS = 'lcp_rollup_rows'
+DIMENSIONS = ['environment', 'install_type']
+ROW_COLUMNS = 'lean_control_service_id, instance_id, app_id, technical_service_id, environment, install_type'
+# Above this share of changed LCPs a refresh rebuilds everything
+FULL_REBUILD_SHARE = 0.25
+
+SOURCE_ROWS = """
+    SELECT DISTINCT
+        la.lean_control_service_id,
+        si.correlation_id          AS instance_id,
+        ba.correlation_id          AS app_id,
+        bs.service_correlation_id  AS technical_service_id,
+        si.environment,
+        si.install_type
+    FROM {src}lean_control_application AS la
+    LEFT JOIN {src}vwsfitserviceinstance AS si
+      ON si.correlation_id = la.servicenow_app_id
+    LEFT JOIN {src}vwsfbusinessapplication AS ba
+      ON ba.business_application_sys_id = si.business_application_sysid
+    LEFT JOIN {src}vwsfitbusinessservice AS bs
+      ON bs.service_correlation_id = la.servicenow_app_id
+    WHERE la.lean_control_service_id IS NOT NULL
+"""
+
+ROLLUP_INSERT = """
+    INSERT INTO {rollup} (lean_control_service_id, instance_count, app_count, technical_service_count,
+                          environment_count, install_type_count, refreshed_at)
+    SELECT lean_control_service_id,
+           COUNT(DISTINCT instance_id), COUNT(DISTINCT app_id), COUNT(DISTINCT technical_service_id),
+           COUNT(DISTINCT environment), COUNT(DISTINCT install_type), '{now}'
+    FROM {rows}
+    WHERE {scope}
+    GROUP BY lean_control_service_id
+"""
+
+MIX_INSERT = """
+    INSERT INTO {mix} (lean_control_service_id, dimension, value, instance_count)
+    SELECT lean_control_service_id, '{dimension}', COALESCE({dimension}, '(none)'), COUNT(DISTINCT instance_id)
+    FROM {rows}
+    WHERE instance_id IS NOT NULL AND {scope}
+    GROUP BY lean_control_service_id, COALESCE({dimension}, '(none)')
+"""
+
+
+# ——— Helpers ———
+
+def load_config(path):
+    with open(path, 'r') as f:
+        return yaml.safe_load(f)
+
+
+def build_engine(cfg):
+    from sqlalchemy import create_engine
+    db = cfg['database']
+    url = (
+        f"postgresql+psycopg2://{db['user']}:{db['password']}"
+        f"@{db['host']}:{db['port']}/{db['name']}"
+    )
+    return create_engine(url, echo=False)
+
+
+def open_engine(path):
+    """Engine for a YAML config (its database section) or a synthetic_cmdb.py SQLite file."""
+    if path.endswith(('.yaml', '.yml')):
+        return build_engine(load_config(path))
+    from synthetic_cmdb import sqlite_engine
+    return sqlite_engine(path)
+
+
+def _names(conn):
+    """Table names for this connection's database; SQLite writes go through main (see app_closure._names)."""
+    prefix = 'public.' if conn.dialect.name == 'postgresql' else ''
+    return {'rollup': prefix + ROLLUP, 'mix': prefix + MIX, 'rows': prefix + ROWS, 'src': prefix}
+
+
+def ensure_tables(conn):
+    n = _names(conn)
+    conn.exec_driver_sql(
+        f"CREATE TABLE IF NOT EXISTS {n['rollup']} ("
+        f"lean_control_service_id VARCHAR PRIMARY KEY, instance_count INTEGER NOT NULL, "
+        f"app_count INTEGER NOT NULL, technical_service_count INTEGER NOT NULL, "
+        f"environment_count INTEGER NOT NULL, install_type_count INTEGER NOT NULL, refreshed_at VARCHAR NOT NULL)"
+    )
+    conn.exec_driver_sql(
+        f"CREATE TABLE IF NOT EXISTS {n['mix']} ("
+        f"lean_control_service_id VARCHAR NOT NULL, dimension VARCHAR NOT NULL, value VARCHAR NOT NULL, "
+        f"instance_count INTEGER NOT NULL, PRIMARY KEY (lean_control_service_id, dimension, value))"
+    )
+    conn.exec_driver_sql(
+        f"CREATE TABLE IF NOT EXISTS {n['rows']} ("
+        f"lean_control_service_id VARCHAR NOT NULL, instance_id VARCHAR, app_id VARCHAR, "
+        f"technical_service_id VARCHAR, environment VARCHAR, install_type VARCHAR)"
+    )
+    conn.exec_driver_sql(f"CREATE INDEX IF NOT EXISTS ix_{ROWS}_lcp ON {n['rows']} (lean_control_service_id)")
+
+
+def _scalar(conn, sql):
+    return conn.exec_driver_sql(sql).scalar()
+
+
+def _aggregate(conn, n, scope):
+    now = datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds')
+    conn.exec_driver_sql(ROLLUP_INSERT.format(now=now, scope=scope, **n))
+    for dimension in DIMENSIONS:
+        conn.exec_driver_sql(MIX_INSERT.format(dimension=dimension, scope=scope, **n))
+
+
+# ——— Build / refresh ———
+
+def build(engine):
+    """Rebuild the rollup from scratch. Returns {'lcps', 'rows'}."""
+    with engine.begin() as conn:
+        ensure_tables(conn)
+        n = _names(conn)
+        with span('rollup_rows') as s:
+            conn.exec_driver_sql(f"DELETE FROM {n['rows']}")
+            conn.exec_driver_sql(f"INSERT INTO {n['rows']} ({ROW_COLUMNS}) {SOURCE_ROWS.format(**n)}")
+            rows = _scalar(conn, f"SELECT COUNT(*) FROM {n['rows']}")
+            s.add(rows=rows)
+        with span('rollup_build') as s:
+            conn.exec_driver_sql(f"DELETE FROM {n['rollup']}")
+            conn.exec_driver_sql(f"DELETE FROM {n['mix']}")
+            _aggregate(conn, n, '1 = 1')
+            lcps = _scalar(conn, f"SELECT COUNT(*) FROM {n['rollup']}")
+            s.add(rows=lcps)
+        return {'lcps': lcps, 'rows': rows}
+
+
+def refresh(engine, full_share=FULL_REBUILD_SHARE):
+    """
+    Bring the rollup up to date, re-aggregating only the LCPs whose rows
+    changed since the last build or refresh. Builds from scratch when there is
+    no rollup yet or more than ``full_share`` of the LCPs changed. Returns
+    build()'s dict plus 'changed' and 'refreshed' (None after a full rebuild).
+    """
+    with engine.begin() as conn:
+        ensure_tables(conn)
+        n = _names(conn)
+        total = _scalar(conn, f"SELECT COUNT(*) FROM {n['rollup']}")
+        if total:
+            with span('rollup_diff') as s:
+                conn.exec_driver_sql(f"CREATE TEMPORARY TABLE lcp_rollup_current AS {SOURCE_ROWS.format(**n)}")
+                conn.exec_driver_sql(
+                    f"CREATE TEMPORARY TABLE lcp_rollup_changed AS "
+                    f"SELECT lean_control_service_id FROM ("
+                    f"SELECT {ROW_COLUMNS} FROM lcp_rollup_current "
+                    f"EXCEPT SELECT {ROW_COLUMNS} FROM {n['rows']}) AS added "
+                    f"UNION "
+                    f"SELECT lean_control_service_id FROM ("
+                    f"SELECT {ROW_COLUMNS} FROM {n['rows']} "
+                    f"EXCEPT SELECT {ROW_COLUMNS} FROM lcp_rollup_current) AS removed"
+                )
+                changed = _scalar(conn, "SELECT COUNT(*) FROM lcp_rollup_changed")
+                s.add(changed=changed)
+
+            if changed <= total * full_share:
+                with span('rollup_refresh') as s:
+                    scope = "lean_control_service_id IN (SELECT lean_control_service_id FROM lcp_rollup_changed)"
+                    for table in ('rows', 'rollup', 'mix'):
+                        conn.exec_driver_sql(f"DELETE FROM {n[table]} WHERE {scope}")
+                    conn.exec_driver_sql(f"INSERT INTO {n['rows']} ({ROW_COLUMNS}) "
+                                         f"SELECT {ROW_COLUMNS} FROM lcp_rollup_current WHERE {scope}")
+                    _aggregate(conn, n, scope)
+                    s.add(rows=changed)
+                    for temp in ('lcp_rollup_changed', 'lcp_rollup_current'):
+                        conn.exec_driver_sql(f"DROP TABLE {temp}")
+                return {
+                    'lcps': _scalar(conn, f"SELECT COUNT(*) FROM {n['rollup']}"),
+                    'rows': _scalar(conn, f"SELECT COUNT(*) FROM {n['rows']}"),
+                    'changed': changed,
+                    'refreshed': changed,
+                }
+            for temp in ('lcp_rollup_changed', 'lcp_rollup_current'):
+                conn.exec_driver_sql(f"DROP TABLE {temp}")
+        else:
+            changed = None
+    result = build(engine)
+    result.update(changed=changed, refreshed=None)
+    return result
+
+
+def refresh_lcps(engine, lcp_ids):
+    """
+    Re-aggregate just ``lcp_ids`` without diffing the whole source (for a
+    caller that already knows what changed, e.g. change_feed.py). Builds from
+    scratch when there is no rollup yet. Returns {'lcps', 'rows', 'refreshed'}.
+    """
+    lcp_ids = sorted({str(i) for i in lcp_ids})
+    with engine.begin() as conn:
+        ensure_tables(conn)
+        empty = not _scalar(conn, f"SELECT COUNT(*) FROM {_names(conn)['rollup']}")
+    if empty:
+        result = build(engine)
+        result['refreshed'] = None
+        return result
+    with engine.begin() as conn:
+        n = _names(conn)
+        with span('rollup_refresh', rows=len(lcp_ids)):
+            for start in range(0, len(lcp_ids), 500):
+                chunk = ', '.join("'" + i.replace("'", "''") + "'" for i in lcp_ids[start:start + 500])
+                scope = f"lean_control_service_id IN ({chunk})"
+                for table in ('rows', 'rollup', 'mix'):
+                    conn.exec_driver_sql(f"DELETE FROM {n[table]} WHERE {scope}")
+                conn.exec_driver_sql(f"INSERT INTO {n['rows']} ({ROW_COLUMNS}) "
+                                     f"SELECT {ROW_COLUMNS} FROM ({SOURCE_ROWS.format(**n)}) AS src WHERE {scope}")
+                _aggregate(conn, n, scope)
+        return {
+            'lcps': _scalar(conn, f"SELECT COUNT(*) FROM {n['rollup']}"),
+            'rows': _scalar(conn, f"SELECT COUNT(*) FROM {n['rows']}"),
+            'refreshed': len(lcp_ids),
+        }
+
+
+# ——— Reading ———
+
+def read_rollup(engine, lcp_ids=None):
+    """
+    lean_control_service_id -> rollup row (dict) with a 'mix' entry
+    {dimension: {value: instances}}, for ``lcp_ids`` or all LCPs.
+    """
+    with engine.connect() as conn:
+        n = _names(conn)
+        where = ''
+        if lcp_ids:
+            where = "WHERE lean_control_service_id IN (" + ', '.join(
+                "'" + str(i).replace("'", "''") + "'" for i in lcp_ids) + ")"
+        result = conn.exec_driver_sql(f"SELECT * FROM {n['rollup']} {where}")
+        keys = list(result.keys())
+        rollup = {row[0]: dict(zip(keys, row), mix={d: {} for d in DIMENSIONS}) for row in result}
+        for lcp, dimension, value, instances in conn.exec_driver_sql(
+                f"SELECT lean_control_service_id, dimension, value, instance_count FROM {n['mix']} {where}"):
+            if lcp in rollup:
+                rollup[lcp]['mix'][dimension][value] = instances
+    return rollup
+
+
+def mix_label(mix, limit=3):
+    """'prod 12 · dev 4 · +2 more' for one {value: instances} mix."""
+    ranked = sorted(mix.items(), key=lambda kv: (-kv[1], kv[0]))
+    label = ' · '.join(f"{value} {count:,}" for value, count in ranked[:limit])
+    if len(ranked) > limit:
+        label += f" · +{len(ranked) - limit} more"
+    return label
+
+
+def render_markdown(rollup, top=20):
+    lcps = list(rollup.values())
+    totals = {d: {} for d in DIMENSIONS}
+    for entry in lcps:
+        for dimension, mix in entry['mix'].items():
+            for value, count in mix.items():
+                totals[dimension][value] = totals[dimension].get(value, 0) + count
+    empty = sum(1 for e in lcps if not e['app_count'] and not e['instance_count'])
+
+    lines = [
+        '# LCP rollup', '',
+        f"{len(lcps):,} LCPs · {sum(e['app_count'] for e in lcps):,} app links · "
+        f"{sum(e['instance_count'] for e in lcps):,} instance links · {empty:,} LCPs with neither", '',
+    ]
+    for dimension in DIMENSIONS:
+        lines += [f"## Instances by {dimension}", '', f"| {dimension} | Instances |", '| --- | ---: |']
+        lines += [f"| {value} | {count:,} |" for value, count in
+                  sorted(totals[dimension].items(), key=lambda kv: (-kv[1], kv[0]))]
+        lines.append('')
+    ranked = sorted(lcps, key=lambda e: (-e['app_count'], -e['instance_count'], e['lean_control_service_id']))
+    lines += [f"## Top {min(top, len(ranked))} LCPs by apps", '',
+              '| LCP | Apps | Instances | Technical Services | Environments | Install types |',
+              '| --- | ---: | ---: | ---: | --- | --- |']
+    lines += [
+        f"| {e['lean_control_service_id']} | {e['app_count']:,} | {e['instance_count']:,} "
+        f"| {e['technical_service_count']:,} | {mix_label(e['mix']['environment'])} "
+        f"| {mix_label(e['mix']['install_type'])} |"
+        for e in ranked[:top]
+    ]
+    return '\n'.join(lines) + '\n'
+
+
+# ——— Main ———
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain and read the per-LCP rollup table (counts and mixes)")
+    parser.add_argument('-c', '--config', default='config.yaml',
+                        help='Path to YAML config with the database (default: config.yaml)')
+    parser.add_argument('--sqlite', help='Use this SQLite file (synthetic_cmdb.py --sqlite) instead of the database')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p_refresh = sub.add_parser('refresh', help='Re-aggregate the LCPs whose rows changed')
+    p_refresh.add_argument('--full', action='store_true', help='Rebuild from scratch instead of refreshing')
+    add_profile_args(p_refresh)
+
+    p_report = sub.add_parser('report', help='Markdown summary read from the rollup')
+    p_report.add_argument('lcp_ids', nargs='*', metavar='LEAN_CONTROL_SERVICE_ID', help='Limit to these LCPs')
+    p_report.add_argument('--top', type=int, default=20, help='LCPs listed by app count (default: 20)')
+    p_report.add_argument('--output', '-o', help='Write to this file instead of stdout')
+    add_profile_args(p_report)
+    args = parser.parse_args()
+
+    engine = open_engine(args.sqlite) if args.sqlite else build_engine(load_config(args.config))
+
+    if args.command == 'refresh':
+        with profiling(args):
+            result = build(engine) if args.full else refresh(engine)
+        if result.get('refreshed') is not None:
+            print(f"🔄 {result['changed']:,} LCP(s) re-aggregated")
+        print(f"✅ {ROLLUP}: {result['lcps']:,} LCPs from {result['rows']:,} rows")
+        return
+
+    with profiling(args):
+        with span('read') as s:
+            rollup = read_rollup(engine, args.lcp_ids)
+            s.add(rows=len(rollup))
+        with span('render'):
+            text = render_markdown(rollup, args.top)
+    if not rollup:
+        parser.error(f"{ROLLUP} is empty; run 'refresh' first")
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+        print(f"✅ Rollup report written to {args.output}")
+    else:
+        print(text, end='')
+
+
+if __name__ == '__main__':
+    main()
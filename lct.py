@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Single entry point for the lct_data tools.
+
+    python lct.py <command> [options]      e.g.  python lct.py generate --base by_si
+    python lct.py run pipeline.yaml        several stages in one process (pipeline.py)
+
+Only the chosen command's module is imported, and the modules keep pandas,
+SQLAlchemy, sqlparse, rich, pyarrow and requests behind the code paths that
+use them, so ``--help``, argument errors and config errors return quickly.
+``bench_startup.py`` guards this with ``python -X importtime``.
+"""
+import argparse
+import importlib
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# command -> (module path relative to this directory, summary)
+COMMANDS = {
+    'generate': ('generate_dataset', 'Hierarchy edge CSV from the CMDB (by_si / by_ts base CTE, or both reconciled)'),
+    'find-by-product': ('find_by_product_id', 'Services -> apps -> instances for lean_control_service_id(s), as JSON'),
+    'find-by-service': ('find_by_technical_service', 'Apps with instances for service_correlation_id(s), as JSON'),
+    'render-anytree': ('anytree_render', 'Edge CSV -> Markdown tree via anytree or CompactTree'),
+    'render-treelib': ('treelib_render', 'Edge CSV -> Markdown tree via treelib, inherited metadata suppressed'),
+    'render-dag': ('dag_render', 'Edge CSV -> Markdown tree with shared nodes under every parent, memoized'),
+    'visualize': ('visualize', 'find-by-product JSON -> rich tree and Markdown'),
+    'export': ('tree_export', 'Edge CSV -> Markdown/JSON/NDJSON/GraphML/Mermaid in one traversal'),
+    'search': ('hierarchy_search', 'Build or query the hierarchy search index'),
+    'nested-set': ('nested_set', 'Nested-set (lft/rgt) store of the hierarchy CSV: subtree and count range queries'),
+    'relationships': ('relationship_analysis', 'Cardinality of every parent/child pairing in the edge CSV'),
+    'closure': ('app_closure', 'Build or refresh the app_closure table of application parent chains'),
+    'mongo': ('mongo_store', 'Load the find_by_* hierarchies into MongoDB as pre-joined documents (incremental)'),
+    'changes': ('change_feed', 'LISTEN/NOTIFY change capture on the CMDB sources: invalidate only the affected cache keys'),
+    'cardinality': ('cardinality_check', 'FK cardinality of the source tables from relationships.yaml'),
+    'rollup': ('lcp_rollup', 'Per-LCP rollup table (app/instance counts, environment/install-type mix), refreshed incrementally'),
+    'governance': ('governance_metrics', 'H1-H5 governance metrics: daily JSON snapshot and Markdown trend report'),
+    'anomalies': ('mapping_anomalies', 'Every violation of the mapping rules (mapping_rules.yaml) as Parquet/CSV tables'),
+    'future-state': ('future_state', 'Normalized future-state tables (quarantining violations) vs current views: latency and plan cost'),
+    'delivery': ('delivery_activity', 'Per-LCP delivery activity from hierarchy + Jira + GitLab exports'),
+    'jira-open-issues': ('jira/get_open_issues', 'Export or incrementally sync open Jira issues to CSV'),
+    'jira-fix-version': ('jira/fetch_repos_from_fixversion', 'Repositories and commits linked to Jira fix versions'),
+    'gitlab-collect': ('gitlab_collect', 'Merged MRs and their commits from many projects, as NDJSON'),
+    'gitlab-mr': ('gitlab_mr_commits', 'Commit messages of the latest merged MR in one project'),
+    'gitlab-mock': ('gitlab_mock_api', 'Serve a local mock of the GitLab MR/commit API'),
+    'synthetic': ('synthetic_cmdb', 'Generate a synthetic CMDB (five source tables)'),
+    'run': ('pipeline', 'Run a declared extract -> analyze -> render -> export pipeline in one process'),
+    'bench': ('bench_suite', 'Time the hot paths on a synthetic CMDB'),
+    'bench-memory': ('bench_tree_memory', 'Memory of anytree/treelib vs CompactTree'),
+    'bench-startup': ('bench_startup', 'Startup time and heavy imports of every command (-X importtime)'),
+}
+
+
+def load_command(name):
+    """Import a command's module; modules in subdirectories get their directory on sys.path, as when run directly."""
+    path, _ = COMMANDS[name]
+    directory, module = os.path.split(path)
+    directory = os.path.join(HERE, directory)
+    if directory not in sys.path:
+        sys.path.insert(0, directory)
+    return importlib.import_module(module)
+
+
+def command_list():
+    width = max(len(name) for name in COMMANDS)
+    return '\n'.join(f"  {name:<{width}}  {summary}" for name, (_, summary) in COMMANDS.items())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='lct',
+        description='lct_data tools. Run "lct <command> --help" for the options of a command.',
+        epilog='commands:\n' + command_list(),
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument('command', choices=list(COMMANDS), metavar='command')
+    parser.add_argument('args', nargs=argparse.REMAINDER, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    module = load_command(args.command)
+    # The commands parse sys.argv themselves; make them see "lct <command> ..."
+    sys.argv = [f"lct {args.command}", *args.args]
+    return module.main()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,62 +1,164 @@
+import os
+import time
+
+import pandas as pd
 import streamlit as st
 
-# Sample structured data
-apps = [
-    {
-        "app_name": "User Management",
-        "lean_control_service_id": "LCS-001",
-        "jira_backlog_id": "JIRA-123",
-        "service_name": "Customer Portal",
-        "instances": [
-            {
-                "instance_name": "UM-Prod-01",
-                "environment": "Production",
-                "install_type": "Cloud",
-                "children": [
-                    {
-                        "instance_name": "UM-Prod-01-A",
-                        "environment": "Production",
-                        "install_type": "Cloud",
-                        "children": []
-                    },
-                    {
-                        "instance_name": "UM-Prod-01-B",
-                        "environment": "Production",
-                        "install_type": "Cloud",
-                        "children": []
-                    }
-                ]
-            }
-        ]
-    },
-    {
-        "app_name": "Finance Core",
-        "lean_control_service_id": "LCS-002",
-        "jira_backlog_id": "JIRA-456",
-        "service_name": "Billing Engine",
-        "instances": [
-            {
-                "instance_name": "Billing-Stg-01",
-                "environment": "Staging",
-                "install_type": "On-Prem",
-                "children": []
-            }
-        ]
-    }
-]
+from hierarchy_search import HierarchySearch
+import lcp_rollup
+
+ROOT_ID = "Business Services"
+LEVEL_ICONS = {1: "🧩", 2: "📦", 3: "🖥️"}
 
 st.set_page_config(page_title="Recursive Tree View", layout="wide")
 st.title("App-Centric Service Tree (Recursive Expandable View)")
 
-# Recursive function to render tree
-def render_instance_tree(instance, level=1):
-    label = f"{'└── ' if level > 1 else ''}{instance['instance_name']} ({instance['environment']}, {instance['install_type']})"
-    with st.expander(label):
-        for child in instance.get("children", []):
-            render_instance_tree(child, level + 1)
-
-# Top-level loop
-for app in apps:
-    with st.expander(f"📦 {app['app_name']}  |  {app['service_name']}  |  {app['jira_backlog_id']}"):
-        for inst in app["instances"]:
-            render_instance_tree(inst)
\ No newline at end of file
+render_started = time.perf_counter()
+
+
+# ——— Data loading (cached across reruns) ———
+
+@st.cache_data(show_spinner="Loading hierarchy…")
+def load_edges(path, mtime):
+    """Read the generate_dataset.py CSV. ``mtime`` busts the cache when the file changes."""
+    return pd.read_csv(path, dtype=str)
+
+
+@st.cache_resource(show_spinner="Indexing hierarchy…")
+def build_index(path, mtime):
+    """
+    parent id -> row positions of its children, sorted by name.
+
+    The CSV repeats a (parent, id) edge once per base row (an app once per
+    instance); only its first row is kept, so each child is listed once.
+    Held as a shared resource rather than cache_data so reruns reuse the same
+    object instead of unpickling a copy.
+    """
+    df = load_edges(path, mtime)
+    order = (df.assign(_pos=range(len(df)))
+             .drop_duplicates(["parent", "id"])
+             .sort_values(["parent", "name"], kind="stable"))
+    children = {
+        parent: group["_pos"].to_numpy()
+        for parent, group in order.groupby("parent", sort=False)
+    }
+    search_text = (df["name"].fillna("") + " " + df["id"].fillna("")).str.lower().to_numpy()
+    return children, search_text
+
+
+@st.cache_resource(show_spinner="Building search index…")
+def open_search(path, mtime):
+    return HierarchySearch.for_dataset(path)
+
+
+@st.cache_data(ttl=60, show_spinner="Reading LCP rollup…")
+def load_rollup(source):
+    """lcp_rollup.py's per-LCP counts from a config YAML or SQLite file; re-read at most once a minute."""
+    return lcp_rollup.read_rollup(lcp_rollup.open_engine(source))
+
+
+def node_label(row, level):
+    icon = LEVEL_ICONS.get(level, "•")
+    label = f"{icon} {row['name']} ({row['id']})"
+    if level == 1:
+        label += f"  |  LCP {row['lean_control_service_id']}  |  {row['jira_backlog_id']}"
+        counts = rollup.get(row['lean_control_service_id'])
+        if counts:
+            label += (f"  |  {counts['app_count']:,} apps · {counts['instance_count']:,} instances"
+                      f" · {lcp_rollup.mix_label(counts['mix']['environment'])}")
+    elif level >= 3:
+        label += f"  ·  {row['environment']}  ·  {row['install_type']}"
+    return label
+
+
+# ——— Lazy, paginated level rendering ———
+
+def render_level(df, children, search_text, parent_id, path, level, page_size, stats):
+    """
+    Render one page of ``parent_id``'s children. A child's own children are
+    rendered only while its toggle is on, so collapsed subtrees cost nothing.
+    """
+    positions = children.get(parent_id)
+    if positions is None or len(positions) == 0:
+        st.caption("No children.")
+        return
+
+    controls = st.columns([3, 1])
+    query = controls[0].text_input(
+        "Filter", key=f"q:{path}", placeholder=f"Search {len(positions):,} items…",
+        label_visibility="collapsed",
+    ).strip().lower()
+    if query:
+        positions = positions[[query in search_text[p] for p in positions]]
+
+    pages = max(1, -(-len(positions) // page_size))
+    page = controls[1].number_input(
+        f"Page (of {pages})", min_value=1, max_value=pages, value=1, key=f"p:{path}",
+        label_visibility="collapsed",
+    ) if pages > 1 else 1
+    visible = positions[(page - 1) * page_size: page * page_size]
+    st.caption(f"{len(positions):,} item(s) · page {page} of {pages}")
+
+    for pos in visible:
+        row = df.iloc[pos]
+        child_path = f"{path}/{row['id']}"
+        has_children = row["id"] in children
+        stats["rendered"] += 1
+        if not has_children:
+            st.markdown(node_label(row, level))
+            continue
+        if st.toggle(node_label(row, level), key=f"open:{child_path}"):
+            with st.container(border=True):
+                render_level(df, children, search_text, row["id"], child_path, level + 1, page_size, stats)
+
+
+# ——— Sidebar ———
+
+with st.sidebar:
+    csv_path = st.text_input("Hierarchy CSV (from generate_dataset.py)", value="si_hierarchy.csv")
+    page_size = st.select_slider("Items per page", options=[10, 25, 50, 100, 250], value=25)
+    rollup_source = st.text_input("LCP rollup (config YAML or SQLite file, optional)", value="",
+                                  help="Per-LCP counts maintained by lcp_rollup.py, shown on service rows")
+
+if not os.path.exists(csv_path):
+    st.info(f"'{csv_path}' not found. Run generate_dataset.py first or point the sidebar at a hierarchy CSV.")
+    st.stop()
+
+rollup = {}
+if rollup_source:
+    try:
+        rollup = load_rollup(rollup_source)
+    except Exception as e:
+        st.sidebar.warning(f"LCP rollup unavailable: {e}")
+
+mtime = os.path.getmtime(csv_path)
+load_started = time.perf_counter()
+df = load_edges(csv_path, mtime)
+children, search_text = build_index(csv_path, mtime)
+load_ms = (time.perf_counter() - load_started) * 1000
+
+with st.sidebar:
+    find = st.text_input("Find service / app / instance", placeholder="name or id")
+    fuzzy = st.checkbox("Fuzzy match")
+    if find:
+        search_started = time.perf_counter()
+        hits = open_search(csv_path, mtime).search(find, fuzzy=fuzzy, limit=25)
+        st.caption(f"{len(hits)} hit(s) in {(time.perf_counter() - search_started) * 1000:.1f} ms")
+        for hit in hits:
+            st.markdown(f"**{hit['kind']}** · {hit['path']}")
+
+stats = {"rendered": 0}
+render_level(df, children, search_text, ROOT_ID, "", 1, page_size, stats)
+
+# ——— Profiling panel ———
+
+render_ms = (time.perf_counter() - render_started) * 1000
+history = st.session_state.setdefault("render_history", [])
+history.append({"load_ms": load_ms, "render_ms": render_ms, "nodes": stats["rendered"]})
+del history[:-50]
+
+with st.sidebar.expander("Profiling", expanded=False):
+    st.metric("Last rerun", f"{render_ms:.1f} ms", help="Script start to end of tree rendering")
+    st.caption(f"Data/index lookup {load_ms:.1f} ms · {stats['rendered']:,} nodes drawn · "
+               f"{len(df):,} rows loaded")
+    st.line_chart(pd.DataFrame(history)[["load_ms", "render_ms"]])
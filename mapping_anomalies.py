@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+Complete violation sets for the mapping rules in mapping_rules.yaml.
+
+relationship_analysis.py shows three sampled examples per relationship; this
+lists every LCP, Jira project or application that breaks a governance rule
+(LCPs without apps, projects tracking several LCPs, apps under several LCPs,
+LCPs linked only to Technical Services, ...), one row per offender.
+
+Rules are declarative: a rule names a source (a table and its joins), the
+columns to group by, the distinct counts to take per group and the conditions
+on those counts that make a group a violation. Each rule runs either as one
+GROUP BY ... HAVING statement pushed down to the database, or as a grouped
+pandas aggregation over a local copy of the tables (synthetic_cmdb.py
+--output files), where each source is joined once and shared by its rules.
+Groups are unique per rule, so the violation tables carry no duplicates.
+
+Every rule's table goes to ``<output-dir>/<rule>.<format>`` and the per-rule
+counts and timings to ``<output-dir>/summary.json``.
+"""
+import argparse
+import json
+import os
+import time
+
+import yaml
+
+from instrument import span, add_profile_args, profiling
+
+OPERATORS = {'eq': '=', 'ne': '<>', 'gt': '>', 'ge': '>=', 'lt': '<', 'le': '<='}
+LIST_SEPARATOR = ', '
+
+
+# ——— Rules ———
+
+def load_config(path):
+    with open(path, 'r') as f:
+        return yaml.safe_load(f)
+
+
+def load_rules(path, only=None):
+    """(sources, rules) from a rules file, checked; ``only`` keeps the named rules."""
+    spec = load_config(path)
+    sources, rules = spec.get('sources', {}), spec.get('rules', [])
+    names = [r['name'] for r in rules]
+    if only:
+        unknown = sorted(set(only) - set(names))
+        if unknown:
+            raise ValueError(f"Unknown rule(s): {', '.join(unknown)} (have: {', '.join(names)})")
+        rules = [r for r in rules if r['name'] in only]
+
+    for rule in rules:
+        if rule['source'] not in sources:
+            raise ValueError(f"Rule {rule['name']}: unknown source {rule['source']!r}")
+        columns = source_columns(sources[rule['source']])
+        wanted = list(rule['group_by']) + list(rule['aggregates'].values()) + [rule.get('list')]
+        missing = [c for c in wanted if c is not None and c not in columns]
+        if missing:
+            raise ValueError(f"Rule {rule['name']}: source {rule['source']!r} has no column(s) {', '.join(missing)}")
+        for agg, conditions in rule['violation'].items():
+            if agg not in rule['aggregates']:
+                raise ValueError(f"Rule {rule['name']}: violation on unknown aggregate {agg!r}")
+            bad = sorted(set(conditions) - set(OPERATORS))
+            if bad:
+                raise ValueError(f"Rule {rule['name']}: unknown operator(s) {', '.join(bad)}")
+    return sources, rules
+
+
+def source_columns(source):
+    """Output column name -> (join position, table column); position 0 is the ``from`` table."""
+    columns = {name: (0, col) for col, name in source['columns'].items()}
+    for pos, join in enumerate(source.get('joins', []), start=1):
+        columns.update({name: (pos, col) for col, name in join['columns'].items()})
+    return columns
+
+
+# ——— SQL ———
+
+def rule_sql(source, rule, dialect):
+    """One GROUP BY ... HAVING statement returning the rule's violation rows."""
+    columns = source_columns(source)
+
+    def ref(name):
+        pos, col = columns[name]
+        return f"t{pos}.{col}"
+
+    lines = [f"FROM public.{source['from']} AS t0"]
+    for pos, join in enumerate(source.get('joins', []), start=1):
+        on = ' AND '.join(f"{ref(left)} = {ref(right)}" for left, right in join['match'].items())
+        how = 'LEFT JOIN' if join.get('how', 'inner') == 'left' else 'JOIN'
+        lines.append(f"{how} public.{join['table']} AS t{pos} ON {on}")
+
+    select = [f"{ref(key)} AS {key}" for key in rule['group_by']]
+    select += [f"COUNT(DISTINCT {ref(col)}) AS {agg}" for agg, col in rule['aggregates'].items()]
+    if rule.get('list'):
+        col = ref(rule['list'])
+        if dialect == 'postgresql':
+            select.append(f"STRING_AGG(DISTINCT CAST({col} AS TEXT), '{LIST_SEPARATOR}' "
+                          f"ORDER BY CAST({col} AS TEXT)) AS {rule['list']}_list")
+        else:
+            # SQLite only takes the default ',' separator with DISTINCT; _normalize_lists() sorts and re-joins
+            select.append(f"GROUP_CONCAT(DISTINCT {col}) AS {rule['list']}_list")
+    having = [
+        f"COUNT(DISTINCT {ref(rule['aggregates'][agg])}) {OPERATORS[op]} {int(value)}"
+        for agg, conditions in rule['violation'].items() for op, value in conditions.items()
+    ]
+    keys = ', '.join(ref(key) for key in rule['group_by'])
+    return (f"SELECT {', '.join(select)}\n" + '\n'.join(lines) +
+            f"\nGROUP BY {keys}\nHAVING {' AND '.join(having)}\nORDER BY {keys}")
+
+
+def _normalize_lists(df, rule):
+    if rule.get('list'):
+        col = f"{rule['list']}_list"
+        df[col] = df[col].map(lambda v: v if v is None else LIST_SEPARATOR.join(sorted(str(v).split(','))))
+    return df
+
+
+def evaluate_sql(engine, sources, rules):
+    """[(rule, violations DataFrame, seconds)] with each rule pushed down as one query."""
+    import pandas as pd
+
+    results = []
+    with engine.connect() as conn:
+        for rule in rules:
+            sql = rule_sql(sources[rule['source']], rule, conn.dialect.name)
+            started = time.perf_counter()
+            with span(rule['name']) as s:
+                result = conn.exec_driver_sql(sql)
+                df = pd.DataFrame(result.fetchall(), columns=list(result.keys()))
+                if conn.dialect.name != 'postgresql':
+                    df = _normalize_lists(df, rule)
+                s.add(rows=len(df))
+            results.append((rule, df, time.perf_counter() - started))
+    return results
+
+
+# ——— pandas ———
+
+def build_source(tables, source):
+    """The joined, renamed DataFrame for one source."""
+    df = tables[source['from']][list(source['columns'])].rename(columns=source['columns'])
+    for join in source.get('joins', []):
+        right = tables[join['table']][list(join['columns'])].rename(columns=join['columns']).drop_duplicates()
+        df = df.merge(right, left_on=list(join['match']), right_on=list(join['match'].values()),
+                      how=join.get('how', 'inner'))
+    return df
+
+
+def evaluate_rule(df, rule):
+    """Violation rows of one rule over its source DataFrame."""
+    import operator
+
+    keys = list(rule['group_by'])
+    counts = df.groupby(keys, dropna=False).agg(
+        **{agg: (col, 'nunique') for agg, col in rule['aggregates'].items()}
+    )
+    mask = None
+    for agg, conditions in rule['violation'].items():
+        for op, value in conditions.items():
+            hit = getattr(operator, op)(counts[agg], value)
+            mask = hit if mask is None else mask & hit
+    violations = counts[mask].reset_index()
+
+    if rule.get('list') and not violations.empty:
+        col = rule['list']
+        members = (
+            df[keys + [col]]
+            .merge(violations[keys], on=keys)
+            .dropna(subset=[col])
+            .drop_duplicates()
+            .astype({col: str})
+            .sort_values(col)
+            .groupby(keys, dropna=False)[col]
+            .agg(LIST_SEPARATOR.join)
+            .rename(f"{col}_list")
+        )
+        violations = violations.merge(members.reset_index(), on=keys, how='left')
+    elif rule.get('list'):
+        violations[f"{rule['list']}_list"] = []
+    return violations.sort_values(keys, kind='stable').reset_index(drop=True)
+
+
+def evaluate_frames(tables, sources, rules):
+    """evaluate_sql() for synthetic_cmdb.read_tables() DataFrames; each source is joined once."""
+    built, results = {}, []
+    for rule in rules:
+        started = time.perf_counter()
+        name = rule['source']
+        if name not in built:
+            with span(f"source:{name}") as s:
+                built[name] = build_source(tables, sources[name])
+                s.add(rows=len(built[name]))
+        with span(rule['name']) as s:
+            df = evaluate_rule(built[name], rule)
+            s.add(rows=len(df))
+        results.append((rule, df, time.perf_counter() - started))
+    return results
+
+
+# ——— Output ———
+
+def write_results(results, directory, fmt, source_label):
+    os.makedirs(directory, exist_ok=True)
+    summary = {'source': source_label, 'format': fmt, 'rules': []}
+    for rule, df, seconds in results:
+        path = os.path.join(directory, f"{rule['name']}.{fmt}")
+        with span('write', rows=len(df)):
+            if fmt == 'parquet':
+                df.to_parquet(path, index=False)
+            else:
+                df.to_csv(path, index=False)
+        summary['rules'].append({
+            'name': rule['name'], 'hypothesis': rule.get('hypothesis'), 'description': rule.get('description'),
+            'violations': len(df), 'seconds': round(seconds, 4), 'path': path,
+        })
+    with open(os.path.join(directory, 'summary.json'), 'w') as f:
+        json.dump(summary, f, indent=2)
+    return summary
+
+
+# ——— Main ———
+
+def main():
+    parser = argparse.ArgumentParser(description="List every violation of the mapping rules, one table per rule")
+    parser.add_argument('--rules', default='mapping_rules.yaml', help='Rules file (default: mapping_rules.yaml)')
+    parser.add_argument('--only', nargs='+', metavar='RULE', help='Evaluate only these rules')
+    parser.add_argument('-c', '--config', default='config.yaml', help='YAML config with the database')
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--sqlite', help='Query this SQLite file (synthetic_cmdb.py --sqlite) instead')
+    source.add_argument('--tables', help='Evaluate with pandas from the table files in this directory')
+    parser.add_argument('--tables-format', choices=['csv', 'parquet'], default='parquet',
+                        help='Format of the --tables files (default: parquet)')
+    parser.add_argument('--output-dir', '-o', default='violations', help='Directory for the violation tables')
+    parser.add_argument('--format', choices=['csv', 'parquet'], default='parquet',
+                        help='Format of the violation tables (default: parquet)')
+    add_profile_args(parser)
+    args = parser.parse_args()
+
+    try:
+        sources, rules = load_rules(args.rules, args.only)
+    except ValueError as e:
+        parser.error(str(e))
+
+    started = time.perf_counter()
+    with profiling(args):
+        if args.tables:
+            from synthetic_cmdb import read_tables
+            with span('read_tables'):
+                tables = read_tables(args.tables, args.tables_format)
+            results = evaluate_frames(tables, sources, rules)
+            label = f"tables:{args.tables}"
+        else:
+            if args.sqlite:
+                from synthetic_cmdb import sqlite_engine
+                engine, label = sqlite_engine(args.sqlite), f"sqlite:{args.sqlite}"
+            else:
+                from sqlalchemy import create_engine
+                db = load_config(args.config)['database']
+                engine = create_engine(f"postgresql://{db['user']}:{db['password']}"
+                                       f"@{db['host']}:{db['port']}/{db['name']}")
+                label = f"postgres:{db['name']}"
+            results = evaluate_sql(engine, sources, rules)
+        summary = write_results(results, args.output_dir, args.format, label)
+
+    for entry in summary['rules']:
+        flag = '⚠️ ' if entry['violations'] else '✅'
+        print(f"{flag} [{entry['hypothesis'] or '-'}] {entry['name']}: "
+              f"{entry['violations']:,} violation(s) in {entry['seconds']:.3f}s")
+    print(f"📁 Violation tables written to {args.output_dir}/ in {time.perf_counter() - started:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
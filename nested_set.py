@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+Nested-set encoding of the generate_dataset.py hierarchy.
+
+Every node gets the (lft, rgt) numbers of a depth-first walk of its tree, so
+that everything under a node is the contiguous range lft..rgt of its tree
+and its descendant count is (rgt - lft - 1) / 2, with no traversal. Each
+service under "Business Services" is its own tree (tree_id) and sits at
+depth 0; this is the lft/rgt/tree_id/level scheme of django-mptt, kept in a
+SQLite file next to the dataset (``<csv>.nested.sqlite``) as
+hierarchy_search.py keeps its index.
+
+An app listed under several services is encoded once per service, so a
+subtree read is always the single range scan on (tree_id, lft).
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import time
+
+from hierarchy import ROOT_ID, children_index, notna
+
+COLUMNS = [
+    'name', 'lean_control_service_id', 'jira_backlog_id', 'app_id', 'app_name',
+    'instance_id', 'instance_name', 'environment', 'install_type',
+]
+NODE_COLUMNS = ['tree_id', 'lft', 'rgt', 'depth', 'id', 'parent'] + COLUMNS
+_LEAVE = object()
+
+
+def default_store_path(csv_path):
+    return f"{csv_path}.nested.sqlite"
+
+
+# ——— Encoding ———
+
+def edge_metadata(df):
+    """(parent, id) -> metadata tuple, and id -> metadata of its first row for edges re-parented to the root."""
+    by_edge, by_id = {}, {}
+    present = [c for c in COLUMNS if c in df.columns]
+    for parent, node, *values in df[['parent', 'id'] + present].itertuples(index=False, name=None):
+        row = dict(zip(present, values))
+        meta = tuple(row[c] if c in row and notna(row[c]) else None for c in COLUMNS)
+        by_edge.setdefault((parent, node), meta)
+        by_id.setdefault(node, meta)
+    return by_edge, by_id
+
+
+def encode(df, root_id=ROOT_ID):
+    """
+    Rows of NODE_COLUMNS in (tree_id, lft) order. A node that is its own
+    ancestor (a cycle in the edges) is not entered again.
+    """
+    children = children_index(df, root_id)
+    by_edge, by_id = edge_metadata(df)
+    empty = (None,) * len(COLUMNS)
+
+    rows = []
+    for tree_id, top in enumerate(children.get(root_id, []), start=1):
+        counter = 0
+        on_path = set()
+        stack = [(top, root_id)]
+        while stack:
+            node, parent = stack.pop()
+            if node is _LEAVE:
+                # parent is the index of the row being closed
+                counter += 1
+                rows[parent][2] = counter
+                on_path.discard(rows[parent][4])
+                continue
+            if node in on_path:
+                continue
+            counter += 1
+            meta = by_edge.get((parent, node)) or by_id.get(node, empty)
+            stack.append((_LEAVE, len(rows)))
+            rows.append([tree_id, counter, None, len(on_path), node, parent, *meta])
+            on_path.add(node)
+            stack.extend((kid, node) for kid in reversed(children.get(node, [])))
+    return rows
+
+
+def build_store(csv_path, store_path=None):
+    """Encode the CSV and replace the store in one go. Returns (store path, node rows)."""
+    import pandas as pd
+    store_path = store_path or default_store_path(csv_path)
+    df = pd.read_csv(csv_path, dtype=str)
+    rows = encode(df)
+
+    tmp_path = f"{store_path}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    conn = sqlite3.connect(tmp_path)
+    conn.executescript(f"""
+        CREATE TABLE nodes (
+            tree_id INTEGER NOT NULL, lft INTEGER NOT NULL, rgt INTEGER NOT NULL, depth INTEGER NOT NULL,
+            id TEXT NOT NULL, parent TEXT, {', '.join(f'{c} TEXT' for c in COLUMNS)},
+            PRIMARY KEY (tree_id, lft)
+        ) WITHOUT ROWID;
+        CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+    """)
+    conn.executemany(f"INSERT INTO nodes VALUES ({', '.join('?' * len(NODE_COLUMNS))})", rows)
+    conn.executescript("""
+        CREATE INDEX ix_nodes_id ON nodes (id);
+        CREATE INDEX ix_nodes_depth ON nodes (depth, lean_control_service_id);
+    """)
+    stat = os.stat(csv_path)
+    conn.executemany("INSERT INTO meta VALUES (?, ?)", [
+        ('source_mtime', str(stat.st_mtime)), ('source_size', str(stat.st_size)),
+    ])
+    conn.commit()
+    conn.close()
+    os.replace(tmp_path, store_path)
+    return store_path, len(rows)
+
+
+# ——— Queries ———
+
+class NestedSet:
+    """Read-only handle on a built store; every query is a range or index scan."""
+
+    def __init__(self, store_path):
+        self.conn = sqlite3.connect(f"file:{store_path}?mode=ro", uri=True, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+
+    @classmethod
+    def for_dataset(cls, csv_path, store_path=None):
+        """Open the dataset's store, (re)building it first if missing or stale."""
+        store_path = store_path or default_store_path(csv_path)
+        if cls.is_stale(csv_path, store_path):
+            build_store(csv_path, store_path)
+        return cls(store_path)
+
+    @staticmethod
+    def is_stale(csv_path, store_path):
+        if not os.path.exists(store_path):
+            return True
+        conn = sqlite3.connect(store_path)
+        try:
+            meta = dict(conn.execute("SELECT key, value FROM meta"))
+        finally:
+            conn.close()
+        stat = os.stat(csv_path)
+        return meta.get('source_mtime') != str(stat.st_mtime) or meta.get('source_size') != str(stat.st_size)
+
+    def subtree(self, node_id, instances_only=False):
+        """Every node under each occurrence of ``node_id`` (itself included), in depth-first order."""
+        where = " AND d.instance_id IS NOT NULL" if instances_only else ""
+        rows = self.conn.execute(
+            "SELECT d.* FROM nodes AS n "
+            "JOIN nodes AS d ON d.tree_id = n.tree_id AND d.lft BETWEEN n.lft AND n.rgt "
+            f"WHERE n.id = ?{where} ORDER BY d.tree_id, d.lft",
+            (node_id,),
+        )
+        return [dict(r) for r in rows]
+
+    def descendant_count(self, node_id):
+        """Nodes below ``node_id``, summed over its occurrences."""
+        row = self.conn.execute("SELECT SUM((rgt - lft - 1) / 2) FROM nodes WHERE id = ?", (node_id,)).fetchone()
+        return row[0] or 0
+
+    def counts_by(self, column='lean_control_service_id'):
+        """Per value of ``column`` on the services: services, descendants and instances below them."""
+        if column not in COLUMNS:
+            raise ValueError(f"Unknown column '{column}' (choose from {', '.join(COLUMNS)})")
+        rows = self.conn.execute(
+            f"SELECT s.{column} AS {column}, COUNT(*) AS services, "
+            f"SUM((s.rgt - s.lft - 1) / 2) AS descendants, "
+            f"SUM((SELECT COUNT(*) FROM nodes AS d WHERE d.tree_id = s.tree_id AND d.lft BETWEEN s.lft AND s.rgt "
+            f"     AND d.instance_id IS NOT NULL)) AS instances "
+            f"FROM nodes AS s WHERE s.depth = 0 GROUP BY s.{column} ORDER BY descendants DESC"
+        )
+        return [dict(r) for r in rows]
+
+
+# ——— Benchmark ———
+
+def python_subtree(children, node, out=None):
+    """The recursive traversal the nested set replaces."""
+    out = [] if out is None else out
+    out.append(node)
+    for kid in children.get(node, []):
+        python_subtree(children, kid, out)
+    return out
+
+
+def _best_of(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def benchmark(csv_path, store_path=None, samples=200, repeat=3, seed=42):
+    """Time subtree reads and per-LCP descendant counts: recursive Python walk vs nested-set ranges."""
+    import pandas as pd
+    df = pd.read_csv(csv_path, dtype=str)
+    results = []
+
+    elapsed, children = _best_of(lambda: children_index(df), 1)
+    results.append(('python: children index', elapsed, len(children)))
+    elapsed, (store_path, count) = _best_of(lambda: build_store(csv_path, store_path), 1)
+    results.append(('nested set: encode + write', elapsed, count))
+    ns = NestedSet(store_path)
+
+    nodes = [n for n in children if n != ROOT_ID]
+    picks = random.Random(seed).sample(nodes, min(samples, len(nodes)))
+    elapsed, found = _best_of(lambda: sum(len(python_subtree(children, n)) for n in picks), repeat)
+    results.append((f"python: {len(picks)} subtrees", elapsed, found))
+    elapsed, found = _best_of(lambda: sum(len(ns.subtree(n)) for n in picks), repeat)
+    results.append((f"nested set: {len(picks)} subtrees", elapsed, found))
+
+    services = df[df['parent'] == ROOT_ID].drop_duplicates('id')
+
+    def python_counts():
+        counts = {}
+        for lcp, service in services[['lean_control_service_id', 'id']].itertuples(index=False, name=None):
+            counts[lcp] = counts.get(lcp, 0) + len(python_subtree(children, service)) - 1
+        return counts
+
+    elapsed, counts = _best_of(python_counts, repeat)
+    results.append(('python: descendants per LCP', elapsed, len(counts)))
+    elapsed, counts = _best_of(lambda: ns.conn.execute(
+        "SELECT lean_control_service_id, SUM((rgt - lft - 1) / 2) FROM nodes "
+        "WHERE depth = 0 GROUP BY lean_control_service_id").fetchall(), repeat)
+    results.append(('nested set: descendants per LCP', elapsed, len(counts)))
+    return results
+
+
+# ——— Main ———
+
+def main():
+    parser = argparse.ArgumentParser(description="Nested-set (lft/rgt) store of the hierarchy CSV and its range queries")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    def add_paths(p):
+        p.add_argument('--input', '-i', default='si_hierarchy.csv', help='Hierarchy CSV from generate_dataset.py')
+        p.add_argument('--store', help='Store path (default: <input>.nested.sqlite)')
+
+    add_paths(sub.add_parser('build', help='Encode the hierarchy CSV and rebuild the store'))
+
+    p_subtree = sub.add_parser('subtree', help='Everything under a node (service, app or instance id)')
+    p_subtree.add_argument('node_id')
+    p_subtree.add_argument('--instances', action='store_true', help='Only the service instances')
+    p_subtree.add_argument('--json', action='store_true', help='Emit the rows as JSON')
+    add_paths(p_subtree)
+
+    p_counts = sub.add_parser('counts', help='Services, descendants and instances per LCP (or another column)')
+    p_counts.add_argument('--by', default='lean_control_service_id', choices=COLUMNS)
+    p_counts.add_argument('--json', action='store_true')
+    add_paths(p_counts)
+
+    p_bench = sub.add_parser('bench', help='Range queries vs the recursive Python traversal')
+    p_bench.add_argument('--samples', type=int, default=200, help='Random nodes to read subtrees of (default: 200)')
+    p_bench.add_argument('--repeat', type=int, default=3, help='Runs per timing; the fastest is kept (default: 3)')
+    add_paths(p_bench)
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        started = time.perf_counter()
+        store_path, count = build_store(args.input, args.store)
+        print(f"[nested_set] Encoded {count:,} nodes into '{store_path}' in {time.perf_counter() - started:.2f}s")
+        return
+
+    if args.command == 'bench':
+        print(f"{'case':<36} {'ms':>10} {'result':>12}")
+        for case, seconds, result in benchmark(args.input, args.store, args.samples, args.repeat):
+            print(f"{case:<36} {seconds * 1000:>10.1f} {result:>12,}")
+        return
+
+    ns = NestedSet.for_dataset(args.input, args.store)
+    started = time.perf_counter()
+    if args.command == 'subtree':
+        rows = ns.subtree(args.node_id, args.instances)
+    else:
+        rows = ns.counts_by(args.by)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+
+    if args.json:
+        print(json.dumps(rows, indent=2))
+        return
+    if args.command == 'subtree':
+        for r in rows:
+            print(f"{'    ' * r['depth']}{r['name'] or r['id']} ({r['id']})")
+    else:
+        for r in rows:
+            print(f"{r[args.by] or '-':<24} {r['services']:>8,} services {r['descendants']:>10,} below "
+                  f"{r['instances']:>10,} instances")
+    print(f"[nested_set] {len(rows)} row(s) in {elapsed_ms:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+In-process pipeline runner behind ``lct run``.
+
+A pipeline is a YAML list of stages. Each stage names a step from STAGES
+(``uses``), the stages whose results it takes as inputs (``needs``) and the
+step's options (``with``):
+
+    stages:
+      - name: edges
+        uses: generate
+        with: {base: by_si}
+      - name: cardinality
+        uses: relationships
+        needs: [edges]
+        with: {output: relationships.md}
+      - name: tree
+        uses: render-treelib
+        needs: [edges]
+        with: {output: tree.md, max_depth: 3}
+
+The edge table is extracted or read once and handed to later stages as a
+DataFrame; files are written only by stages given an ``output`` (or
+``output_dir``). A stage starts as soon as everything it needs is done, so
+independent stages (rendering and cardinality analysis above) run
+concurrently on a thread pool, and a result is dropped once its last
+consumer has finished.
+"""
+import argparse
+import inspect
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import yaml
+
+from instrument import span, add_profile_args, profiling
+
+STAGES = {}
+
+
+def stage(name):
+    """Register a step under ``name``; it receives its inputs positionally and its options as keywords."""
+    def register(fn):
+        STAGES[name] = fn
+        return fn
+    return register
+
+
+def _as_list(value):
+    if value is None or isinstance(value, list):
+        return value
+    return [value]
+
+
+# ——— Extract ———
+
+@stage('generate')
+def generate_edges(config='config.yaml', base='by_si', output=None, cache_dir='.query_cache', cache=False,
+                   refresh=False):
+    """Edge table from the CMDB (generate_dataset.py), through the query result cache when cache is true."""
+    from sqlalchemy import create_engine
+    import generate_dataset
+    from query_cache import config_cache
+
+    cfg = generate_dataset.load_config(config)
+    engine = create_engine(generate_dataset.build_conn(cfg['database']))
+    result_cache = config_cache(cfg, cache_dir) if cache else None
+    df = generate_dataset.generate(engine, cfg, base, result_cache, refresh)
+    if output:
+        with span('write', rows=len(df)):
+            df.to_csv(output, index=False)
+    return df
+
+
+@stage('load')
+def load_edges(path):
+    """Edge table from a generate_dataset.py CSV."""
+    import pandas as pd
+    with span('read_csv') as s:
+        df = pd.read_csv(path, dtype=str)
+        s.add(rows=len(df))
+    return df
+
+
+@stage('filter')
+def filter_stage(edges, env=None, install_type=None):
+    from hierarchy import filter_edges
+    return filter_edges(edges, _as_list(env), _as_list(install_type))
+
+
+@stage('save')
+def save_edges(edges, output):
+    with span('write', rows=len(edges)):
+        edges.to_csv(output, index=False)
+    return edges
+
+
+# ——— Analyze ———
+
+@stage('relationships')
+def relationships_stage(edges, output=None):
+    """Cardinality of every parent/child pairing; Markdown (or CSV for *.csv) to ``output``, else stdout."""
+    from relationship_analysis import analyze_relationships
+    summary = analyze_relationships(edges)
+    if output is None:
+        print(summary.to_string(index=False))
+    elif output.endswith('.csv'):
+        summary.to_csv(output, index=False)
+    else:
+        with open(output, 'w') as f:
+            f.write(summary.to_markdown(index=False) + '\n')
+    return summary
+
+
+# ——— Render / export ———
+
+@stage('render-anytree')
+def render_anytree_stage(edges, output='tree.md', root=None, max_depth=None, max_children=None, engine='anytree'):
+    import anytree_render
+    if engine == 'compact':
+        anytree_render.render_compact_to_md(edges, _as_list(root), output, max_depth, max_children)
+    else:
+        nodes, meta, roots = anytree_render.build_anytree(edges, _as_list(root), max_depth, max_children)
+        anytree_render.render_to_md(nodes, meta, roots, output)
+    return output
+
+
+@stage('render-treelib')
+def render_treelib_stage(edges, output='tree.md', root=None, max_depth=None, max_children=None, show=False):
+    import treelib_render
+    treelib_render.render_edges(edges.fillna(''), output, _as_list(root), max_depth, max_children, show=show)
+    return output
+
+
+@stage('render-dag')
+def render_dag_stage(edges, output='tree.md', root=None, max_depth=None, max_children=None, collapse=False):
+    """dag_render.py: shared nodes under every parent, each subtree rendered once."""
+    import dag_render
+    lines, _ = dag_render.render_dag(edges, _as_list(root), max_depth, max_children, collapse)
+    dag_render.write_md(lines, output)
+    return output
+
+
+@stage('export')
+def export_stage(edges, formats=None, output_dir='.', basename='tree', root=None, max_depth=None,
+                 max_children=None):
+    """tree_export.py: every requested format from one CompactTree traversal."""
+    from compact_tree import CompactTree
+    from hierarchy import ROOT_ID
+    import tree_export
+
+    tree = CompactTree.from_edges(edges, columns=tree_export.COLUMNS)
+    roots = [i for i in (tree.find(r) for r in (_as_list(root) or [ROOT_ID])) if i >= 0]
+    os.makedirs(output_dir, exist_ok=True)
+    writers = [tree_export.WRITERS[f](os.path.join(output_dir, f"{basename}.{tree_export.WRITERS[f].extension}"))
+               for f in (_as_list(formats) or list(tree_export.WRITERS))]
+    tree_export.export(tree, roots, writers, max_depth, max_children)
+    return [w.path for w in writers]
+
+
+# ——— Runner ———
+
+def load_pipeline(path):
+    with open(path, 'r') as f:
+        spec = yaml.safe_load(f) or {}
+    return spec.get('stages') or []
+
+
+def validate(stages):
+    """Check names, steps, options and dependencies; return the stages keyed by name, in declared order."""
+    by_name = {}
+    for st in stages:
+        name = st.get('name')
+        if not name:
+            raise ValueError(f"Stage without a name: {st}")
+        if name in by_name:
+            raise ValueError(f"Duplicate stage name '{name}'")
+        if st.get('uses') not in STAGES:
+            raise ValueError(f"Stage '{name}': unknown step '{st.get('uses')}' (choose from {', '.join(STAGES)})")
+        needs = st.get('needs') or []
+        try:
+            inspect.signature(STAGES[st['uses']]).bind(*needs, **(st.get('with') or {}))
+        except TypeError as e:
+            raise ValueError(f"Stage '{name}' ({st['uses']}): {e}") from None
+        by_name[name] = dict(st, needs=needs, options=st.get('with') or {})
+
+    for name, st in by_name.items():
+        for need in st['needs']:
+            if need not in by_name:
+                raise ValueError(f"Stage '{name}' needs unknown stage '{need}'")
+
+    # Reject cycles (Kahn's algorithm)
+    remaining = {name: set(st['needs']) for name, st in by_name.items()}
+    while remaining:
+        ready = [name for name, needs in remaining.items() if not needs]
+        if not ready:
+            raise ValueError(f"Dependency cycle between stages: {', '.join(sorted(remaining))}")
+        for name in ready:
+            del remaining[name]
+        for needs in remaining.values():
+            needs.difference_update(ready)
+    return by_name
+
+
+def run_stage(st, inputs):
+    with span(st['name']):
+        return STAGES[st['uses']](*inputs, **st['options'])
+
+
+def run_pipeline(stages, workers=4, log=sys.stderr):
+    """
+    Run validated ``stages`` (from ``validate``); each starts once its needs are
+    done. Returns {stage name: seconds}. The first failure stops new stages
+    from starting and is re-raised after the running ones finish.
+    """
+    results, timings = {}, {}
+    consumers = {name: 0 for name in stages}
+    for st in stages.values():
+        for need in st['needs']:
+            consumers[need] += 1
+    pending = dict(stages)
+    running = {}
+    error = None
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while pending or running:
+            if error is None:
+                for name, st in list(pending.items()):
+                    if all(need in results for need in st['needs']):
+                        del pending[name]
+                        started = time.perf_counter()
+                        running[pool.submit(run_stage, st, [results[n] for n in st['needs']])] = (name, started)
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name, started = running.pop(future)
+                try:
+                    results[name] = future.result()
+                except Exception as e:
+                    print(f"[lct run] ❌ {name}: {e}", file=log)
+                    error = error or e
+                    continue
+                timings[name] = time.perf_counter() - started
+                print(f"[lct run] ✅ {name} ({stages[name]['uses']}) in {timings[name]:.2f}s", file=log)
+                # Release inputs nobody else is waiting for
+                for need in stages[name]['needs']:
+                    consumers[need] -= 1
+                    if consumers[need] == 0:
+                        results.pop(need, None)
+    if error is not None:
+        if pending:
+            print(f"[lct run] skipped: {', '.join(pending)}", file=log)
+        raise error
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run a declared extract → analyze → render → export pipeline in one process",
+        epilog='steps: ' + ', '.join(STAGES),
+    )
+    parser.add_argument('pipeline', nargs='?', default='pipeline.yaml',
+                        help='Pipeline YAML with a list of stages (default: pipeline.yaml)')
+    parser.add_argument('--workers', type=int, default=4, help='Stages run concurrently (default: 4)')
+    parser.add_argument('--dry-run', action='store_true', help='Validate and print the stages without running them')
+    add_profile_args(parser)
+    args = parser.parse_args()
+
+    try:
+        stages = validate(load_pipeline(args.pipeline))
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+
+    if args.dry_run:
+        for name, st in stages.items():
+            needs = f" <- {', '.join(st['needs'])}" if st['needs'] else ''
+            print(f"{name}: {st['uses']}{needs} {st['options'] or ''}".rstrip())
+        return
+
+    started = time.perf_counter()
+    with profiling(args):
+        try:
+            run_pipeline(stages, args.workers)
+        except Exception:
+            sys.exit(1)
+    print(f"[lct run] {len(stages)} stage(s) in {time.perf_counter() - started:.2f}s", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
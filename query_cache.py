@@ -0,0 +1,279 @@
+"""
+On-disk result cache for the heavy CMDB queries.
+
+Results are stored as zstd-compressed Arrow IPC files in a cache directory,
+indexed by a small SQLite table. The key is a hash of the normalized SQL, its
+bound parameters and a cheap data-version probe run against the source
+database, so a hit never touches the join and any change to the source
+tables turns into a miss on the next run. The directory is capped at
+``max_bytes``, evicting the least recently used results. The CLIs only use
+it with ``--cache``.
+
+With ``query_cache.invalidation: notify`` in config.yaml the probe is skipped
+and results stay valid until change_feed.py's listener invalidates them:
+results tagged with the keys they depend on (e.g. ('lcp', id)) are dropped
+when one of those keys changes, untagged results on any change.
+
+    cache = QueryCache('.query_cache')
+    table = cached_query(cache, conn, sql, params)   # pyarrow.Table
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import time
+from collections import namedtuple
+
+# Cumulative insert/update/delete counters for every user table. Views have
+# no row here, but the tables behind them do, so any write to the CMDB
+# changes the sum. The counters restart from zero after a stats reset or on
+# another server (failover), where the sum could repeat an earlier value, so
+# the reset time and the server start time are part of the version too.
+# Override with ``query_cache.version_sql`` in config.yaml, e.g. a
+# max(updated_at) over the source tables.
+DEFAULT_VERSION_SQL = """
+SELECT COALESCE(SUM(n_tup_ins + n_tup_upd + n_tup_del), 0)::text
+       || ':' || COUNT(*)::text
+       || ':' || COALESCE((SELECT stats_reset::text FROM pg_stat_database
+                           WHERE datname = current_database()), '')
+       || ':' || pg_postmaster_start_time()::text
+FROM pg_stat_user_tables
+"""
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    key TEXT PRIMARY KEY,
+    sql_hash TEXT NOT NULL,
+    version TEXT NOT NULL,
+    rows INTEGER NOT NULL,
+    size_bytes INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_results_last_access ON results (last_access);
+CREATE TABLE IF NOT EXISTS tags (
+    key TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    value TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_tags_kind_value ON tags (kind, value);
+CREATE INDEX IF NOT EXISTS ix_tags_key ON tags (key);
+"""
+
+
+def normalize_sql(sql):
+    """Drop comments and collapse whitespace so formatting changes keep the same key."""
+    import sqlparse
+    return ' '.join(sqlparse.format(sql, strip_comments=True).split())
+
+
+def cache_key(sql, params, version):
+    payload = json.dumps([normalize_sql(sql), params or {}, version], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class QueryCache:
+    """Size-bounded LRU of query results in ``directory`` (Arrow IPC + SQLite index)."""
+
+    def __init__(self, directory, max_bytes=512 * 2 ** 20, version_sql=None, probe=True):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.version_sql = version_sql or DEFAULT_VERSION_SQL
+        self.probe = probe
+        os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(os.path.join(directory, 'index.sqlite'))
+        self.conn.executescript(SCHEMA)
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+
+    def close(self):
+        self.conn.close()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.arrow")
+
+    def data_version(self, db_conn):
+        """Run the version probe on an open SQLAlchemy connection (a constant when the listener invalidates)."""
+        if not self.probe:
+            return 'notify'
+        from sqlalchemy import text
+        return str(db_conn.execute(text(self.version_sql)).scalar())
+
+    def get(self, key):
+        """Return the cached pyarrow.Table for ``key``, or None."""
+        import pyarrow as pa
+        row = self.conn.execute("SELECT rows FROM results WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        try:
+            with pa.OSFile(self._path(key), 'rb') as source:
+                table = pa.ipc.open_file(source).read_all()
+        except (OSError, pa.ArrowInvalid):
+            # Removed or truncated behind our back: forget it and refetch
+            self._forget(key)
+            self.conn.commit()
+            self.misses += 1
+            return None
+        self.conn.execute("UPDATE results SET last_access = ? WHERE key = ?", (time.time(), key))
+        self.conn.commit()
+        self.hits += 1
+        return table
+
+    def put(self, key, table, sql_hash='', version='', tags=None):
+        import pyarrow as pa
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        options = pa.ipc.IpcWriteOptions(compression='zstd')
+        with pa.OSFile(tmp_path, 'wb') as sink, pa.ipc.new_file(sink, table.schema, options=options) as writer:
+            writer.write_table(table)
+        os.replace(tmp_path, path)
+        now = time.time()
+        self.conn.execute(
+            "INSERT OR REPLACE INTO results (key, sql_hash, version, rows, size_bytes, created_at, last_access) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (key, sql_hash, version, table.num_rows, os.path.getsize(path), now, now),
+        )
+        self.conn.execute("DELETE FROM tags WHERE key = ?", (key,))
+        self.conn.executemany("INSERT INTO tags (key, kind, value) VALUES (?, ?, ?)",
+                              [(key, kind, str(value)) for kind, value in tags or ()])
+        self.conn.commit()
+        self._evict(keep=key)
+
+    def _evict(self, keep=None):
+        (total,) = self.conn.execute("SELECT COALESCE(SUM(size_bytes), 0) FROM results").fetchone()
+        if total <= self.max_bytes:
+            return
+        for key, size in self.conn.execute(
+                "SELECT key, size_bytes FROM results ORDER BY last_access ASC").fetchall():
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            self._forget(key)
+            total -= size
+            self.evicted += 1
+        self.conn.commit()
+
+    def _forget(self, key):
+        """Drop one result and its file; the caller commits."""
+        self.conn.execute("DELETE FROM results WHERE key = ?", (key,))
+        self.conn.execute("DELETE FROM tags WHERE key = ?", (key,))
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def clear(self):
+        for (key,) in self.conn.execute("SELECT key FROM results").fetchall():
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+        self.conn.execute("DELETE FROM results")
+        self.conn.execute("DELETE FROM tags")
+        self.conn.commit()
+
+    def invalidate(self, keys):
+        """
+        Drop the results that depend on changed keys ({kind: values}): those
+        tagged with one of them, and every untagged result. Returns the count.
+        """
+        stale = {key for (key,) in self.conn.execute(
+            "SELECT key FROM results WHERE key NOT IN (SELECT key FROM tags)")}
+        for kind, values in keys.items():
+            values = [str(v) for v in values]
+            for start in range(0, len(values), 500):
+                chunk = values[start:start + 500]
+                stale.update(key for (key,) in self.conn.execute(
+                    f"SELECT DISTINCT key FROM tags WHERE kind = ? AND value IN ({', '.join('?' * len(chunk))})",
+                    [kind, *chunk]))
+        for key in stale:
+            self._forget(key)
+        self.conn.commit()
+        return len(stale)
+
+    def stats(self):
+        count, size = self.conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size_bytes), 0) FROM results").fetchone()
+        return (f"{self.hits} hit(s), {self.misses} miss(es), {self.evicted} evicted; "
+                f"{count} result(s), {size / 2 ** 20:.1f} MB on disk")
+
+
+def rows_to_table(columns, rows):
+    """Build a pyarrow.Table from DB-API/SQLAlchemy row tuples."""
+    import pyarrow as pa
+    values = list(zip(*rows)) if rows else [()] * len(columns)
+    return pa.table({name: pa.array(list(col)) for name, col in zip(columns, values)})
+
+
+def table_rows(table):
+    """Rows of ``table`` as namedtuples, for code written against ORM result rows."""
+    Row = namedtuple('Row', table.column_names, rename=True)
+    return [Row(*values) for values in zip(*(col.to_pylist() for col in table.columns))]
+
+
+def cached_query(cache, db_conn, statement, params=None, refresh=False, tags=None):
+    """
+    Return the result of ``statement`` (SQL text or a SQLAlchemy selectable)
+    as a pyarrow.Table, served from ``cache`` when the source data version is
+    unchanged. ``cache`` may be None to always run the query. ``tags``
+    ([(kind, value)]) name the keys the result depends on, for invalidation.
+    """
+    from sqlalchemy import text
+
+    if isinstance(statement, str):
+        sql, key_params, stmt = statement, params or {}, text(statement)
+    else:
+        # Key on the parameterized SQL plus the values bound into it
+        compiled = statement.compile(dialect=db_conn.dialect)
+        sql, key_params, stmt = str(compiled), dict(compiled.params, **(params or {})), statement
+
+    def run():
+        result = db_conn.execute(stmt, params or {})
+        return rows_to_table(list(result.keys()), result.fetchall())
+
+    if cache is None:
+        return run()
+    version = cache.data_version(db_conn)
+    key = cache_key(sql, key_params, version)
+    if refresh:
+        cache.misses += 1
+    table = None if refresh else cache.get(key)
+    if table is None:
+        table = run()
+        cache.put(key, table, cache_key(sql, key_params, ''), version, tags)
+    return table
+
+
+def add_cache_args(parser):
+    group = parser.add_argument_group('result cache')
+    group.add_argument('--cache', action='store_true',
+                       help='Serve the query from the on-disk result cache while the source data is unchanged')
+    group.add_argument('--cache-dir', default='.query_cache',
+                       help='Directory for cached query results (default: .query_cache)')
+    group.add_argument('--cache-max-mb', type=float, default=512,
+                       help='Cache size limit; least recently used results are evicted (default: 512)')
+    group.add_argument('--no-cache', action='store_true', help='Do not use the cache, even with --cache')
+    group.add_argument('--refresh', action='store_true', help='With --cache: ignore cached results and re-run the query')
+
+
+def open_cache(args, cfg):
+    """QueryCache for the parsed ``add_cache_args`` options, or None unless --cache was given."""
+    if not args.cache or args.no_cache:
+        return None
+    return config_cache(cfg, args.cache_dir, int(args.cache_max_mb * 2 ** 20))
+
+
+def config_cache(cfg, directory='.query_cache', max_bytes=512 * 2 ** 20):
+    """QueryCache with config.yaml's ``query_cache`` settings (version_sql, invalidation)."""
+    settings = cfg.get('query_cache') or {}
+    return QueryCache(directory, max_bytes, settings.get('version_sql'),
+                      probe=settings.get('invalidation', 'probe') != 'notify')
+
+
+def report(cache):
+    if cache is not None:
+        print(f"[query_cache] {cache.stats()}", file=sys.stderr)
@@ -1,8 +1,16 @@
-import pandas as pd
+import argparse
 
 def analyze_all_relationships(csv_path):
-    # Load and clean
-    df = pd.read_csv(csv_path, dtype=str).fillna('')
+    import pandas as pd
+
+    return analyze_relationships(pd.read_csv(csv_path, dtype=str))
+
+def analyze_relationships(df):
+    """Cardinality summary (one row per pairing) of an edge table already in memory."""
+    import pandas as pd
+
+    # Clean
+    df = df.fillna('')
 
     # Define all parent→child relationships
     relationships = [
@@ -60,6 +68,13 @@ def analyze_all_relationships(csv_path):
 
     return pd.DataFrame(results)
 
+def main():
+    parser = argparse.ArgumentParser(description="Cardinality of every parent→child pairing in the edge CSV")
+    parser.add_argument("input", nargs="?", default="tree_edges.csv",
+                        help="Edge CSV from generate_dataset.py (default: tree_edges.csv)")
+    args = parser.parse_args()
+    summary_df = analyze_all_relationships(args.input)
+    print(summary_df.to_string(index=False))
+
 if __name__ == "__main__":
-    summary_df = analyze_all_relationships("tree_edges.csv")
-    print(summary_df.to_string(index=False))
\ No newline at end of file
+    main()
\ No newline at end of file
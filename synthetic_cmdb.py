@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+Synthetic CMDB: the five source tables behind generate_dataset.py and the
+find_by_* scripts, at any scale, with the skew seen in the real data
+(hypotheses.md):
+
+  * long-tail LCP -> app fan-out (median 1) with one 46-app / 108-instance
+    outlier
+  * ~11% of apps controlled by more than one LCP (M:N anomalies)
+  * parent/child business application chains (up to three levels)
+  * a few backlogs without an LCP, backlogs shared by LCPs, and LCPs whose
+    only mapping points at nothing
+
+Tables are written as CSV or Parquet and can be loaded into a local
+Postgres (config.yaml) or a SQLite file that mimics its ``public`` schema.
+"""
+import argparse
+import os
+import csv
+import io
+
+import yaml
+
+TABLES = [
+    'vwsfitbusinessservice', 'vwsfbusinessapplication', 'vwsfitserviceinstance',
+    'lean_control_application', 'lean_control_product_backlog_details',
+]
+INDEXES = {
+    'vwsfitbusinessservice': ['it_business_service_sysid', 'service_correlation_id'],
+    'vwsfbusinessapplication': ['business_application_sys_id', 'correlation_id'],
+    'vwsfitserviceinstance': ['correlation_id', 'business_application_sysid', 'it_business_service_sysid'],
+    'lean_control_application': ['servicenow_app_id', 'lean_control_service_id'],
+    'lean_control_product_backlog_details': ['lct_product_id'],
+}
+ENVIRONMENTS = (['Production', 'UAT', 'Development', 'DR'], [0.4, 0.25, 0.25, 0.1])
+INSTALL_TYPES = (['Cloud', 'On-Prem'], [0.55, 0.45])
+WORDS = ['Payments', 'Risk', 'Ledger', 'Portal', 'Gateway', 'Trading', 'Client', 'Data',
+         'Core', 'Mobile', 'Batch', 'Reporting', 'Identity', 'Pricing', 'Treasury', 'Claims']
+
+OUTLIER_APPS, OUTLIER_INSTANCES = 46, 108
+MN_SHARE = 0.11          # apps controlled by more than one LCP
+CHILD_APP_SHARE = 0.08   # apps with a parent application
+SERVICE_DRIFT = 0.05     # instances attached to another app's business service
+
+
+def _names(rng, prefix_ids, kind):
+    import pandas as pd
+    first = rng.choice(WORDS, len(prefix_ids))
+    second = rng.choice(WORDS, len(prefix_ids))
+    return pd.Series(first) + ' ' + pd.Series(second) + f' {kind} ' + pd.Series(prefix_ids).astype(str)
+
+
+def _fanout(rng, size, a, cap):
+    """Zipf-distributed counts >= 1, capped: most 1, a long tail up to ``cap``."""
+    import numpy as np
+    return np.minimum(rng.zipf(a, size), cap)
+
+
+def generate(instances=10_000, seed=42):
+    """Return {table name: DataFrame} with about ``instances`` service instances."""
+    import numpy as np
+    import pandas as pd
+    rng = np.random.default_rng(seed)
+
+    # LCP -> apps -> instances. LCP 0 is the 46-app / 108-instance outlier.
+    n_lcp = max(1, instances)     # upper bound, trimmed to what the instances need
+    apps_per_lcp = _fanout(rng, n_lcp, 2.4, 40)
+    apps_per_lcp[0] = OUTLIER_APPS
+    app_lcp = np.repeat(np.arange(n_lcp), apps_per_lcp)
+    inst_per_app = _fanout(rng, len(app_lcp), 2.6, 25)
+    outlier = np.flatnonzero(app_lcp == 0)
+    inst_per_app[outlier] = 1 + np.bincount(rng.integers(0, OUTLIER_APPS, OUTLIER_INSTANCES - OUTLIER_APPS),
+                                            minlength=OUTLIER_APPS)
+    keep = np.searchsorted(np.cumsum(inst_per_app), instances) + 1
+    app_lcp, inst_per_app = app_lcp[:keep], inst_per_app[:keep]
+    n_apps = len(app_lcp)
+    n_lcp = int(app_lcp.max()) + 1
+
+    lcp_ids = np.array([f"LCP{i:07d}" for i in range(n_lcp)], dtype=object)
+    app_corr = np.array([f"APP{i:07d}" for i in range(n_apps)], dtype=object)
+    app_sys = np.array([f"sys_app_{i:08x}" for i in range(n_apps)], dtype=object)
+
+    # Parent/child chains: a child app points at an earlier app of the same LCP.
+    parent_corr = np.full(n_apps, None, dtype=object)
+    first_of_lcp = np.searchsorted(app_lcp, app_lcp)
+    candidates = np.flatnonzero((np.arange(n_apps) > first_of_lcp) & (rng.random(n_apps) < CHILD_APP_SHARE * 2))
+    for i in candidates[:int(n_apps * CHILD_APP_SHARE)]:
+        parent_corr[i] = app_corr[rng.integers(first_of_lcp[i], i)]
+
+    apps = pd.DataFrame({
+        'business_application_sys_id': app_sys,
+        'correlation_id': app_corr,
+        'business_application_name': _names(rng, np.arange(n_apps), 'App'),
+        'application_parent_correlation_id': parent_corr,
+    })
+
+    # Business services: each app belongs to one, a service groups ~3 apps.
+    n_services = max(1, n_apps // 3)
+    app_service = rng.integers(0, n_services, n_apps)
+    svc_sys = np.array([f"sys_bs_{i:08x}" for i in range(n_services)], dtype=object)
+    svc_corr = np.array([f"BS{i:07d}" for i in range(n_services)], dtype=object)
+    services = pd.DataFrame({
+        'it_business_service_sysid': svc_sys,
+        'service_correlation_id': svc_corr,
+        'service': _names(rng, np.arange(n_services), 'Service'),
+    })
+
+    # Service instances
+    inst_app = np.repeat(np.arange(n_apps), inst_per_app)[:instances]
+    n_inst = len(inst_app)
+    inst_service = app_service[inst_app]
+    drift = rng.random(n_inst) < SERVICE_DRIFT
+    inst_service[drift] = rng.integers(0, n_services, int(drift.sum()))
+    inst_corr = np.array([f"SI{i:08d}" for i in range(n_inst)], dtype=object)
+    env = rng.choice(ENVIRONMENTS[0], n_inst, p=ENVIRONMENTS[1])
+    instances_df = pd.DataFrame({
+        'correlation_id': inst_corr,
+        'it_service_instance': apps['business_application_name'].to_numpy()[inst_app] + ' ' + env + ' '
+                               + pd.Series(np.arange(n_inst) % 10).astype(str).to_numpy(),
+        'environment': env,
+        'install_type': rng.choice(INSTALL_TYPES[0], n_inst, p=INSTALL_TYPES[1]),
+        'business_application_sysid': app_sys[inst_app],
+        'it_business_service_sysid': svc_sys[inst_service],
+        'it_business_service': svc_corr[inst_service],
+    })
+
+    # lean_control_application: instance (by_si) and service (by_ts) mappings
+    lca = [pd.DataFrame({'lean_control_service_id': lcp_ids[app_lcp[inst_app]], 'servicenow_app_id': inst_corr})]
+    mn_apps = rng.choice(n_apps, int(n_apps * MN_SHARE), replace=False)
+    first_inst = np.searchsorted(inst_app, mn_apps)
+    valid = first_inst < n_inst
+    mn_apps, first_inst = mn_apps[valid], first_inst[valid]
+    other_lcp = (app_lcp[mn_apps] + rng.integers(1, n_lcp, len(mn_apps))) % n_lcp if n_lcp > 1 else app_lcp[mn_apps]
+    lca.append(pd.DataFrame({'lean_control_service_id': lcp_ids[other_lcp], 'servicenow_app_id': inst_corr[first_inst]}))
+    svc_first_app = pd.Series(np.arange(n_apps)).groupby(app_service).first()
+    lca.append(pd.DataFrame({'lean_control_service_id': lcp_ids[app_lcp[svc_first_app.to_numpy()]],
+                             'servicenow_app_id': svc_corr[svc_first_app.index.to_numpy()]}))
+    n_dangling = max(1, n_lcp // 100)
+    lca.append(pd.DataFrame({'lean_control_service_id': [f"LCP{n_lcp + i:07d}" for i in range(n_dangling)],
+                             'servicenow_app_id': [f"SIX{i:07d}" for i in range(n_dangling)]}))
+    lca = pd.concat(lca, ignore_index=True)
+
+    # Backlogs: one parent backlog per LCP, some sub-backlogs, shared and orphan backlogs.
+    all_lcp = np.concatenate([lcp_ids, [f"LCP{n_lcp + i:07d}" for i in range(n_dangling)]])
+    backlog = np.array([f"PRJ{i}" for i in range(len(all_lcp))], dtype=object)
+    shared = rng.choice(len(all_lcp), max(1, len(all_lcp) // 500), replace=False)
+    backlog[shared] = backlog[(shared + 1) % len(all_lcp)]
+    details = [pd.DataFrame({'lct_product_id': all_lcp, 'jira_backlog_id': backlog, 'is_parent': True})]
+    subs = rng.choice(len(all_lcp), len(all_lcp) // 10, replace=False)
+    details.append(pd.DataFrame({'lct_product_id': all_lcp[subs],
+                                 'jira_backlog_id': [f"PRJ{i}-SUB" for i in subs], 'is_parent': False}))
+    n_orphan = max(1, len(all_lcp) // 11)
+    details.append(pd.DataFrame({'lct_product_id': [f"LCPX{i:06d}" for i in range(n_orphan)],
+                                 'jira_backlog_id': [f"PRJX{i}" for i in range(n_orphan)], 'is_parent': True}))
+    details = pd.concat(details, ignore_index=True)
+
+    return {
+        'vwsfitbusinessservice': services,
+        'vwsfbusinessapplication': apps,
+        'vwsfitserviceinstance': instances_df,
+        'lean_control_application': lca,
+        'lean_control_product_backlog_details': details,
+    }
+
+
+def write_tables(tables, output_dir, fmt='csv'):
+    os.makedirs(output_dir, exist_ok=True)
+    paths = []
+    for name, df in tables.items():
+        path = os.path.join(output_dir, f"{name}.{fmt}")
+        if fmt == 'parquet':
+            df.to_parquet(path, index=False)
+        else:
+            df.to_csv(path, index=False)
+        paths.append(path)
+    return paths
+
+
+def read_tables(input_dir, fmt='csv'):
+    import pandas as pd
+    read = pd.read_parquet if fmt == 'parquet' else pd.read_csv
+    return {name: read(os.path.join(input_dir, f"{name}.{fmt}")) for name in TABLES}
+
+
+def sqlite_engine(path):
+    """
+    SQLite engine whose file is also attached as ``public``, so the
+    ``public.<table>`` SQL in config.yaml and the find_by_* models runs as is.
+    """
+    from sqlalchemy import create_engine, event
+
+    engine = create_engine(f"sqlite:///{path}")
+
+    @event.listens_for(engine, 'connect')
+    def attach_public(dbapi_conn, _):
+        dbapi_conn.execute(f"ATTACH DATABASE '{path}' AS public")
+
+    return engine
+
+
+def _copy_insert(table, conn, keys, data_iter):
+    """pandas ``to_sql`` method using Postgres COPY."""
+    buf = io.StringIO()
+    csv.writer(buf).writerows(data_iter)
+    buf.seek(0)
+    columns = ', '.join(f'"{k}"' for k in keys)
+    name = f'{table.schema}.{table.name}' if table.schema else table.name
+    with conn.connection.cursor() as cur:
+        cur.copy_expert(f'COPY {name} ({columns}) FROM STDIN WITH CSV', buf)
+
+
+def load_tables(tables, engine):
+    """Replace the five tables in ``engine`` and index their join columns."""
+    postgres = engine.dialect.name == 'postgresql'
+    schema = 'public' if postgres else None
+    for name, df in tables.items():
+        df.to_sql(name, engine, schema=schema, if_exists='replace', index=False,
+                  method=_copy_insert if postgres else None, chunksize=None if postgres else 50_000)
+    with engine.begin() as conn:
+        for name, cols in INDEXES.items():
+            for col in cols:
+                qualified = f"public.{name}" if postgres else name
+                conn.exec_driver_sql(f'CREATE INDEX IF NOT EXISTS ix_{name}_{col} ON {qualified} ({col})')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic CMDB (five source tables)")
+    parser.add_argument('--instances', '-n', type=int, default=10_000,
+                        help='Number of service instances (default: 10000)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output-dir', '-o', default='synthetic_cmdb', help='Directory for the table files')
+    parser.add_argument('--format', choices=['csv', 'parquet'], default='csv')
+    parser.add_argument('--sqlite', help='Also load into this SQLite file (public schema attached)')
+    parser.add_argument('--postgres', action='store_true',
+                        help='Also load into the database in --config (replaces the tables in public)')
+    parser.add_argument('--config', '-c', default='config.yaml')
+    args = parser.parse_args()
+
+    tables = generate(args.instances, args.seed)
+    for path in write_tables(tables, args.output_dir, args.format):
+        print(f"✅ {path}")
+    for name, df in tables.items():
+        print(f"   {name:<40} {len(df):>10,} rows")
+
+    if args.sqlite:
+        load_tables(tables, sqlite_engine(args.sqlite))
+        print(f"✅ Loaded into SQLite {args.sqlite}")
+    if args.postgres:
+        with open(args.config) as f:
+            db = yaml.safe_load(f)['database']
+        from sqlalchemy import create_engine
+        engine = create_engine(f"postgresql+psycopg2://{db['user']}:{db['password']}@{db['host']}:{db['port']}/{db['name']}")
+        load_tables(tables, engine)
+        print(f"✅ Loaded into Postgres {db['host']}/{db['name']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""
+Export the generate_dataset.py hierarchy to several formats in one pass.
+
+The edge table is loaded into a CompactTree once and walked once; every
+node is handed to each selected writer, and each writer streams its format
+through a large write buffer:
+
+  md       anytree_render-style text tree in a fenced block
+  json     nested services -> apps -> service_instances, as find_by_*.py print
+  ndjson   one parent/child edge per line
+  graphml  nodes and edges with metadata attributes (yEd, Gephi, networkx)
+  mermaid  flowchart, one class per entity type
+
+The --root/--max-depth/--max-children/--env/--install-type options work as
+in the renderers; children cut by --max-children become a "+K more" node.
+"""
+import argparse
+import json
+import os
+import time
+from xml.sax.saxutils import escape, quoteattr
+
+from hierarchy import ROOT_ID, filter_edges, more_label, add_selection_args
+from anytree_render import entity_type, node_label
+
+BUFFER_SIZE = 1 << 20
+COLUMNS = [
+    'name', 'lean_control_service_id', 'jira_backlog_id', 'app_id', 'app_name',
+    'instance_id', 'instance_name', 'environment', 'install_type',
+]
+
+
+class Writer:
+    """
+    Base class: receives the traversal as begin / node / more / leave / end
+    calls. ``node`` gets the node id, its decoded metadata (``row``), entity
+    kind and position; ``leave`` is called once all of a node's children
+    (and its "+K more" marker) have been seen.
+    """
+    extension = ''
+
+    def __init__(self, path):
+        self.path = path
+        self.out = open(path, 'w', encoding='utf-8', buffering=BUFFER_SIZE)
+
+    def begin(self):
+        pass
+
+    def node(self, node_id, row, kind, depth, branch):
+        raise NotImplementedError
+
+    def more(self, parent_id, count, depth, branch):
+        pass
+
+    def leave(self, node_id, kind):
+        pass
+
+    def end(self):
+        pass
+
+    def close(self):
+        self.end()
+        self.out.close()
+
+
+class MarkdownWriter(Writer):
+    extension = 'md'
+
+    def begin(self):
+        self.out.write("```text\n")
+        self.first = True
+
+    def _line(self, text, branch):
+        if branch:
+            prefix = ''.join('    ' if last else '│   ' for last in branch[:-1])
+            prefix += '└── ' if branch[-1] else '├── '
+        else:
+            prefix = ''
+        if not self.first:
+            self.out.write('\n')
+        self.first = False
+        self.out.write(prefix + text)
+
+    def node(self, node_id, row, kind, depth, branch):
+        self._line(node_label(node_id, row['name'] or node_id, row.get), branch)
+
+    def more(self, parent_id, count, depth, branch):
+        self._line(more_label(count), branch)
+
+    def end(self):
+        self.out.write("\n```\n")
+
+
+class JsonWriter(Writer):
+    """
+    Streams the find_by_*.py shape: a list of services, each with ``apps``,
+    each app with ``service_instances`` and ``children`` (apps under apps).
+    Nodes above the services (the synthetic root) are not emitted; a
+    "+K more" marker becomes a ``"more": K`` key on its parent.
+    """
+    extension = 'json'
+    FIELDS = {
+        'Business_Service': lambda i, r: {'it_business_service': i,
+                                          'lean_control_service_id': r['lean_control_service_id'],
+                                          'jira_backlog_id': r['jira_backlog_id']},
+        'App': lambda i, r: {'app_id': i, 'app_name': r['app_name'] or r['name']},
+        'Service_Instance': lambda i, r: {'instance_id': i, 'it_service_instance': r['instance_name'] or r['name'],
+                                          'environment': r['environment'], 'install_type': r['install_type']},
+    }
+    LISTS = {'Business_Service': ['apps'], 'App': ['service_instances', 'children']}
+
+    def begin(self):
+        self.out.write('[')
+        self.top_first = True
+        self.stack = []   # open objects: [kind, open list name, first item in it, lists written]
+
+    def _open_list(self, name):
+        frame = self.stack[-1]
+        if frame[1] != name:
+            if frame[1]:
+                self.out.write(']')
+            self.out.write(f', {json.dumps(name)}: [')
+            frame[1], frame[2] = name, True
+            frame[3].add(name)
+        if not frame[2]:
+            self.out.write(', ')
+        frame[2] = False
+
+    def node(self, node_id, row, kind, depth, branch):
+        if kind not in self.FIELDS:
+            return
+        if self.stack:
+            parent_kind = self.stack[-1][0]
+            if parent_kind == 'Business_Service':
+                self._open_list('apps')
+            else:
+                self._open_list('children' if kind == 'App' else 'service_instances')
+        else:
+            self.out.write('' if self.top_first else ', ')
+            self.top_first = False
+        self.out.write(json.dumps(self.FIELDS[kind](node_id, row))[:-1])
+        self.stack.append([kind, None, True, set()])
+
+    def more(self, parent_id, count, depth, branch):
+        if self.stack:
+            frame = self.stack[-1]
+            if frame[1]:
+                self.out.write(']')
+                frame[1] = None
+            self.out.write(f', "more": {count}')
+
+    def leave(self, node_id, kind):
+        if kind not in self.FIELDS:
+            return
+        frame = self.stack.pop()
+        if frame[1]:
+            self.out.write(']')
+        for name in self.LISTS.get(kind, []):
+            if name not in frame[3]:
+                self.out.write(f', {json.dumps(name)}: []')
+        self.out.write('}')
+
+    def end(self):
+        self.out.write(']\n')
+
+
+class NdjsonWriter(Writer):
+    extension = 'ndjson'
+
+    def node(self, node_id, row, kind, depth, branch):
+        record = {'parent': row['parent'], 'id': node_id, 'type': kind, 'depth': depth}
+        record.update((k, v) for k, v in row.items() if v is not None and k != 'parent')
+        self.out.write(json.dumps(record) + '\n')
+
+    def more(self, parent_id, count, depth, branch):
+        self.out.write(json.dumps({'parent': parent_id, 'id': None, 'type': 'More',
+                                   'depth': depth, 'more': count}) + '\n')
+
+
+class GraphMLWriter(Writer):
+    extension = 'graphml'
+
+    def begin(self):
+        self.out.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                       '<graphml xmlns="http://graphml.graphdrawing.org/xmlns">\n')
+        self.out.write('  <key id="type" for="node" attr.name="type" attr.type="string"/>\n')
+        for col in COLUMNS:
+            self.out.write(f'  <key id="{col}" for="node" attr.name="{col}" attr.type="string"/>\n')
+        self.out.write('  <graph id="lct" edgedefault="directed">\n')
+
+    def _node(self, node_id, parent_id, data):
+        self.out.write(f'    <node id={quoteattr(node_id)}>')
+        self.out.write(''.join(f'<data key="{k}">{escape(str(v))}</data>' for k, v in data.items() if v is not None))
+        self.out.write('</node>\n')
+        if parent_id is not None:
+            self.out.write(f'    <edge source={quoteattr(parent_id)} target={quoteattr(node_id)}/>\n')
+
+    def node(self, node_id, row, kind, depth, branch):
+        data = {'type': kind}
+        data.update((col, row[col]) for col in COLUMNS)
+        self._node(node_id, row['parent'] if depth else None, data)
+
+    def more(self, parent_id, count, depth, branch):
+        self._node(f"{parent_id}::more", parent_id, {'type': 'More', 'name': more_label(count)})
+
+    def end(self):
+        self.out.write('  </graph>\n</graphml>\n')
+
+
+class MermaidWriter(Writer):
+    """flowchart LR; node ids are n<position> so CMDB ids never need escaping."""
+    extension = 'mmd'
+    CLASSES = {
+        'Business_Service': 'fill:#dae8fc,stroke:#6c8ebf',
+        'App': 'fill:#d5e8d4,stroke:#82b366',
+        'Service_Instance': 'fill:#fff2cc,stroke:#d6b656',
+        'More': 'fill:#f5f5f5,stroke:#999,stroke-dasharray:3',
+    }
+
+    def begin(self):
+        self.out.write('flowchart LR\n')
+        for kind, style in self.CLASSES.items():
+            self.out.write(f'    classDef {kind} {style}\n')
+        self.keys = {}
+
+    def _key(self, node_id):
+        return self.keys.setdefault(node_id, f"n{len(self.keys)}")
+
+    @staticmethod
+    def _text(text):
+        return str(text).replace('"', '#quot;')
+
+    def _node(self, node_id, parent_id, text, kind):
+        key = self._key(node_id)
+        cls = f":::{kind}" if kind in self.CLASSES else ''
+        self.out.write(f'    {key}["{self._text(text)}"]{cls}\n')
+        if parent_id is not None:
+            self.out.write(f'    {self._key(parent_id)} --> {key}\n')
+
+    def node(self, node_id, row, kind, depth, branch):
+        name = row['name'] or node_id
+        text = name if node_id == name else f"{name} ({node_id})"
+        self._node(node_id, row['parent'] if depth else None, text, kind)
+
+    def more(self, parent_id, count, depth, branch):
+        self._node(f"{parent_id}::more", parent_id, more_label(count), 'More')
+
+
+WRITERS = {'md': MarkdownWriter, 'json': JsonWriter, 'ndjson': NdjsonWriter,
+           'graphml': GraphMLWriter, 'mermaid': MermaidWriter}
+
+
+def export(tree, roots, writers, max_depth=None, max_children=None):
+    """
+    Walk ``tree`` once from ``roots`` (indexes), feeding every writer.
+    Returns the number of nodes visited.
+    """
+    def row_of(i):
+        row = {col: tree.value(col, i) for col in COLUMNS}
+        p = tree.parent[i]
+        row['parent'] = tree.ids[p] if p >= 0 else None
+        return row
+
+    for w in writers:
+        w.begin()
+    open_nodes = []   # (depth, id, kind) of nodes whose subtree is still being walked
+    visited = 0
+    for i, depth, branch in tree.walk(roots, max_depth, max_children):
+        while open_nodes and open_nodes[-1][0] >= depth:
+            _, node_id, kind = open_nodes.pop()
+            for w in writers:
+                w.leave(node_id, kind)
+        if i < 0:
+            parent_id = open_nodes[-1][1]
+            for w in writers:
+                w.more(parent_id, -i, depth, branch)
+            continue
+        node_id, row = tree.ids[i], row_of(i)
+        kind = 'Root' if node_id == ROOT_ID else entity_type(row.get)
+        for w in writers:
+            w.node(node_id, row, kind, depth, branch)
+        open_nodes.append((depth, node_id, kind))
+        visited += 1
+    while open_nodes:
+        _, node_id, kind = open_nodes.pop()
+        for w in writers:
+            w.leave(node_id, kind)
+    for w in writers:
+        w.close()
+    return visited
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the hierarchy to several formats in one traversal")
+    parser.add_argument('--input', default='tree_edges.csv', help='Input CSV file path from generate_dataset.py')
+    parser.add_argument('--formats', nargs='+', choices=list(WRITERS), default=list(WRITERS),
+                        help='Formats to write (default: all)')
+    parser.add_argument('--output-dir', default='.', help='Directory for the exports (default: .)')
+    parser.add_argument('--basename', default='tree', help='File name stem (default: tree)')
+    add_selection_args(parser)
+    args = parser.parse_args()
+
+    import pandas as pd
+    from compact_tree import CompactTree
+
+    started = time.perf_counter()
+    df = filter_edges(pd.read_csv(args.input, dtype=str), args.env, args.install_type)
+    tree = CompactTree.from_edges(df, columns=COLUMNS)
+    roots = [i for i in (tree.find(r) for r in (args.root or [ROOT_ID])) if i >= 0]
+    if not roots:
+        parser.error(f"None of the roots {args.root} are in {args.input}")
+    loaded = time.perf_counter()
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    writers = [WRITERS[f](os.path.join(args.output_dir, f"{args.basename}.{WRITERS[f].extension}"))
+               for f in args.formats]
+    visited = export(tree, roots, writers, args.max_depth, args.max_children)
+    done = time.perf_counter()
+
+    print(f"[tree_export] {visited:,} nodes → {len(writers)} format(s) in {done - loaded:.2f}s "
+          f"(load {loaded - started:.2f}s)")
+    for w in writers:
+        print(f"  ✅ {w.path} ({os.path.getsize(w.path):,} bytes)")
+
+
+if __name__ == '__main__':
+    main()
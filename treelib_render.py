@@ -1,46 +1,59 @@
 #!/usr/bin/env python3
 import argparse
-import pandas as pd
-from treelib import Tree
 import io
 import contextlib
 
+from hierarchy import filter_edges, children_index, select_subtree, more_label, add_selection_args
+from instrument import span, add_profile_args, profiling
+
+INHERITED_KEYS = [('lean_control_service_id', 'LCP'), ('jira_backlog_id', 'Backlog')]
+
 
 def build_children_map(df, root_id='Business Services'):
-    children = {}
-    for _, row in df.iterrows():
-        parent = row['parent'] if row['parent'] else root_id
-        children.setdefault(parent, []).append(row['id'])
-    return children
+    # Parent -> children, with orphans (unknown parents) re-attached to the root
+    return children_index(df, root_id)
+
 
+def render_tree(csv_path, markdown_path, roots=None, max_depth=None, max_children=None,
+                environments=None, install_types=None):
+    import pandas as pd
 
-def render_tree(csv_path, markdown_path):
     # Load CSV
-    df = pd.read_csv(csv_path, dtype=str).fillna('')
-    root_id = 'Business Services'
+    with span('read_csv') as s:
+        df = pd.read_csv(csv_path, dtype=str).fillna('')
+        s.add(rows=len(df))
+    render_edges(df, markdown_path, roots, max_depth, max_children, environments, install_types)
+
 
-    # Build parent->children map and name lookup
-    children_map = build_children_map(df, root_id)
-    name_map = df.set_index('id')['name'].to_dict()
-
-    # Build metadata map (drop duplicate ids to ensure unique index)
-    df_meta = df.drop_duplicates(subset=['id'], keep='first')
-    meta_map = df_meta.set_index('id')[['lean_control_service_id', 'jira_backlog_id']].to_dict('index')
-
-    # Clean children_map: retain only valid parents
-    valid_ids = set(df['id']) | {root_id}
-    clean_map = {pid: kids[:] for pid, kids in children_map.items() if pid in valid_ids}
-    extras = []
-    for pid, kids in children_map.items():
-        if pid not in valid_ids:
-            extras.extend(kids)
-    if extras:
-        clean_map.setdefault(root_id, []).extend(extras)
-    children_map = clean_map
+def render_edges(df, markdown_path, roots=None, max_depth=None, max_children=None,
+                 environments=None, install_types=None, show=True):
+    """render_tree for an edge table already in memory (empty cells as ''); ``show`` also prints the tree."""
+    from treelib import Tree
+
+    root_id = 'Business Services'
+    with span('filter'):
+        df = filter_edges(df, environments, install_types)
+
+    # Build parent->children map and cut it down to the visible subtree
+    with span('index', rows=len(df)):
+        full_map = build_children_map(df, root_id)
+        roots = roots or [root_id]
+        children_map, more = select_subtree(full_map, roots, max_depth, max_children)
+        visible_ids = set(roots).union(*children_map.values())
+
+    # Name and metadata lookups for visible ids only (drop duplicate ids to ensure unique index)
+    with span('metadata'):
+        df_meta = df[df['id'].isin(visible_ids)].drop_duplicates(subset=['id'], keep='first')
+        name_map = df_meta.set_index('id')['name'].to_dict()
+        meta_map = df_meta.set_index('id')[['lean_control_service_id', 'jira_backlog_id']].to_dict('index')
 
     # Initialize tree with synthetic root
     tree = Tree()
     tree.create_node(tag=root_id, identifier=root_id)
+    for extra_root in roots:
+        if extra_root != root_id:
+            tree.create_node(tag=f"{name_map.get(extra_root, extra_root)} ({extra_root})",
+                             identifier=extra_root, parent=root_id)
 
     # Recursive function carrying inherited metadata
     def add_nodes(parent_id, inherited_meta):
@@ -55,7 +68,7 @@ def render_tree(csv_path, markdown_path):
             own_meta = meta_map.get(child_id, {})
             parts = []
             # Only include tag if differs from inherited
-            for key, label in [('lean_control_service_id', 'LCP'), ('jira_backlog_id', 'Backlog')]:
+            for key, label in INHERITED_KEYS:
                 val = own_meta.get(key)
                 if val and val != inherited_meta.get(key):
                     parts.append(f"{label}: {val}")
@@ -72,33 +85,123 @@ def render_tree(csv_path, markdown_path):
                     new_meta[key] = val
             # Recurse
             add_nodes(child_id, new_meta)
+        if parent_id in more:
+            tree.create_node(tag=more_label(more[parent_id]), identifier=f"{parent_id}::more", parent=parent_id)
 
     # Start recursion with empty inherited metadata
-    add_nodes(root_id, {})
+    with span('build', rows=len(visible_ids)):
+        for start in roots:
+            add_nodes(start, {})
+
+    # Display tree (alphabetical, with "+K more" placeholders last)
+    def display_key(node):
+        return (str(node.identifier).endswith('::more'), node.tag)
 
-    # Display tree
-    tree.show()
+    if show:
+        with span('show'):
+            tree.show(key=display_key)
 
     # Capture ASCII for Markdown
-    buf = io.StringIO()
-    with contextlib.redirect_stdout(buf):
-        tree.show()
-    ascii_tree = buf.getvalue()
+    with span('render', rows=tree.size()):
+        buf = io.StringIO()
+        with contextlib.redirect_stdout(buf):
+            tree.show(key=display_key)
+        ascii_tree = buf.getvalue()
 
     # Write to Markdown
-    with open(markdown_path, 'w') as f:
-        f.write('```text\n')
-        f.write(ascii_tree)
-        f.write('\n```\n')
+    with span('write', bytes=len(ascii_tree)):
+        with open(markdown_path, 'w') as f:
+            f.write('```text\n')
+            f.write(ascii_tree)
+            f.write('\n```\n')
     print(f"Markdown hierarchy written to {markdown_path}")
 
 
+def render_compact(df, roots=None, max_depth=None, max_children=None, root_id='Business Services'):
+    """
+    The render_tree layout (alphabetical siblings, inherited LCP/Backlog
+    suppressed) produced straight from a CompactTree, without treelib nodes.
+    Returns the ASCII tree.
+    """
+    from compact_tree import CompactTree
+
+    tree = CompactTree.from_edges(df.replace('', None), root_id,
+                                  columns=['name', 'lean_control_service_id', 'jira_backlog_id'])
+    starts = [i for i in (tree.find(r) for r in (roots or [root_id])) if i >= 0]
+    start_set = set(starts)
+
+    def tag_of(i):
+        return f"{tree.value('name', i) or tree.ids[i]} ({tree.ids[i]})"
+
+    def by_tag(kids):
+        return sorted(kids, key=tag_of)
+
+    def label(view):
+        i = view.index
+        if i == starts[0] and tree.ids[i] == root_id:
+            return root_id
+        if i in start_set:
+            return tag_of(i)
+        # Nearest ancestor value below the start node is what treelib would have inherited
+        parts = []
+        for key, tag_label in INHERITED_KEYS:
+            val = tree.value(key, i)
+            inherited = None
+            p = tree.parent[i]
+            while p >= 0 and p not in start_set and inherited is None:
+                inherited = tree.value(key, p)
+                p = tree.parent[p]
+            if val and val != inherited:
+                parts.append(f"{tag_label}: {val}")
+        tag = tag_of(i)
+        if parts:
+            tag += ' [' + '; '.join(parts) + ']'
+        return tag
+
+    if tree.ids[starts[0]] == root_id and len(starts) == 1:
+        lines = list(tree.render_lines(starts, label, max_depth, max_children, by_tag))
+    else:
+        # Extra roots hang under the synthetic root, as in render_tree
+        lines = [root_id]
+        ordered = by_tag(starts)
+        for n, start in enumerate(ordered):
+            last = n == len(ordered) - 1
+            for k, line in enumerate(tree.render_lines([start], label, max_depth, max_children, by_tag)):
+                lead = ('└── ' if last else '├── ') if k == 0 else ('    ' if last else '│   ')
+                lines.append(lead + line)
+    # tree.show() output ends with a blank line; keep the Markdown identical
+    return '\n'.join(lines) + '\n\n'
+
+
 def main():
     parser = argparse.ArgumentParser(description="Render hierarchy via treelib with inherited metadata suppression")
     parser.add_argument("--input", required=True, help="CSV file with id,parent,name,lean_control_service_id,jira_backlog_id columns")
     parser.add_argument("--output", default="tree.md", help="Output Markdown file path")
+    parser.add_argument("--engine", choices=["treelib", "compact"], default="treelib",
+                        help="Tree representation: treelib nodes or the array-backed CompactTree (default: treelib)")
+    add_selection_args(parser)
+    add_profile_args(parser)
     args = parser.parse_args()
-    render_tree(args.input, args.output)
+    with profiling(args):
+        if args.engine == "compact":
+            import pandas as pd
+            with span('read_csv') as s:
+                df = pd.read_csv(args.input, dtype=str).fillna('')
+                s.add(rows=len(df))
+            with span('filter'):
+                df = filter_edges(df, args.env, args.install_type)
+            with span('render', rows=len(df)):
+                ascii_tree = render_compact(df, args.root, args.max_depth, args.max_children)
+            print(ascii_tree)
+            with span('write', bytes=len(ascii_tree)):
+                with open(args.output, 'w') as f:
+                    f.write('```text\n')
+                    f.write(ascii_tree)
+                    f.write('\n```\n')
+            print(f"Markdown hierarchy written to {args.output}")
+            return
+        render_tree(args.input, args.output, args.root, args.max_depth, args.max_children,
+                    args.env, args.install_type)
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -4,48 +4,126 @@ import sys
 import json
 import argparse
 import re
-from rich import print
-from rich.tree import Tree
-from rich.console import Console
+from typing import TYPE_CHECKING
+
+from hierarchy import more_label, add_selection_args
+from instrument import span, add_profile_args, profiling
+
+if TYPE_CHECKING:
+    from rich.tree import Tree
+
+# ——— Selection Helpers ———
+
+def _match(value, wanted):
+    return not wanted or (value or '').lower() in wanted
+
+
+def select_services(services: list, roots=None, environments=None, install_types=None):
+    """
+    Narrow the JSON hierarchy before any tree nodes are built: keep only the
+    subtrees rooted at ``roots`` (service, app or child-app ids) and instances
+    matching the environment / install_type filters, dropping apps and
+    services left empty by the filters.
+    """
+    envs = {e.lower() for e in environments or []}
+    types = {t.lower() for t in install_types or []}
+    roots = set(roots or [])
+
+    def keep_instances(insts):
+        return [i for i in insts if _match(i.get('environment'), envs) and _match(i.get('install_type'), types)]
+
+    def prune_app(app):
+        insts = keep_instances(app.get('service_instances', []))
+        kids = [c for c in (prune_app(c) for c in app.get('children', [])) if c]
+        if (envs or types) and not insts and not kids:
+            return None
+        return dict(app, service_instances=insts, children=kids)
+
+    selected = []
+    for svc in services:
+        if roots and svc.get('it_business_service') not in roots:
+            # A root may be an app or a component at any depth inside this service
+            apps = []
+            stack = list(reversed(svc.get('apps', [])))
+            while stack:
+                app = stack.pop()
+                if app.get('app_id') in roots:
+                    apps.append(app)
+                else:
+                    stack.extend(reversed(app.get('children', [])))
+            if not apps:
+                continue
+            svc = dict(svc, apps=apps)
+        apps = [a for a in (prune_app(a) for a in svc.get('apps', [])) if a]
+        if (envs or types) and not apps:
+            continue
+        selected.append(dict(svc, apps=apps))
+    return selected
+
+
+def _limit(items, max_children):
+    """Split ``items`` into (shown, hidden_count) for --max-children."""
+    if max_children is None or len(items) <= max_children:
+        return items, 0
+    return items[:max_children], len(items) - max_children
+
 
 # ——— Visualization Helpers ———
 
-def add_service_nodes(tree: Tree, services: list):
+def add_instance_nodes(node: "Tree", instances: list, max_children=None):
+    shown, hidden = _limit(instances, max_children)
+    for inst in shown:
+        name = inst['it_service_instance']
+        iid = inst['instance_id']
+        env = inst['environment']
+        ityp = inst['install_type']
+        node.add(f"{name} ({iid}) · {env} · {ityp}")
+    return hidden
+
+
+def add_app_node(parent: "Tree", app: dict, depth: int, deeper, max_children=None):
+    """Add ``app`` at ``depth`` with its instances and, recursively, its child apps."""
+    app_node = parent.add(f"[bold]{app.get('app_name')}[/bold] (AppID {app.get('app_id')})")
+    if not deeper(depth + 1):
+        return
+
+    # Service instances for this app
+    hidden = add_instance_nodes(app_node, app.get('service_instances', []), max_children)
+
+    # Child apps under this app, to any depth
+    children, hidden_children = _limit(app.get('children', []), max_children)
+    for child in children:
+        add_app_node(app_node, child, depth + 1, deeper, max_children)
+    if hidden or hidden_children:
+        app_node.add(f"[dim]{more_label(hidden + hidden_children)}[/dim]")
+
+
+def add_service_nodes(tree: "Tree", services: list, max_depth=None, max_children=None):
     """
     Add business services, their apps, and instances as nodes in the tree.
+    Services are depth 1, apps 2, their instances and child apps 3, and so
+    on down the component chain; anything below ``max_depth`` is not created.
     """
+    def deeper(depth):
+        return max_depth is None or depth <= max_depth
+
+    services, hidden_services = _limit(services, max_children)
     for svc in services:
         svc_name = svc.get('it_business_service')
         lean = svc.get('lean_control_service_id')
         jira = svc.get('jira_backlog_id')
         svc_label = f"[bold]Service[/bold] {svc_name} (LCP {lean}, Jira {jira})"
         svc_node = tree.add(svc_label)
+        if not deeper(2):
+            continue
 
-        for app in svc.get('apps', []):
-            app_id = app.get('app_id')
-            app_name = app.get('app_name')
-            app_node = svc_node.add(f"[bold]{app_name}[/bold] (AppID {app_id})")
-
-            # Service instances for this app
-            for inst in app.get('service_instances', []):
-                name = inst['it_service_instance']
-                iid = inst['instance_id']
-                env = inst['environment']
-                ityp = inst['install_type']
-                app_node.add(f"{name} ({iid}) · {env} · {ityp}")
-
-            # Child apps under this app
-            for child in app.get('children', []):
-                child_id = child.get('app_id')
-                child_name = child.get('app_name')
-                child_node = app_node.add(f"[bold]{child_name}[/bold] (AppID {child_id})")
-
-                for inst in child.get('service_instances', []):
-                    name = inst['it_service_instance']
-                    iid = inst['instance_id']
-                    env = inst['environment']
-                    ityp = inst['install_type']
-                    child_node.add(f"{name} ({iid}) · {env} · {ityp}")
+        apps, hidden_apps = _limit(svc.get('apps', []), max_children)
+        for app in apps:
+            add_app_node(svc_node, app, 2, deeper, max_children)
+        if hidden_apps:
+            svc_node.add(f"[dim]{more_label(hidden_apps)}[/dim]")
+    if hidden_services:
+        tree.add(f"[dim]{more_label(hidden_services)}[/dim]")
 
 # ——— Main ———
 
@@ -57,35 +135,48 @@ def main():
         'input_file',
         help='Path to the JSON file containing the service/app/instance hierarchy'
     )
+    add_selection_args(parser)
+    add_profile_args(parser)
     args = parser.parse_args()
 
-    # Load JSON data
-    with open(args.input_file, 'r') as f:
-        services = json.load(f)
-
-    # Build tree
-    tree = Tree("Business Services Hierarchy")
-    add_service_nodes(tree, services)
-
-    # Print to console
-    console = Console()
-    console.print(tree)
-
-    # Capture tree output including ANSI
-    with console.capture() as capture:
-        console.print(tree)
-    tree_str = capture.get()
-
-    # Strip ANSI escape sequences
-    clean_tree = re.sub(r'\x1b\[[0-9;]*m', '', tree_str)
-
-    # Write to markdown file
-    base = os.path.splitext(args.input_file)[0]
-    md_path = f"{base}.md"
-    with open(md_path, 'w') as md:
-        md.write('```text\n')
-        md.write(clean_tree)
-        md.write('```\n')
+    from rich import print
+    from rich.tree import Tree
+    from rich.console import Console
+
+    with profiling(args):
+        # Load JSON data
+        with span('load_json') as s, open(args.input_file, 'r') as f:
+            services = json.load(f)
+            s.add(rows=len(services))
+
+        # Build tree
+        with span('select', rows=len(services)):
+            tree = Tree("Business Services Hierarchy")
+            services = select_services(services, args.root, args.env, args.install_type)
+        with span('build', rows=len(services)):
+            add_service_nodes(tree, services, args.max_depth, args.max_children)
+
+        # Print to console
+        console = Console()
+        with span('show'):
+            console.print(tree)
+
+        # Capture tree output including ANSI
+        with span('render'):
+            with console.capture() as capture:
+                console.print(tree)
+            tree_str = capture.get()
+
+            # Strip ANSI escape sequences
+            clean_tree = re.sub(r'\x1b\[[0-9;]*m', '', tree_str)
+
+        # Write to markdown file
+        base = os.path.splitext(args.input_file)[0]
+        md_path = f"{base}.md"
+        with span('write', bytes=len(clean_tree)), open(md_path, 'w') as md:
+            md.write('```text\n')
+            md.write(clean_tree)
+            md.write('```\n')
 
     print(f"Wrote Markdown to {md_path}")
 